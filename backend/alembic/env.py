@@ -23,12 +23,19 @@ sys.path.insert(0, str(app_dir))
 from app.appointments.models import *
 from app.db.base import Base
 from app.patients.models import *
+from app.patients.models import SEARCH_INDEX
 from app.specialties.models import *
 from app.users.models import *
 
 # The target metadata for 'autogenerate' support
 target_metadata = Base.metadata
 
+
+def include_object(_object, name: str, type_: str, reflected: bool, _compare_to) -> bool:  # noqa: ANN001
+    """Leaves out the patient search index and its shadow tables, created by hand (see SEARCH_INDEX_DDL)."""
+    return not (type_ == "table" and reflected and name.startswith(SEARCH_INDEX))
+
+
 # Load URL from environment variable
 if url := getenv("DATABASE_URL"):
     config.set_main_option("sqlalchemy.url", url)
@@ -52,6 +59,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -72,7 +80,7 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
 
         with context.begin_transaction():
             context.run_migrations()
@@ -0,0 +1,38 @@
+"""add appointment time-range and payment foreign key indexes
+
+Revision ID: 4e1c7a9b2d53
+Revises: ca5ea9569f10
+Create Date: 2026-10-18 10:12:41.307215
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4e1c7a9b2d53"
+down_revision: str | Sequence[str] | None = "ca5ea9569f10"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_appointments_start_time_status", "appointments", ["start_time", "status"], unique=False)
+    op.create_index(
+        "ix_appointments_patient_id_specialty_id_start_time",
+        "appointments",
+        ["patient_id", "specialty_id", "start_time"],
+        unique=False,
+    )
+    op.create_index(op.f("ix_payments_appointment_id"), "payments", ["appointment_id"], unique=False)
+    op.create_index(op.f("ix_payments_patient_id"), "payments", ["patient_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_payments_patient_id"), table_name="payments")
+    op.drop_index(op.f("ix_payments_appointment_id"), table_name="payments")
+    op.drop_index("ix_appointments_patient_id_specialty_id_start_time", table_name="appointments")
+    op.drop_index("ix_appointments_start_time_status", table_name="appointments")
@@ -0,0 +1,31 @@
+"""add recurring series materialized count
+
+Revision ID: 6a0f3e9c2d71
+Revises: d4c1b7e92f05
+Create Date: 2026-10-18 21:12:40.583107
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "6a0f3e9c2d71"
+down_revision: str | Sequence[str] | None = "d4c1b7e92f05"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Virtual series start at 0: extend_virtual_series skips the occurrences that already have a row
+    with op.batch_alter_table("recurring_series", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("materialized_count", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("recurring_series", schema=None) as batch_op:
+        batch_op.drop_column("materialized_count")
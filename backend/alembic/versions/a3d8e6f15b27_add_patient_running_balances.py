@@ -0,0 +1,51 @@
+"""add patient running balances
+
+Revision ID: a3d8e6f15b27
+Revises: f2b6d94a1c38
+Create Date: 2026-10-18 19:12:31.640527
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a3d8e6f15b27"
+down_revision: str | Sequence[str] | None = "f2b6d94a1c38"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("patients", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("total_due", sa.Numeric(12, 2), server_default="0", nullable=False))
+        batch_op.add_column(sa.Column("total_paid", sa.Numeric(12, 2), server_default="0", nullable=False))
+        batch_op.add_column(sa.Column("balance", sa.Numeric(12, 2), server_default="0", nullable=False))
+        batch_op.create_index(batch_op.f("ix_patients_balance"), ["balance"], unique=False)
+
+    op.execute(
+        """
+        UPDATE patients SET
+            total_due = COALESCE((
+                SELECT SUM(a.cost) FROM appointments a
+                WHERE a.patient_id = patients.id AND a.status IN ('SCHEDULED', 'COMPLETED')
+            ), 0),
+            total_paid = COALESCE((
+                SELECT SUM(p.amount) FROM payments p JOIN appointments a ON a.id = p.appointment_id
+                WHERE a.patient_id = patients.id
+            ), 0)
+        """
+    )
+    op.execute("UPDATE patients SET balance = total_paid - total_due")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("patients", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_patients_balance"))
+        batch_op.drop_column("balance")
+        batch_op.drop_column("total_paid")
+        batch_op.drop_column("total_due")
@@ -0,0 +1,31 @@
+"""add keyset pagination indexes for patient history and payments ledger
+
+Revision ID: b7d2e05f6a18
+Revises: 4e1c7a9b2d53
+Create Date: 2026-10-18 12:03:17.554102
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d2e05f6a18"
+down_revision: str | Sequence[str] | None = "4e1c7a9b2d53"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_appointments_patient_id_start_time_id", "appointments", ["patient_id", "start_time", "id"], unique=False
+    )
+    op.create_index("ix_payments_payment_date_id", "payments", ["payment_date", "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_payments_payment_date_id", table_name="payments")
+    op.drop_index("ix_appointments_patient_id_start_time_id", table_name="appointments")
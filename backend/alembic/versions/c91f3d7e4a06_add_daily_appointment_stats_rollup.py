@@ -0,0 +1,56 @@
+"""add daily_appointment_stats rollup
+
+Revision ID: c91f3d7e4a06
+Revises: b7d2e05f6a18
+Create Date: 2026-10-18 14:26:52.118730
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c91f3d7e4a06"
+down_revision: str | Sequence[str] | None = "b7d2e05f6a18"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "daily_appointment_stats",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("specialty_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum("SCHEDULED", "COMPLETED", "CANCELLED", "RESCHEDULED", name="appointmentstatus"),
+            nullable=False,
+        ),
+        sa.Column("appointment_count", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Numeric(12, 2), nullable=False),
+        sa.Column("amount_charged", sa.Numeric(12, 2), nullable=False),
+        sa.ForeignKeyConstraint(["specialty_id"], ["specialties.id"]),
+        sa.PrimaryKeyConstraint("day", "specialty_id", "status"),
+    )
+
+    # Backfill from the existing history
+    day = "date(a.start_time)" if op.get_bind().dialect.name == "sqlite" else "CAST(a.start_time AS DATE)"
+    op.execute(
+        f"""
+        INSERT INTO daily_appointment_stats (day, specialty_id, status, appointment_count, revenue, amount_charged)
+        SELECT {day}, a.specialty_id, a.status, COUNT(*), SUM(a.cost), SUM(COALESCE(p.amount, 0))
+        FROM appointments a
+        LEFT JOIN (
+            SELECT appointment_id, SUM(amount) AS amount FROM payments GROUP BY appointment_id
+        ) p ON p.appointment_id = a.id
+        GROUP BY {day}, a.specialty_id, a.status
+        """  # noqa: S608
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("daily_appointment_stats")
@@ -0,0 +1,74 @@
+"""add patient search index
+
+Revision ID: d4c1b7e92f05
+Revises: a3d8e6f15b27
+Create Date: 2026-10-18 19:48:02.118734
+
+"""
+
+import unicodedata
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d4c1b7e92f05"
+down_revision: str | Sequence[str] | None = "a3d8e6f15b27"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# Keep in sync with SEARCH_INDEX_DDL in app/patients/models.py. Note that recreating the patients table (e.g. a
+# batch migration that can't use ALTER TABLE) drops the triggers, which then have to be created again.
+SEARCH_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS patients_search USING fts5("
+    "search_text, content='patients', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS patients_search_insert AFTER INSERT ON patients BEGIN "
+    "INSERT INTO patients_search(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS patients_search_delete AFTER DELETE ON patients BEGIN "
+    "INSERT INTO patients_search(patients_search, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS patients_search_update AFTER UPDATE OF search_text ON patients BEGIN "
+    "INSERT INTO patients_search(patients_search, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+    "INSERT INTO patients_search(rowid, search_text) VALUES (new.id, new.search_text); END",
+)
+
+
+def _fold(value: str | None) -> str:
+    # Same as app.common.text.fold at the time of writing
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("patients", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("search_text", sa.Text(), nullable=True))
+
+    connection = op.get_bind()
+    patients = connection.execute(sa.text("SELECT id, name, nickname FROM patients")).all()
+    if patients:
+        connection.execute(
+            sa.text("UPDATE patients SET search_text = :search_text WHERE id = :id"),
+            [
+                {"id": patient_id, "search_text": " ".join(_fold(part) for part in (name, nickname) if part)}
+                for patient_id, name, nickname in patients
+            ],
+        )
+
+    if connection.dialect.name == "sqlite":
+        for statement in SEARCH_INDEX_DDL:
+            op.execute(statement)
+        op.execute("INSERT INTO patients_search(patients_search) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "sqlite":
+        for trigger in ("insert", "delete", "update"):
+            op.execute(f"DROP TRIGGER IF EXISTS patients_search_{trigger}")
+        op.execute("DROP TABLE IF EXISTS patients_search")
+
+    with op.batch_alter_table("patients", schema=None) as batch_op:
+        batch_op.drop_column("search_text")
@@ -0,0 +1,103 @@
+"""add virtual recurring series
+
+Revision ID: e5a8b13c7f42
+Revises: c91f3d7e4a06
+Create Date: 2026-10-18 16:41:09.302771
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5a8b13c7f42"
+down_revision: str | Sequence[str] | None = "c91f3d7e4a06"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("appointments", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("occurrence_index", sa.Integer(), nullable=True))
+
+    with op.batch_alter_table("recurring_series", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("patient_id", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("specialty_id", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("start_time", sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column("duration_minutes", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("cost", sa.Numeric(10, 2), nullable=True))
+        batch_op.add_column(sa.Column("is_virtual", sa.Boolean(), nullable=True))
+
+    # Existing series were fully materialized: number their appointments, by id too so two of a series at the same
+    # time still get different indexes, and take the series' details from the first one
+    op.execute(
+        """
+        UPDATE appointments SET occurrence_index = (
+            SELECT numbered.occurrence_index FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY recurring_series_id ORDER BY start_time, id) - 1
+                    AS occurrence_index
+                FROM appointments WHERE recurring_series_id IS NOT NULL
+            ) numbered
+            WHERE numbered.id = appointments.id
+        )
+        WHERE recurring_series_id IS NOT NULL
+        """
+    )
+    with op.batch_alter_table("appointments", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_appointments_recurring_series_id_occurrence_index",
+            ["recurring_series_id", "occurrence_index"],
+            unique=True,
+        )
+
+    if op.get_bind().dialect.name == "sqlite":
+        duration = "CAST(ROUND((julianday(a.end_time) - julianday(a.start_time)) * 1440) AS INTEGER)"
+    else:
+        duration = "CAST(EXTRACT(EPOCH FROM a.end_time - a.start_time) / 60 AS INTEGER)"
+    first_appointment = (
+        "SELECT {column} FROM appointments a "
+        "WHERE a.recurring_series_id = recurring_series.id AND a.occurrence_index = 0"
+    )
+    op.execute(
+        "DELETE FROM recurring_series WHERE NOT EXISTS "
+        "(SELECT 1 FROM appointments a WHERE a.recurring_series_id = recurring_series.id)"
+    )
+    op.execute(
+        f"""
+        UPDATE recurring_series SET
+            patient_id = ({first_appointment.format(column="a.patient_id")}),
+            specialty_id = ({first_appointment.format(column="a.specialty_id")}),
+            start_time = ({first_appointment.format(column="a.start_time")}),
+            duration_minutes = ({first_appointment.format(column=duration)}),
+            cost = ({first_appointment.format(column="a.cost")}),
+            is_virtual = false
+        """  # noqa: S608
+    )
+
+    with op.batch_alter_table("recurring_series", schema=None) as batch_op:
+        for column in ("patient_id", "specialty_id", "start_time", "duration_minutes", "cost", "is_virtual"):
+            batch_op.alter_column(column, nullable=False)
+        batch_op.create_foreign_key("fk_recurring_series_patient_id_patients", "patients", ["patient_id"], ["id"])
+        batch_op.create_foreign_key(
+            "fk_recurring_series_specialty_id_specialties", "specialties", ["specialty_id"], ["id"]
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("recurring_series", schema=None) as batch_op:
+        batch_op.drop_constraint("fk_recurring_series_specialty_id_specialties", type_="foreignkey")
+        batch_op.drop_constraint("fk_recurring_series_patient_id_patients", type_="foreignkey")
+        batch_op.drop_column("is_virtual")
+        batch_op.drop_column("cost")
+        batch_op.drop_column("duration_minutes")
+        batch_op.drop_column("start_time")
+        batch_op.drop_column("specialty_id")
+        batch_op.drop_column("patient_id")
+
+    with op.batch_alter_table("appointments", schema=None) as batch_op:
+        batch_op.drop_index("ix_appointments_recurring_series_id_occurrence_index")
+        batch_op.drop_column("occurrence_index")
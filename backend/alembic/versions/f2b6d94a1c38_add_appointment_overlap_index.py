@@ -0,0 +1,27 @@
+"""add appointment overlap index
+
+Revision ID: f2b6d94a1c38
+Revises: e5a8b13c7f42
+Create Date: 2026-10-18 18:07:45.916204
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f2b6d94a1c38"
+down_revision: str | Sequence[str] | None = "e5a8b13c7f42"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_appointments_start_time_end_time", "appointments", ["start_time", "end_time"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_appointments_start_time_end_time", table_name="appointments")
@@ -0,0 +1,135 @@
+"""Free slots for a specialty, computed from the working hours and the booked appointments.
+
+Everything the sweep needs is loaded up front with a handful of queries, so the response can be streamed one day
+at a time without holding the database session open.
+"""
+
+import json
+from bisect import bisect_left
+from collections.abc import Iterator
+from datetime import UTC, date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.specialties.services import get_specialty_settings
+
+from . import models, schemas, services
+from .conflicts import MAX_APPOINTMENT_DURATION, WEEKDAYS, working_hours_by_day
+
+MAX_AVAILABILITY_DAYS = 92
+
+
+def get_availability(db: Session, specialty_id: int, start_date: date, end_date: date) -> Iterator[str] | None:
+    """NDJSON lines, one per day from `start_date` to `end_date`, with the start times (clinic time, HH:MM) of the
+    free slots of the specialty's default duration: `{"date": "2030-01-07", "slots": ["09:00", "09:30"]}`.
+
+    Days without working hours, or closed, have no slots. Returns None when the specialty doesn't exist.
+    """
+    if end_date < start_date:
+        msg = "end_date must not be before start_date."
+        raise ValueError(msg)
+    if (end_date - start_date).days >= MAX_AVAILABILITY_DAYS:
+        msg = f"The range can't span more than {MAX_AVAILABILITY_DAYS} days."
+        raise ValueError(msg)
+    specialty = get_specialty_settings(db, specialty_id)
+    if not specialty:
+        return None
+
+    clinic_timezone = ZoneInfo(settings.CLINIC_TIMEZONE)
+    range_start = _to_utc(start_date, time.min, clinic_timezone)
+    range_end = _to_utc(end_date + timedelta(days=1), time.min, clinic_timezone)
+    busy = _busy_intervals(db, range_start, range_end)
+    working_hours = working_hours_by_day(db)
+
+    return _days(
+        start_date,
+        end_date,
+        working_hours,
+        busy,
+        timedelta(minutes=specialty.default_duration_minutes),
+        clinic_timezone,
+    )
+
+
+def _busy_intervals(db: Session, range_start: datetime, range_end: datetime) -> list[tuple[datetime, datetime]]:
+    """Booked (start, end) intervals overlapping the range, sorted by start, including the not yet materialized
+    occurrences of recurring series.
+    """
+    booked = (
+        db.query(models.Appointment.start_time, models.Appointment.end_time)
+        .filter(
+            models.Appointment.start_time > range_start - MAX_APPOINTMENT_DURATION,
+            models.Appointment.start_time < range_end,
+            models.Appointment.end_time > range_start,
+            models.Appointment.status != models.AppointmentStatus.CANCELLED,
+        )
+        .all()
+    )
+    virtual = services.get_virtual_occurrences(
+        db,
+        range_start,
+        range_end,
+        lower_inclusive=True,
+        ends_by=range_end + MAX_APPOINTMENT_DURATION,
+        patient_id=None,
+    )
+    booked += [(start, start + (a.end_time - a.start_time)) for start, a in virtual]
+    return sorted(booked)
+
+
+def _days(  # noqa: PLR0913
+    start_date: date,
+    end_date: date,
+    working_hours: dict[models.DayOfWeek, schemas.WorkingHours],
+    busy: list[tuple[datetime, datetime]],
+    duration: timedelta,
+    clinic_timezone: ZoneInfo,
+) -> Iterator[str]:
+    busy_starts = [start for start, _ in busy]
+    now = datetime.now(UTC).replace(tzinfo=None)
+    day = start_date
+    while day <= end_date:
+        slots = []
+        hours = working_hours.get(WEEKDAYS[day.weekday()])
+        if hours is not None and not hours.is_closed:
+            opens = _to_utc(day, hours.start_time or time.min, clinic_timezone)
+            closes = (
+                _to_utc(day, hours.end_time, clinic_timezone)
+                if hours.end_time
+                else _to_utc(day + timedelta(days=1), time.min, clinic_timezone)
+            )
+            free_from = opens
+            # Sweep the intervals that can overlap the day in start order, offering slots in every gap
+            for busy_start, busy_end in busy[bisect_left(busy_starts, opens - MAX_APPOINTMENT_DURATION) :]:
+                if busy_start >= closes:
+                    break
+                slots += _slots(free_from, min(busy_start, closes), duration)
+                free_from = max(free_from, busy_end)
+            slots += _slots(free_from, closes, duration)
+
+        yield json.dumps(
+            {
+                "date": day.isoformat(),
+                "slots": [
+                    slot.replace(tzinfo=UTC).astimezone(clinic_timezone).strftime("%H:%M")
+                    for slot in slots
+                    if slot >= now
+                ],
+            },
+            separators=(",", ":"),
+        ) + "\n"
+        day += timedelta(days=1)
+
+
+def _slots(free_from: datetime, free_until: datetime, duration: timedelta) -> list[datetime]:
+    slots = []
+    while free_from + duration <= free_until:
+        slots.append(free_from)
+        free_from += duration
+    return slots
+
+
+def _to_utc(day: date, at: time, clinic_timezone: ZoneInfo) -> datetime:
+    return datetime.combine(day, at, tzinfo=clinic_timezone).astimezone(UTC).replace(tzinfo=None)
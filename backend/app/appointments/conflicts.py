@@ -0,0 +1,145 @@
+"""Scheduling conflicts: overlaps with other appointments and bookings outside the working hours.
+
+Appointments are fetched with a single range query on the (start_time, end_time) index. Since no appointment lasts
+longer than `MAX_APPOINTMENT_DURATION`, anything overlapping [start, end) starts within
+[start - MAX_APPOINTMENT_DURATION, end), so the scanned range depends on the size of the checked window and not on
+the size of the calendar. The occurrences of virtual recurring series that have no row yet are expanded over the
+same range and count as booked too. The candidates are then matched against each checked interval with a binary
+search.
+"""
+
+from bisect import bisect_left
+from collections.abc import Iterable, Sequence
+from datetime import UTC, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.orm import Session
+
+from app.common.dates import naive_utc
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+from . import models, recurrence, schemas
+
+MAX_APPOINTMENT_DURATION = timedelta(hours=24)
+WEEKDAYS = list(models.DayOfWeek)
+WORKING_HOURS_CACHE = TTLCache("working_hours", maxsize=1)
+
+
+class SchedulingConflictError(ValueError):
+    def __init__(self, conflicts: schemas.SchedulingConflicts) -> None:
+        self.conflicts = conflicts
+        if conflicts.appointment_ids or conflicts.occurrences:
+            msg = "The appointment overlaps with other appointments."
+        else:
+            msg = "The appointment is outside the working hours."
+        super().__init__(msg)
+
+
+def validate_interval(start_time: datetime, end_time: datetime) -> None:
+    if end_time <= start_time:
+        msg = "The appointment must end after it starts."
+        raise ValueError(msg)
+    if end_time - start_time > MAX_APPOINTMENT_DURATION:
+        msg = "An appointment can't last longer than 24 hours."
+        raise ValueError(msg)
+
+
+def find_conflicts(
+    db: Session, intervals: Sequence[tuple[datetime, datetime]], *, exclude_ids: Iterable[int] = ()
+) -> list[schemas.SchedulingConflicts]:
+    """Conflicts of each of the given (start_time, end_time) intervals, in order. Cancelled appointments and the
+    ones in `exclude_ids` don't count. An occurrence being edited already has its row, so it's never counted twice.
+    """
+    if not intervals:
+        return []
+    intervals = [(naive_utc(start_time), naive_utc(end_time)) for start_time, end_time in intervals]
+    window_start = min(start_time for start_time, _ in intervals)
+    window_end = max(end_time for _, end_time in intervals)
+
+    query = db.query(models.Appointment.id, models.Appointment.start_time, models.Appointment.end_time).filter(
+        models.Appointment.start_time > window_start - MAX_APPOINTMENT_DURATION,
+        models.Appointment.start_time < window_end,
+        models.Appointment.end_time > window_start,
+        models.Appointment.status != models.AppointmentStatus.CANCELLED,
+    )
+    exclude_ids = list(exclude_ids)
+    if exclude_ids:
+        query = query.filter(models.Appointment.id.not_in(exclude_ids))
+    # (start, end, appointment id, occurrence), with either an id or an occurrence
+    booked: list[tuple[datetime, datetime, int | None, schemas.OccurrenceRef | None]] = [
+        (start_time, end_time, appointment_id, None) for appointment_id, start_time, end_time in query
+    ]
+    booked += [
+        (
+            start_time,
+            start_time + timedelta(minutes=series.duration_minutes),
+            None,
+            schemas.OccurrenceRef(series_id=series.id, occurrence_index=index),
+        )
+        for series, index, start_time in recurrence.unmaterialized_occurrences(
+            db, window_start - MAX_APPOINTMENT_DURATION, window_end, lower_inclusive=False
+        )
+    ]
+    booked.sort(key=lambda item: item[0])
+    booked_starts = [start_time for start_time, *_ in booked]
+    working_hours = working_hours_by_day(db)
+
+    conflicts = []
+    for start_time, end_time in intervals:
+        first = bisect_left(booked_starts, start_time - MAX_APPOINTMENT_DURATION)
+        last = bisect_left(booked_starts, end_time)
+        overlapping = [item for item in booked[first:last] if item[1] > start_time]
+        conflicts.append(
+            schemas.SchedulingConflicts(
+                appointment_ids=[
+                    appointment_id for _, _, appointment_id, _ in overlapping if appointment_id is not None
+                ],
+                occurrences=[occurrence for _, _, _, occurrence in overlapping if occurrence is not None],
+                outside_working_hours=not _within_working_hours(working_hours, start_time, end_time),
+            )
+        )
+    return conflicts
+
+
+def check_conflicts(
+    db: Session, start_time: datetime, end_time: datetime, *, exclude_id: int | None = None
+) -> None:
+    """Validation step for a single appointment. Raises `SchedulingConflictError` when it has conflicts."""
+    validate_interval(start_time, end_time)
+    exclude_ids = [exclude_id] if exclude_id is not None else []
+    (conflicts,) = find_conflicts(db, [(start_time, end_time)], exclude_ids=exclude_ids)
+    if conflicts.has_conflicts:
+        raise SchedulingConflictError(conflicts)
+
+
+def working_hours_by_day(db: Session) -> dict[models.DayOfWeek, schemas.WorkingHours]:
+    """Cached, `services.set_working_hours` clears it."""
+    return WORKING_HOURS_CACHE.get_or_load(
+        None,
+        lambda: {
+            hours.day_of_week: schemas.WorkingHours.model_validate(hours) for hours in db.query(models.WorkingHours)
+        },
+    )
+
+
+def _within_working_hours(
+    working_hours: dict[models.DayOfWeek, schemas.WorkingHours], start_time: datetime, end_time: datetime
+) -> bool:
+    """Working hours are in the clinic's local time. Days without working hours configured accept anything."""
+    clinic_timezone = ZoneInfo(settings.CLINIC_TIMEZONE)
+    local_start = start_time.replace(tzinfo=UTC).astimezone(clinic_timezone)
+    local_end = end_time.replace(tzinfo=UTC).astimezone(clinic_timezone)
+
+    hours = working_hours.get(WEEKDAYS[local_start.weekday()])
+    if hours is None:
+        return True
+    if hours.is_closed:
+        return False
+    opens_ok = hours.start_time is None or local_start.time() >= hours.start_time
+    if local_end.date() != local_start.date():
+        # Runs past midnight
+        closes_ok = hours.end_time is None
+    else:
+        closes_ok = hours.end_time is None or local_end.time() <= hours.end_time
+    return opens_ok and closes_ok
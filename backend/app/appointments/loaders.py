@@ -0,0 +1,21 @@
+from sqlalchemy.orm import joinedload, selectinload, undefer
+from sqlalchemy.orm.strategy_options import _AbstractLoad
+
+from app.payments.models import Payment
+
+from .models import Appointment
+
+
+def appointment_response_options() -> tuple[_AbstractLoad, ...]:
+    """Loader options for the relationships serialized by `schemas.Appointment`.
+
+    Loading them up front keeps listing N appointments at a constant number of queries instead of one lazy
+    load per row and relationship. Also undefers `total_paid`, which plain lookups leave out. Built on demand since
+    mappers can't be configured at import time.
+    """
+    return (
+        undefer(Appointment.total_paid),
+        joinedload(Appointment.patient),
+        joinedload(Appointment.specialty),
+        selectinload(Appointment.payments).joinedload(Payment.payment_method),
+    )
@@ -1,8 +1,9 @@
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
 
-from sqlalchemy import and_, func
+from sqlalchemy import and_, case, func
 from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
 
 from . import models, schemas
 
@@ -16,31 +17,21 @@ def get_appointment_metrics(
     if start_date >= end_date:
         raise ValueError("start_date must be before end_date")
 
-    # Build base filter conditions
-    time_filter = and_(
-        models.Appointment.start_time >= start_date,
-        models.Appointment.start_time < end_date,
+    # Read the daily rollup rather than aggregating raw appointments and payments
+    stats = models.DailyAppointmentStats
+    result = (
+        db.query(
+            func.coalesce(func.sum(stats.appointment_count), 0).label("total_appointments"),
+            func.coalesce(func.sum(stats.revenue), 0).label("total_revenue"),
+            func.coalesce(func.sum(stats.amount_charged), 0).label("total_charged"),
+        )
+        .filter(stats.day >= start_date, stats.day < end_date)
+        .one()
     )
 
-    # Single query to get all appointment metrics at once
-    metrics_query = db.query(
-        func.count(models.Appointment.id).label("total_appointments"),
-        func.coalesce(func.sum(models.Appointment.cost), 0).label("total_revenue"),
-    ).filter(time_filter)
-
-    result = metrics_query.first()
     total_appointments = result.total_appointments
     total_revenue = Decimal(str(result.total_revenue))
-
-    # Get total charged amount with proper join
-    charged_query = (
-        db.query(func.coalesce(func.sum(models.Payment.amount), 0))
-        .select_from(models.Appointment)
-        .join(models.Payment, models.Payment.appointment_id == models.Appointment.id)
-        .filter(time_filter)
-    )
-
-    total_charged = Decimal(str(charged_query.scalar() or 0))
+    total_charged = Decimal(str(result.total_charged))
     total_due = total_revenue - total_charged
 
     return schemas.AppointmentMetrics(
@@ -53,61 +44,73 @@ def get_appointment_metrics(
     )
 
 
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+def _sum_if(condition: ColumnElement[bool], value: ColumnElement) -> ColumnElement:
+    return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+
 def get_dashboard_metrics(db: Session) -> schemas.DashboardMetrics:
-    today = date.today()
+    """All dashboard figures in two round trips: one conditional aggregate over appointments and one over
+    their payments. Every period is a half-open range on start_time so both can use its index.
+    """
+    today = date.today()  # noqa: DTZ011
     start_of_week = today - timedelta(days=today.weekday())
-    end_of_week = start_of_week + timedelta(days=7)
-
-    # Appointments today
-    appointments_today = (
-        db.query(func.count(models.Appointment.id))
-        .filter(
-            and_(
-                func.date(models.Appointment.start_time) == today,
-                models.Appointment.status != "cancelled",
-            )
-        )
-        .scalar()
+    start_of_this_month = today.replace(day=1)
+    start_of_last_month = (start_of_this_month - timedelta(days=1)).replace(day=1)
+    start_of_next_month = (start_of_this_month + timedelta(days=32)).replace(day=1)
+
+    start_time = models.Appointment.start_time
+    periods = {
+        "today": (_day_start(today), _day_start(today + timedelta(days=1))),
+        "this_week": (_day_start(start_of_week), _day_start(start_of_week + timedelta(days=7))),
+        "this_month": (_day_start(start_of_this_month), _day_start(start_of_next_month)),
+        "last_month": (_day_start(start_of_last_month), _day_start(start_of_this_month)),
+    }
+    in_period = {name: and_(start_time >= start, start_time < end) for name, (start, end) in periods.items()}
+    # Narrow both scans to the union of all periods
+    in_any_period = and_(
+        start_time >= min(start for start, _ in periods.values()),
+        start_time < max(end for _, end in periods.values()),
     )
-
-    # Appointments this week
-    appointments_this_week = (
-        db.query(func.count(models.Appointment.id))
-        .filter(
-            and_(
-                models.Appointment.start_time >= start_of_week,
-                models.Appointment.start_time < end_of_week,
-                models.Appointment.status != "cancelled",
-            )
+    not_cancelled = models.Appointment.status != models.AppointmentStatus.CANCELLED
+
+    appointments = (
+        db.query(
+            _sum_if(and_(in_period["today"], not_cancelled), 1).label("appointments_today"),
+            _sum_if(and_(in_period["this_week"], not_cancelled), 1).label("appointments_this_week"),
+            _sum_if(in_period["this_month"], models.Appointment.cost).label("revenue_this_month"),
+            _sum_if(in_period["last_month"], models.Appointment.cost).label("revenue_last_month"),
         )
-        .scalar()
+        .filter(in_any_period)
+        .one()
     )
 
-    # Revenue metrics for this month
-    start_of_this_month = today.replace(day=1)
-    # To get the end of this month, we get the first day of the next month and subtract one day
-    next_month = (start_of_this_month + timedelta(days=32)).replace(day=1)
-    end_of_this_month = next_month
-
-    this_month_metrics = get_appointment_metrics(
-        start_date=start_of_this_month, end_date=end_of_this_month, db=db
+    charged = (
+        db.query(
+            _sum_if(in_period["this_month"], models.Payment.amount).label("this_month"),
+            _sum_if(in_period["last_month"], models.Payment.amount).label("last_month"),
+        )
+        .select_from(models.Appointment)
+        .join(models.Payment, models.Payment.appointment_id == models.Appointment.id)
+        .filter(start_time >= periods["last_month"][0], start_time < periods["this_month"][1])
+        .one()
     )
 
-    # Revenue metrics for last month
-    end_of_last_month = start_of_this_month
-    start_of_last_month = (end_of_last_month - timedelta(days=1)).replace(day=1)
-
-    last_month_metrics = get_appointment_metrics(
-        start_date=start_of_last_month, end_date=end_of_last_month, db=db
-    )
+    expected_revenue_this_month = Decimal(str(appointments.revenue_this_month))
+    expected_revenue_last_month = Decimal(str(appointments.revenue_last_month))
+    total_charged_this_month = Decimal(str(charged.this_month))
+    total_charged_last_month = Decimal(str(charged.last_month))
 
     return schemas.DashboardMetrics(
-        appointments_today=appointments_today,
-        appointments_this_week=appointments_this_week,
-        expected_revenue_this_month=this_month_metrics.total_revenue,
-        expected_revenue_last_month=last_month_metrics.total_revenue,
-        total_charged_this_month=this_month_metrics.total_charged,
-        total_charged_last_month=last_month_metrics.total_charged,
-        total_due_this_month=this_month_metrics.total_due,
-        total_due_last_month=last_month_metrics.total_due,
+        appointments_today=appointments.appointments_today,
+        appointments_this_week=appointments.appointments_this_week,
+        expected_revenue_this_month=expected_revenue_this_month,
+        expected_revenue_last_month=expected_revenue_last_month,
+        total_charged_this_month=total_charged_this_month,
+        total_charged_last_month=total_charged_last_month,
+        total_due_this_month=expected_revenue_this_month - total_charged_this_month,
+        total_due_last_month=expected_revenue_last_month - total_charged_last_month,
     )
@@ -37,6 +37,23 @@ class DayOfWeek(enum.Enum):
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Calendar listings and metrics filter on a start_time range, usually excluding cancelled appointments
+        sa.Index("ix_appointments_start_time_status", "start_time", "status"),
+        # Overlap checks: a bounded start_time range, filtered on end_time without reading the rows
+        sa.Index("ix_appointments_start_time_end_time", "start_time", "end_time"),
+        # Per-patient history and session counts per specialty
+        sa.Index("ix_appointments_patient_id_specialty_id_start_time", "patient_id", "specialty_id", "start_time"),
+        # Keyset pagination through a patient's history, newest first
+        sa.Index("ix_appointments_patient_id_start_time_id", "patient_id", "start_time", "id"),
+        # At most one row per occurrence of a recurring series
+        sa.Index(
+            "ix_appointments_recurring_series_id_occurrence_index",
+            "recurring_series_id",
+            "occurrence_index",
+            unique=True,
+        ),
+    )
 
     id = sa.Column(Integer, primary_key=True, index=True)
     start_time = sa.Column(DateTime, nullable=False)
@@ -54,23 +71,59 @@ class Appointment(Base):
 
     recurring_series_id = sa.Column(Integer, sa.ForeignKey("recurring_series.id"), nullable=True)
     recurring_series = relationship("RecurringSeries", back_populates="appointments")
+    # Position of the occurrence within its series (0 for the first one), regardless of later reschedules
+    occurrence_index = sa.Column(Integer, nullable=True)
 
     payments = relationship("Payment", back_populates="appointment", order_by="desc(Payment.payment_date)")
 
+    # Deferred so lookups and writes don't pay for the aggregate, response queries undefer it in bulk
     total_paid = column_property(
-        select(func.coalesce(func.sum(Payment.amount), 0.0)).where(Payment.appointment_id == id).scalar_subquery()
+        select(func.coalesce(func.sum(Payment.amount), 0.0)).where(Payment.appointment_id == id).scalar_subquery(),
+        deferred=True,
     )
 
 
+class DailyAppointmentStats(Base):
+    """Appointments rolled up per day, specialty and status, kept up to date by the services layer.
+    See `app.appointments.rollup`.
+    """
+
+    __tablename__ = "daily_appointment_stats"
+
+    day = sa.Column(Date, primary_key=True)
+    specialty_id = sa.Column(Integer, sa.ForeignKey("specialties.id"), primary_key=True)
+    status = sa.Column(Enum(AppointmentStatus), primary_key=True)
+    appointment_count = sa.Column(Integer, nullable=False, default=0)
+    revenue = sa.Column(Numeric(12, 2), nullable=False, default=0)
+    amount_charged = sa.Column(Numeric(12, 2), nullable=False, default=0)
+
+
 class RecurringSeries(Base):
+    """A repeating appointment. Short series are materialized as appointments when created; open-ended or long ones
+    are virtual: their occurrences get a row up to `RECURRING_HORIZON_WEEKS` ahead, and later ones are expanded on
+    the fly until the horizon reaches them or they are materialized, e.g. to modify, pay or cancel them.
+    """
+
     __tablename__ = "recurring_series"
 
     id = sa.Column(Integer, primary_key=True, index=True)
     frequency = sa.Column(Enum(RecurringFrequency), nullable=False)
     start_date = sa.Column(Date, nullable=False)
-    end_date = sa.Column(Date, nullable=True)  # Either end_date or number_of_appointments will be set
+    # When neither end_date nor number_of_appointments is set, the series never ends
+    end_date = sa.Column(Date, nullable=True)
     number_of_appointments = sa.Column(Integer, nullable=True)
 
+    patient_id = sa.Column(Integer, sa.ForeignKey("patients.id"), nullable=False)
+    patient = relationship("Patient")
+    specialty_id = sa.Column(Integer, sa.ForeignKey("specialties.id"), nullable=False)
+    specialty = relationship("Specialty")
+    start_time = sa.Column(DateTime, nullable=False)  # Start of the first occurrence
+    duration_minutes = sa.Column(Integer, nullable=False)
+    cost = sa.Column(Numeric(10, 2), nullable=False)
+    is_virtual = sa.Column(Boolean, nullable=False, default=False)
+    # Every occurrence before this index has its row, see `services.extend_virtual_series`
+    materialized_count = sa.Column(Integer, nullable=False, default=0, server_default="0")
+
     appointments = relationship("Appointment", back_populates="recurring_series")
 
 
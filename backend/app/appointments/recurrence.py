@@ -0,0 +1,105 @@
+from collections.abc import Iterator
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import or_, tuple_
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.interfaces import LoaderOption
+
+from app.common.dates import naive_utc
+
+from .models import Appointment, RecurringFrequency, RecurringSeries
+
+FREQUENCY_INTERVALS = {
+    RecurringFrequency.WEEKLY: timedelta(weeks=1),
+    RecurringFrequency.BIWEEKLY: timedelta(weeks=2),
+}
+
+
+def occurrence_starts(
+    first_start: datetime,
+    frequency: RecurringFrequency,
+    *,
+    end_date: date | None = None,
+    number_of_appointments: int | None = None,
+    from_index: int = 0,
+) -> Iterator[tuple[int, datetime]]:
+    """(index, start time) of the occurrences of a series, from `from_index` up to `end_date` (inclusive) or
+    `number_of_appointments`. Endless when neither is given.
+    """
+    interval = FREQUENCY_INTERVALS[frequency]
+    index = from_index
+    start_time = first_start + index * interval
+    while (end_date is None or start_time.date() <= end_date) and (
+        number_of_appointments is None or index < number_of_appointments
+    ):
+        yield index, start_time
+        index += 1
+        start_time += interval
+
+
+def occurrences_between(
+    series: RecurringSeries, lower: datetime | None, upper: datetime, *, lower_inclusive: bool = True
+) -> Iterator[tuple[int, datetime]]:
+    """Occurrences of `series` starting within [lower, upper], jumping straight to the first one instead of
+    walking the series from its start.
+    """
+    lower, upper = naive_utc(lower), naive_utc(upper)
+    first_index = 0
+    if lower is not None and lower > series.start_time:
+        # Ceiling division: the first occurrence at or after `lower`
+        first_index = -((series.start_time - lower) // FREQUENCY_INTERVALS[series.frequency])
+
+    for index, start_time in occurrence_starts(
+        series.start_time,
+        series.frequency,
+        end_date=series.end_date,
+        number_of_appointments=series.number_of_appointments,
+        from_index=first_index,
+    ):
+        if start_time > upper:
+            return
+        if lower_inclusive or start_time != lower:
+            yield index, start_time
+
+
+def unmaterialized_occurrences(
+    db: Session,
+    lower: datetime | None,
+    upper: datetime,
+    *,
+    lower_inclusive: bool = True,
+    patient_id: int | None = None,
+    options: tuple[LoaderOption, ...] = (),
+) -> list[tuple[RecurringSeries, int, datetime]]:
+    """(series, index, start time) of the occurrences of virtual series starting within [lower, upper] that have no
+    row yet, i.e. beyond the horizon and not materialized on demand.
+    """
+    series_query = (
+        db.query(RecurringSeries)
+        .options(*options)
+        .filter(RecurringSeries.is_virtual, RecurringSeries.start_time <= upper)
+    )
+    if lower is not None:
+        series_query = series_query.filter(
+            or_(RecurringSeries.end_date.is_(None), RecurringSeries.end_date >= lower.date())
+        )
+    if patient_id is not None:
+        series_query = series_query.filter(RecurringSeries.patient_id == patient_id)
+
+    candidates = [
+        (series, index, start_time)
+        for series in series_query
+        for index, start_time in occurrences_between(series, lower, upper, lower_inclusive=lower_inclusive)
+        if index >= series.materialized_count
+    ]
+    if not candidates:
+        return []
+
+    materialized = set(
+        db.query(Appointment.recurring_series_id, Appointment.occurrence_index).filter(
+            tuple_(Appointment.recurring_series_id, Appointment.occurrence_index).in_(
+                {(series.id, index) for series, index, _ in candidates}
+            )
+        )
+    )
+    return [candidate for candidate in candidates if (candidate[0].id, candidate[1]) not in materialized]
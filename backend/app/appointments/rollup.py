@@ -0,0 +1,186 @@
+"""Incremental maintenance of the `daily_appointment_stats` rollup.
+
+Every appointment contributes one to the count, its cost to the revenue and the sum of its payments to the
+amount charged of its (day, specialty, status) row. The services layer removes an appointment's contribution
+before changing it and adds it back afterwards, so range metrics can read a handful of rollup rows instead of
+aggregating the raw tables. `rebuild_daily_stats` recomputes everything for backfills.
+
+Rows are changed with a single upsert that adds the differences in the database (`col = col + :delta`), like
+`app.patients.balances.add_to_balances` does, so concurrent workers touching the same day don't lose updates. The
+same differences are passed on to the running balances of the patients.
+"""
+
+from collections.abc import Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from typing import NamedTuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.patients.balances import add_to_balances, amount_due
+from app.payments.models import Payment
+
+from . import models
+
+REBUILD_BATCH_SIZE = 1000
+
+StatsKey = tuple[date, int, models.AppointmentStatus]
+
+
+class _Contribution(NamedTuple):
+    """What an appointment adds to its rollup row and to its patient's balance."""
+
+    key: StatsKey
+    patient_id: int
+    cost: Decimal
+    due: Decimal
+    charged: Decimal
+
+
+def amount_charged(db: Session, appointment_id: int) -> Decimal:
+    total = db.query(func.coalesce(func.sum(Payment.amount), 0)).filter(Payment.appointment_id == appointment_id)
+    return Decimal(str(total.scalar()))
+
+
+def _contribution(appointment: models.Appointment, charged: Decimal) -> _Contribution:
+    return _Contribution(
+        key=(appointment.start_time.date(), appointment.specialty_id, appointment.status),
+        patient_id=appointment.patient_id,
+        cost=Decimal(str(appointment.cost)),
+        due=amount_due(appointment),
+        charged=charged,
+    )
+
+
+def _apply(db: Session, changes: Iterable[tuple[int, _Contribution]]) -> None:
+    """Adds each contribution times its sign, with one upsert for the rollup and one UPDATE for the balances."""
+    stats: dict[StatsKey, list] = {}
+    balances: dict[int, list[Decimal]] = {}
+    for sign, change in changes:
+        row = stats.setdefault(change.key, [0, Decimal(0), Decimal(0)])
+        row[0] += sign
+        row[1] += sign * change.cost
+        row[2] += sign * change.charged
+        balance = balances.setdefault(change.patient_id, [Decimal(0), Decimal(0)])
+        balance[0] += sign * change.due
+        balance[1] += sign * change.charged
+    _add_to_stats(db, stats)
+    add_to_balances(db, {patient_id: (due, paid) for patient_id, (due, paid) in balances.items()})
+
+
+def _add_to_stats(db: Session, deltas: Mapping[StatsKey, list]) -> None:
+    """Adds the (count, revenue, amount charged) differences to their rows, creating the missing ones."""
+    values = [
+        {
+            "day": day,
+            "specialty_id": specialty_id,
+            "status": status,
+            "appointment_count": count,
+            "revenue": revenue,
+            "amount_charged": charged,
+        }
+        for (day, specialty_id, status), (count, revenue, charged) in deltas.items()
+        if count or revenue or charged
+    ]
+    if not values:
+        return
+    table = models.DailyAppointmentStats.__table__
+    statement = insert(table).values(values)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.specialty_id, table.c.status],
+            set_={
+                "appointment_count": table.c.appointment_count + statement.excluded.appointment_count,
+                "revenue": table.c.revenue + statement.excluded.revenue,
+                "amount_charged": table.c.amount_charged + statement.excluded.amount_charged,
+            },
+        )
+    )
+
+
+def add_appointment(db: Session, appointment: models.Appointment, charged: Decimal | None = None) -> None:
+    """Adds a new or restored appointment. Pass `charged` when its payments are already known, e.g. 0 for a
+    brand new appointment, to skip the payments lookup.
+    """
+    if charged is None:
+        charged = amount_charged(db, appointment.id)
+    _apply(db, [(1, _contribution(appointment, charged))])
+
+
+def add_new_appointments(db: Session, appointments: list[models.Appointment]) -> None:
+    """Adds many brand new (so unpaid) appointments with a single upsert."""
+    _apply(db, ((1, _contribution(appointment, Decimal(0))) for appointment in appointments))
+
+
+def remove_appointment(db: Session, appointment: models.Appointment, charged: Decimal | None = None) -> None:
+    if charged is None:
+        charged = amount_charged(db, appointment.id)
+    _apply(db, [(-1, _contribution(appointment, charged))])
+
+
+@contextmanager
+def tracking(db: Session, appointment: models.Appointment) -> Iterator[None]:
+    """Moves the appointment's contribution to wherever the changes made inside the block put it. Nothing is
+    applied if the block raises.
+    """
+    charged = amount_charged(db, appointment.id)
+    before = _contribution(appointment, charged)
+    yield
+    _apply(db, [(-1, before), (1, _contribution(appointment, charged))])
+
+
+def add_payment_amount(db: Session, appointment_id: int | None, amount: Decimal) -> None:
+    """Adds a payment (or, with a negative amount, removes one) to its appointment's row."""
+    if appointment_id is None:
+        return
+    appointment = db.get(models.Appointment, appointment_id)
+    if appointment is None:
+        return
+    amount = Decimal(str(amount))
+    _add_to_stats(db, {(appointment.start_time.date(), appointment.specialty_id, appointment.status): [0, 0, amount]})
+    add_to_balances(db, {appointment.patient_id: (Decimal(0), amount)})
+
+
+def rebuild_daily_stats(db: Session) -> int:
+    """Recomputes the whole rollup from appointments and payments. Returns the number of rows written."""
+    paid = (
+        select(Payment.appointment_id, func.sum(Payment.amount).label("amount"))
+        .group_by(Payment.appointment_id)
+        .subquery()
+    )
+    appointments = (
+        select(
+            models.Appointment.start_time,
+            models.Appointment.specialty_id,
+            models.Appointment.status,
+            models.Appointment.cost,
+            func.coalesce(paid.c.amount, 0),
+        )
+        .outerjoin(paid, paid.c.appointment_id == models.Appointment.id)
+        .execution_options(yield_per=REBUILD_BATCH_SIZE)
+    )
+
+    totals: dict[tuple, list] = {}
+    for start_time, specialty_id, status, cost, charged in db.execute(appointments):
+        row = totals.setdefault((start_time.date(), specialty_id, status), [0, Decimal(0), Decimal(0)])
+        row[0] += 1
+        row[1] += Decimal(str(cost))
+        row[2] += Decimal(str(charged))
+
+    db.query(models.DailyAppointmentStats).delete()
+    db.add_all(
+        models.DailyAppointmentStats(
+            day=day,
+            specialty_id=specialty_id,
+            status=status,
+            appointment_count=count,
+            revenue=revenue,
+            amount_charged=charged,
+        )
+        for (day, specialty_id, status), (count, revenue, charged) in totals.items()
+    )
+    db.commit()
+    return len(totals)
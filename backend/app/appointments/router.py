@@ -1,9 +1,14 @@
 from datetime import date, datetime
-from typing import Annotated, Never
+from typing import Annotated
 
 from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from fastapi import status as http_status
 from sqlalchemy.orm import Session
 
+from app.common import pagination
+from app.common.pagination import CURSOR_DESCRIPTION, InvalidCursorError
+from app.core import cache
 from app.db.base import get_db
 from app.payments import schemas as payment_schemas
 from app.patients import services as patient_services
@@ -12,13 +17,21 @@ from app.specialties.rules import get_treatment_duration
 from app.users.logged import get_current_user
 from app.users.models import User
 
-from . import metrics, models, schemas, services
+from . import availability, metrics, models, schemas, services
+from .conflicts import SchedulingConflictError
 
 appointments_router = APIRouter()
 working_hours_router = APIRouter()
 metrics_router = APIRouter()
 
 
+def _conflict_response(e: SchedulingConflictError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={"message": str(e), **e.conflicts.model_dump()},
+    )
+
+
 @appointments_router.post("/", response_model=schemas.Appointment, status_code=status.HTTP_201_CREATED)
 def create_appointment(
     appointment: schemas.AppointmentCreate,
@@ -27,12 +40,26 @@ def create_appointment(
 ) -> schemas.Appointment:
     try:
         return services.create_appointment(db=db, appointment_in=appointment)
+    except SchedulingConflictError as e:
+        raise _conflict_response(e) from e
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
 
 
-@appointments_router.get("/", response_model=list[schemas.Appointment], status_code=status.HTTP_200_OK)
-def get_appointments(
+@appointments_router.post("/batch/", response_model=list[schemas.AppointmentBatchResult])
+def create_appointments(
+    appointments: Annotated[list[schemas.AppointmentCreate], Body(min_length=1, max_length=services.MAX_BATCH_SIZE)],
+    db: Annotated[Session, Depends(get_db)],
+    _current_user: Annotated[User, Depends(get_current_user)],
+) -> list[schemas.AppointmentBatchResult]:
+    return services.create_appointments(db=db, appointments_in=appointments)
+
+
+@appointments_router.get(
+    "/", response_model=list[schemas.Appointment | schemas.VirtualOccurrence], status_code=status.HTTP_200_OK
+)
+def get_appointments(  # noqa: PLR0913
+    response: Response,
     db: Annotated[Session, Depends(get_db)],
     _current_user: Annotated[User, Depends(get_current_user)],
     skip: int = 0,
@@ -45,17 +72,27 @@ def get_appointments(
         Query(description="Filter by appointment status. Can be specified multiple times."),
     ] = None,
     show_canceled: bool = False,
-) -> list[schemas.Appointment]:
-    return services.get_appointments(
-        db=db,
-        skip=skip,
-        limit=limit,
-        start_time=start_time,
-        end_time=end_time,
-        patient_id=patient_id,
-        status=status,
-        show_canceled=show_canceled,
-    )
+    cursor: Annotated[str | None, Query(description=CURSOR_DESCRIPTION)] = None,
+) -> list[schemas.Appointment | schemas.VirtualOccurrence]:
+    try:
+        appointments = services.get_appointments(
+            db=db,
+            skip=skip,
+            limit=limit,
+            start_time=start_time,
+            end_time=end_time,
+            patient_id=patient_id,
+            status=status,
+            show_canceled=show_canceled,
+            cursor=cursor,
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=str(e)) from None
+    # Pages are counted in rows; unsaved occurrences of recurring series come on top
+    rows = [appointment for appointment in appointments if isinstance(appointment, models.Appointment)]
+    if next_cursor := pagination.next_cursor(rows, limit, key=lambda a: (a.start_time, a.id)):
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return appointments
 
 
 @appointments_router.get("/suggested-duration/")
@@ -66,7 +103,7 @@ def get_suggested_treatment_duration(
     db: Annotated[Session, Depends(get_db)],
     _current_user: Annotated[User, Depends(get_current_user)],
 ) -> int:
-    db_specialty = specialty_services.get_specialty_by_id(db, specialty_id=specialty_id)
+    db_specialty = specialty_services.get_specialty_settings(db, specialty_id=specialty_id)
     if not db_specialty:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Specialty not found")
     logic_key = db_specialty.treatment_duration_logic
@@ -86,15 +123,82 @@ def get_suggested_treatment_duration(
     return get_treatment_duration(logic_key, db_patient, session_count)
 
 
-@appointments_router.post("/recurring/", status_code=status.HTTP_501_NOT_IMPLEMENTED, response_model=None)
+@appointments_router.get("/availability/", response_class=StreamingResponse)
+def get_availability(
+    specialty_id: int,
+    start_date: Annotated[date, Query(description="First day to search, in the clinic's timezone")],
+    end_date: Annotated[date, Query(description="Last day to search, inclusive")],
+    db: Annotated[Session, Depends(get_db)],
+    _current_user: Annotated[User, Depends(get_current_user)],
+) -> StreamingResponse:
+    """Free slots of the specialty's default duration, streamed as one JSON line per day:
+    `{"date": "2030-01-07", "slots": ["09:00", "09:30"]}`, with slot start times in the clinic's timezone.
+    """
+    try:
+        lines = availability.get_availability(db, specialty_id=specialty_id, start_date=start_date, end_date=end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+    if lines is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Specialty not found")
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@appointments_router.get("/conflicts/", response_model=schemas.SchedulingConflicts)
+def get_conflicts(
+    start_time: datetime,
+    end_time: datetime,
+    db: Annotated[Session, Depends(get_db)],
+    _current_user: Annotated[User, Depends(get_current_user)],
+    exclude_id: Annotated[int | None, Query(description="Appointment being moved, ignored as a conflict")] = None,
+) -> schemas.SchedulingConflicts:
+    """Appointments overlapping [start_time, end_time) and whether that slot is outside the working hours."""
+    try:
+        return services.get_conflicts(db, start_time=start_time, end_time=end_time, exclude_id=exclude_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+
+
+@appointments_router.post("/recurring/", response_model=schemas.RecurringSeries, status_code=status.HTTP_201_CREATED)
 def create_recurring_appointments(
-    _series: schemas.RecurringSeriesCreate,
-    _db: Annotated[Session, Depends(get_db)],
+    series: schemas.RecurringSeriesCreate,
+    db: Annotated[Session, Depends(get_db)],
     _current_user: Annotated[User, Depends(get_current_user)],
-) -> Never:
-    raise HTTPException(
-        status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Recurring appointments creation is not yet implemented."
-    )
+) -> schemas.RecurringSeries:
+    try:
+        return services.create_recurring_series(db=db, series_in=series)
+    except SchedulingConflictError as e:
+        raise _conflict_response(e) from e
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+
+
+@appointments_router.get("/recurring/{series_id}/", response_model=schemas.RecurringSeries)
+def get_recurring_series(
+    series_id: int,
+    db: Annotated[Session, Depends(get_db)],
+    _current_user: Annotated[User, Depends(get_current_user)],
+) -> schemas.RecurringSeries:
+    db_series = services.get_recurring_series(db, series_id=series_id)
+    if db_series is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Recurring series not found")
+    return db_series
+
+
+@appointments_router.post("/recurring/{series_id}/occurrences/{occurrence_index}/", response_model=schemas.Appointment)
+def materialize_occurrence(
+    series_id: int,
+    occurrence_index: int,
+    db: Annotated[Session, Depends(get_db)],
+    _current_user: Annotated[User, Depends(get_current_user)],
+) -> schemas.Appointment:
+    """Gives an occurrence of a series its own appointment, so it can be modified, paid or cancelled."""
+    try:
+        db_appointment = services.materialize_occurrence(db, series_id=series_id, occurrence_index=occurrence_index)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+    if db_appointment is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Recurring series not found")
+    return db_appointment
 
 
 @appointments_router.get("/{appointment_id}/", response_model=schemas.Appointment)
@@ -128,9 +232,14 @@ def update_appointment(
     db: Annotated[Session, Depends(get_db)],
     _current_user: Annotated[User, Depends(get_current_user)],
 ) -> schemas.Appointment:
-    db_appointment = services.update_appointment(
-        db, appointment_id=appointment_id, appointment_update=appointment_update
-    )
+    try:
+        db_appointment = services.update_appointment(
+            db, appointment_id=appointment_id, appointment_update=appointment_update
+        )
+    except SchedulingConflictError as e:
+        raise _conflict_response(e) from e
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
     if db_appointment is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appointment not found")
     return db_appointment
@@ -154,7 +263,12 @@ def restore_appointment(
     db: Annotated[Session, Depends(get_db)],
     _current_user: Annotated[User, Depends(get_current_user)],
 ) -> schemas.Appointment:
-    db_appointment = services.restore_appointment(db, appointment_id=appointment_id)
+    try:
+        db_appointment = services.restore_appointment(db, appointment_id=appointment_id)
+    except SchedulingConflictError as e:
+        raise _conflict_response(e) from e
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
     if db_appointment is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appointment not found")
     return db_appointment
@@ -166,7 +280,10 @@ def delete_appointment(
     db: Annotated[Session, Depends(get_db)],
     _current_user: Annotated[User, Depends(get_current_user)],
 ) -> Response:
-    db_appointment = services.delete_appointment(db, appointment_id=appointment_id)
+    try:
+        db_appointment = services.delete_appointment(db, appointment_id=appointment_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
     if db_appointment is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appointment not found")
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -179,7 +296,14 @@ def reschedule_appointment(
     db: Annotated[Session, Depends(get_db)],
     _current_user: Annotated[User, Depends(get_current_user)],
 ) -> schemas.Appointment:
-    db_appointment = services.reschedule_appointment(db, appointment_id=appointment_id, new_start_time=new_start_time)
+    try:
+        db_appointment = services.reschedule_appointment(
+            db, appointment_id=appointment_id, new_start_time=new_start_time
+        )
+    except SchedulingConflictError as e:
+        raise _conflict_response(e) from e
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
     if db_appointment is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appointment not found")
     return db_appointment
@@ -236,6 +360,12 @@ def get_appointment_metrics(
     return metrics.get_appointment_metrics(start_date=start_date, end_date=end_date, db=db)
 
 
+@metrics_router.get("/cache/")
+def get_cache_metrics(_current_user: Annotated[User, Depends(get_current_user)]) -> dict[str, dict[str, int]]:
+    """Hits, misses and size of the reference data caches of this worker."""
+    return cache.cache_stats()
+
+
 @metrics_router.get("/dashboard/", response_model=schemas.DashboardMetrics)
 def get_dashboard_metrics(
     db: Annotated[Session, Depends(get_db)], _current_user: Annotated[User, Depends(get_current_user)]
@@ -86,6 +86,8 @@ class Appointment(AppointmentBase):
     payments: list[Payment] = []
     total_paid: Decimal = Field(0, ge=0)
     suggested_treatment_duration_minutes: int | None = None
+    recurring_series_id: int | None = None
+    occurrence_index: int | None = None
 
     patient: MinPatientInfo
 
@@ -97,6 +99,67 @@ class Appointment(AppointmentBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class VirtualOccurrence(BaseModel):
+    """An occurrence of a virtual recurring series beyond the materialized horizon. It has no row, so no id, until
+    `POST /appointments/recurring/{series_id}/occurrences/{occurrence_index}/` gives it one.
+    """
+
+    series_id: int
+    occurrence_index: int
+    start_time: datetime
+    end_time: datetime
+    cost: Decimal
+    status: AppointmentStatus = AppointmentStatus.SCHEDULED
+    total_paid: Decimal = Decimal(0)
+
+    @field_validator('start_time', 'end_time', mode='before')
+    def ensure_utc(cls, v):
+        if isinstance(v, datetime) and v.tzinfo is None:
+            # Assume naive datetimes are UTC
+            return v.replace(tzinfo=UTC)
+        return v
+
+    @field_serializer('start_time', 'end_time')
+    def serialize_datetime(self, dt: datetime) -> str:
+        return dt.isoformat().replace('+00:00', 'Z')
+
+    patient: MinPatientInfo
+    specialty: MinSpecialtyInfo
+
+    @computed_field
+    @property
+    def cancelled(self) -> bool:
+        return False
+
+
+class OccurrenceRef(BaseModel):
+    series_id: int
+    occurrence_index: int
+
+    model_config = ConfigDict(frozen=True)
+
+
+class SchedulingConflicts(BaseModel):
+    appointment_ids: list[int] = []
+    # Overlapping occurrences of recurring series that have no appointment yet
+    occurrences: list[OccurrenceRef] = []
+    outside_working_hours: bool = False
+
+    @computed_field
+    @property
+    def has_conflicts(self) -> bool:
+        return bool(self.appointment_ids) or bool(self.occurrences) or self.outside_working_hours
+
+
+class AppointmentBatchResult(BaseModel):
+    """Outcome of one item of a batch creation, in the same position as the request item."""
+
+    index: int
+    appointment: Appointment | None = None
+    error: str | None = None
+    conflicts: SchedulingConflicts | None = None
+
+
 class AppointmentMetrics(BaseModel):
     total_appointments: int
     total_revenue: Decimal
@@ -126,22 +189,38 @@ class RecurringSeriesCreate(BaseModel):
     specialty_id: int
     start_time: datetime  # Time of the first appointment
     frequency: RecurringFrequency
+    # Cost is optional; if not provided, it will be fetched from the patient's or the specialty's current price
+    cost: Decimal | None = Field(None, ge=0)
 
-    # User must provide one of these
+    # At most one of these. Without either, the series never ends
     end_date: date | None = None
     number_of_appointments: int | None = Field(None, gt=1)
 
     @model_validator(mode="after")
     def check_end_condition(self) -> "RecurringSeriesCreate":
-        if self.end_date is None and self.number_of_appointments is None:
-            msg = "Either end_date or number_of_appointments must be provided."
-            raise ValueError(msg)
         if self.end_date is not None and self.number_of_appointments is not None:
             msg = "Only one of end_date or number_of_appointments should be provided."
             raise ValueError(msg)
         return self
 
 
+class RecurringSeries(BaseModel):
+    id: int
+    patient_id: int
+    specialty_id: int
+    frequency: RecurringFrequency
+    start_time: datetime
+    end_date: date | None = None
+    number_of_appointments: int | None = None
+    duration_minutes: int
+    cost: Decimal
+    is_virtual: bool
+    # Materialized occurrences. All of them unless the series is virtual
+    appointments: list[Appointment] = []
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class WorkingHoursBase(BaseModel):
     day_of_week: DayOfWeek = Field(alias="dayOfWeek")
     start_time: time | None = Field(None, alias="startTime")
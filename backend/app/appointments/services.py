@@ -1,49 +1,78 @@
-from datetime import datetime, timedelta
+from bisect import bisect_left
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+from itertools import islice, takewhile
 
-from sqlalchemy import case
-from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, joinedload, selectinload
 
 from app.appointments.models import DayOfWeek
-from app.patients.services import get_special_price
+from app.common.dates import naive_utc
+from app.common.pagination import decode_cursor, keyset_after
+from app.core.config import settings
+from app.patients.models import Patient
+from app.patients.services import get_special_price, get_special_prices
 from app.payments import models as payment_models
 from app.payments import schemas as payment_schemas
 from app.payments import services as payment_services
 from app.specialties.rules import get_treatment_duration
-from app.specialties.services import get_current_price_for_specialty, get_specialty_by_id
+from app.specialties.models import Specialty
+from app.specialties.schemas import SpecialtySettings
+from app.specialties.services import (
+    get_current_price_for_specialty,
+    get_current_prices_for_specialties,
+    get_specialty_settings,
+)
 
-from . import models, schemas
+from . import conflicts, models, recurrence, rollup, schemas
+from .loaders import appointment_response_options
+
+MAX_BATCH_SIZE = 500
 
 
 def create_appointment(
     db: Session,
     appointment_in: schemas.AppointmentCreate,
 ) -> models.Appointment:
-    specialty = get_specialty_by_id(db, appointment_in.specialty_id)
+    specialty = get_specialty_settings(db, appointment_in.specialty_id)
     if not specialty:
         msg = "Specialty not found"
         raise ValueError(msg)
 
     cost = appointment_in.cost
     if cost is None:
-        # Check for a patient-specific price for this specialty
-        special_price = get_special_price(db, appointment_in.patient_id, appointment_in.specialty_id)
-        if special_price:
-            cost = special_price.price
-        else:
-            # Fallback to the specialty's current price
-            current_price = get_current_price_for_specialty(db, appointment_in.specialty_id)
-            if current_price is None:
-                msg = "Cannot create appointment: Specialty has no price defined."
-                raise ValueError(
-                    msg,
-                )
-            cost = current_price
+        cost = _default_cost(db, appointment_in.patient_id, appointment_in.specialty_id)
+
+    db_appointment = _new_appointment(appointment_in, specialty, cost)
+    conflicts.check_conflicts(db, db_appointment.start_time, db_appointment.end_time)
+    db.add(db_appointment)
+    rollup.add_appointment(db, db_appointment, charged=Decimal(0))
+    db.commit()
+    db.refresh(db_appointment)
+    return db_appointment
+
+
+def _default_cost(db: Session, patient_id: int, specialty_id: int) -> Decimal:
+    # Check for a patient-specific price for this specialty
+    special_price = get_special_price(db, patient_id, specialty_id)
+    if special_price:
+        return special_price.price
+    # Fallback to the specialty's current price
+    current_price = get_current_price_for_specialty(db, specialty_id)
+    if current_price is None:
+        msg = "Cannot create appointment: Specialty has no price defined."
+        raise ValueError(msg)
+    return current_price
 
+
+def _new_appointment(
+    appointment_in: schemas.AppointmentCreate, specialty: Specialty | SpecialtySettings, cost: Decimal
+) -> models.Appointment:
     end_time = appointment_in.end_time or appointment_in.start_time + timedelta(
         minutes=specialty.default_duration_minutes
     )
-
-    db_appointment = models.Appointment(
+    return models.Appointment(
         patient_id=appointment_in.patient_id,
         specialty_id=appointment_in.specialty_id,
         start_time=appointment_in.start_time,
@@ -51,10 +80,327 @@ def create_appointment(
         cost=cost,
         status=models.AppointmentStatus.SCHEDULED,
     )
+
+
+def create_appointments(db: Session, appointments_in: list[schemas.AppointmentCreate]) -> list[dict]:
+    """Creates many appointments in a single transaction.
+
+    Specialties, patients, patient-specific prices and current specialty prices are each resolved with one query
+    for the whole batch, with the same precedence as `create_appointment`. Items that can't be created get an
+    error in their result instead of failing the rest of the batch.
+    """
+    specialty_ids = {item.specialty_id for item in appointments_in}
+    specialties = {s.id: s for s in db.query(Specialty).filter(Specialty.id.in_(specialty_ids))}
+    patient_ids = {
+        patient_id
+        for (patient_id,) in db.query(Patient.id).filter(Patient.id.in_({item.patient_id for item in appointments_in}))
+    }
+    unpriced = [item for item in appointments_in if item.cost is None]
+    special_prices = get_special_prices(db, ((item.patient_id, item.specialty_id) for item in unpriced))
+    current_prices = get_current_prices_for_specialties(db, (item.specialty_id for item in unpriced))
+
+    results = []
+    candidates = []
+    for index, appointment_in in enumerate(appointments_in):
+        specialty = specialties.get(appointment_in.specialty_id)
+        cost = appointment_in.cost
+        if cost is None:
+            cost = special_prices.get((appointment_in.patient_id, appointment_in.specialty_id))
+        if cost is None:
+            cost = current_prices.get(appointment_in.specialty_id)
+
+        error = None
+        if specialty is None:
+            error = "Specialty not found"
+        elif appointment_in.patient_id not in patient_ids:
+            error = "Patient not found"
+        elif cost is None:
+            error = "Cannot create appointment: Specialty has no price defined."
+        else:
+            db_appointment = _new_appointment(appointment_in, specialty, cost)
+            try:
+                conflicts.validate_interval(db_appointment.start_time, db_appointment.end_time)
+            except ValueError as e:
+                error = str(e)
+        result = {"index": index, "appointment": None, "error": error}
+        results.append(result)
+        if error is None:
+            candidates.append((result, db_appointment))
+
+    # Check every candidate against the calendar at once, then against the ones accepted before it
+    created = []
+    accepted: list[tuple[datetime, datetime]] = []
+    booked = conflicts.find_conflicts(db, [(a.start_time, a.end_time) for _, a in candidates])
+    for (result, db_appointment), appointment_conflicts in zip(candidates, booked, strict=True):
+        interval = (naive_utc(db_appointment.start_time), naive_utc(db_appointment.end_time))
+        position = bisect_left(accepted, interval)
+        if appointment_conflicts.has_conflicts:
+            result["error"] = str(conflicts.SchedulingConflictError(appointment_conflicts))
+            result["conflicts"] = appointment_conflicts
+        elif (position > 0 and accepted[position - 1][1] > interval[0]) or (
+            position < len(accepted) and accepted[position][0] < interval[1]
+        ):
+            result["error"] = "The appointment overlaps with another appointment of the batch."
+        else:
+            accepted.insert(position, interval)
+            created.append(db_appointment)
+            result["appointment"] = db_appointment
+
+    db.add_all(created)
+    rollup.add_new_appointments(db, created)
+    db.flush()
+    created_ids = [db_appointment.id for db_appointment in created]
+    db.commit()
+
+    # Reload the created appointments with everything the response serializes in one go
+    loaded = {
+        a.id: a
+        for a in db.query(models.Appointment)
+        .options(*appointment_response_options())
+        .filter(models.Appointment.id.in_(created_ids))
+    }
+    created_ids.reverse()
+    for result in results:
+        if result["appointment"] is not None:
+            result["appointment"] = loaded[created_ids.pop()]
+    return results
+
+
+def create_recurring_series(db: Session, series_in: schemas.RecurringSeriesCreate) -> models.RecurringSeries:
+    """Creates a series. Every occurrence costs the same, so the price is resolved once.
+
+    A series with up to `MAX_BATCH_SIZE` occurrences is materialized right away, with one multi-row INSERT in the
+    same transaction. Longer or open-ended series are virtual: their occurrences get a row up to the horizon (see
+    `extend_virtual_series`), `get_appointments` expands the later ones on the fly and `materialize_occurrence` gives
+    one a row when it needs to be modified, paid or cancelled.
+    """
+    specialty = get_specialty_settings(db, series_in.specialty_id)
+    if not specialty:
+        msg = "Specialty not found"
+        raise ValueError(msg)
+    if not db.query(Patient.id).filter(Patient.id == series_in.patient_id).first():
+        msg = "Patient not found"
+        raise ValueError(msg)
+    cost = series_in.cost
+    if cost is None:
+        cost = _default_cost(db, series_in.patient_id, series_in.specialty_id)
+
+    starts = list(
+        islice(
+            recurrence.occurrence_starts(
+                series_in.start_time,
+                series_in.frequency,
+                end_date=series_in.end_date,
+                number_of_appointments=series_in.number_of_appointments,
+            ),
+            MAX_BATCH_SIZE + 1,
+        )
+    )
+    if not starts:
+        msg = "The series has no occurrences before its end date."
+        raise ValueError(msg)
+    duration = timedelta(minutes=specialty.default_duration_minutes)
+    checked = starts
+    if len(starts) > MAX_BATCH_SIZE:
+        # An endless series can't be checked whole: check its first weeks, or up to the horizon if that's further
+        first_weeks = naive_utc(series_in.start_time) + timedelta(weeks=settings.RECURRING_HORIZON_WEEKS)
+        check_until = max(horizon(), first_weeks)
+        checked = [(index, start) for index, start in starts if naive_utc(start) <= check_until]
+    occurrence_conflicts = conflicts.find_conflicts(db, [(start, start + duration) for _, start in checked])
+    if any(c.has_conflicts for c in occurrence_conflicts):
+        raise conflicts.SchedulingConflictError(
+            schemas.SchedulingConflicts(
+                appointment_ids=sorted({i for c in occurrence_conflicts for i in c.appointment_ids}),
+                occurrences=sorted(
+                    {o for c in occurrence_conflicts for o in c.occurrences},
+                    key=lambda o: (o.series_id, o.occurrence_index),
+                ),
+                outside_working_hours=any(c.outside_working_hours for c in occurrence_conflicts),
+            )
+        )
+
+    db_series = models.RecurringSeries(
+        frequency=series_in.frequency,
+        start_date=series_in.start_time.date(),
+        end_date=series_in.end_date,
+        number_of_appointments=series_in.number_of_appointments,
+        patient_id=series_in.patient_id,
+        specialty_id=series_in.specialty_id,
+        start_time=series_in.start_time,
+        duration_minutes=specialty.default_duration_minutes,
+        cost=cost,
+        is_virtual=len(starts) > MAX_BATCH_SIZE,
+        materialized_count=0 if len(starts) > MAX_BATCH_SIZE else len(starts),
+    )
+    db.add(db_series)
+    db.flush()
+
+    if db_series.is_virtual:
+        _extend_series(db, db_series, horizon())
+    else:
+        db_appointments = db.scalars(
+            insert(models.Appointment).returning(models.Appointment),
+            [_occurrence_values(db_series, index, start_time) for index, start_time in starts],
+        ).all()
+        rollup.add_new_appointments(db, db_appointments)
+    db.commit()
+    return get_recurring_series(db, db_series.id)
+
+
+def horizon() -> datetime:
+    """Occurrences of virtual series starting up to here have their own row."""
+    return naive_utc(datetime.now(tz=UTC)) + timedelta(weeks=settings.RECURRING_HORIZON_WEEKS)
+
+
+def extend_virtual_series(db: Session, until: datetime | None = None) -> int:
+    """Gives a row to every occurrence of the virtual series starting up to `until`, the horizon by default, so
+    listings, metrics, balances and exports see them as regular appointments. Runs on startup and is meant to run
+    daily (scripts/extend_recurring_series.py). Returns the number of appointments created.
+
+    Later occurrences only show up in the calendar, i.e. `get_appointments` with an `end_time`. Metrics, balances,
+    patient summaries and histories and exports count rows only.
+
+    Occurrences that already have a row, because they were materialized on demand or another worker got there
+    first, are skipped by the unique (series, occurrence) index.
+    """
+    until = naive_utc(until) if until is not None else horizon()
+    created = sum(
+        _extend_series(db, db_series, until)
+        for db_series in db.query(models.RecurringSeries).filter(models.RecurringSeries.is_virtual)
+    )
+    db.commit()
+    return created
+
+
+def _extend_series(db: Session, series: models.RecurringSeries, until: datetime) -> int:
+    occurrences = list(
+        takewhile(
+            lambda occurrence: naive_utc(occurrence[1]) <= until,
+            recurrence.occurrence_starts(
+                series.start_time,
+                series.frequency,
+                end_date=series.end_date,
+                number_of_appointments=series.number_of_appointments,
+                from_index=series.materialized_count,
+            ),
+        )
+    )
+    if not occurrences:
+        return 0
+    db_appointments = db.scalars(
+        sqlite_insert(models.Appointment)
+        .on_conflict_do_nothing(index_elements=["recurring_series_id", "occurrence_index"])
+        .returning(models.Appointment),
+        [_occurrence_values(series, index, start_time) for index, start_time in occurrences],
+    ).all()
+    rollup.add_new_appointments(db, db_appointments)
+    series.materialized_count = occurrences[-1][0] + 1
+    return len(db_appointments)
+
+
+def _occurrence_values(series: models.RecurringSeries, occurrence_index: int, start_time: datetime) -> dict:
+    return {
+        "patient_id": series.patient_id,
+        "specialty_id": series.specialty_id,
+        "start_time": start_time,
+        "end_time": start_time + timedelta(minutes=series.duration_minutes),
+        "cost": series.cost,
+        "status": models.AppointmentStatus.SCHEDULED,
+        "recurring_series_id": series.id,
+        "occurrence_index": occurrence_index,
+    }
+
+
+def get_recurring_series(db: Session, series_id: int) -> models.RecurringSeries | None:
+    return (
+        db.query(models.RecurringSeries)
+        .options(
+            selectinload(models.RecurringSeries.appointments).options(*appointment_response_options()),
+        )
+        .filter(models.RecurringSeries.id == series_id)
+        .first()
+    )
+
+
+def materialize_occurrence(db: Session, series_id: int, occurrence_index: int) -> models.Appointment | None:
+    """Returns the appointment of an occurrence of a series, creating its row if it's still virtual."""
+    db_series = db.query(models.RecurringSeries).filter(models.RecurringSeries.id == series_id).first()
+    if not db_series:
+        return None
+
+    existing = (
+        db.query(models.Appointment.id)
+        .filter(
+            models.Appointment.recurring_series_id == series_id,
+            models.Appointment.occurrence_index == occurrence_index,
+        )
+        .scalar()
+    )
+    if existing is not None:
+        return get_appointment(db, existing)
+
+    occurrence = None
+    if occurrence_index >= 0:
+        occurrence = next(
+            recurrence.occurrence_starts(
+                db_series.start_time,
+                db_series.frequency,
+                end_date=db_series.end_date,
+                number_of_appointments=db_series.number_of_appointments,
+                from_index=occurrence_index,
+            ),
+            None,
+        )
+    if occurrence is None:
+        msg = "The series has no such occurrence."
+        raise ValueError(msg)
+
+    db_appointment = models.Appointment(**_occurrence_values(db_series, *occurrence))
     db.add(db_appointment)
+    rollup.add_appointment(db, db_appointment, charged=Decimal(0))
     db.commit()
-    db.refresh(db_appointment)
-    return db_appointment
+    return get_appointment(db, db_appointment.id)
+
+
+def get_virtual_occurrences(
+    db: Session,
+    lower: datetime | None,
+    upper: datetime,
+    *,
+    lower_inclusive: bool,
+    ends_by: datetime,
+    patient_id: int | None,
+) -> list[tuple[datetime, schemas.VirtualOccurrence]]:
+    """(start_time, occurrence) of the occurrences of virtual series starting within [lower, upper] and ending by
+    `ends_by` that have no row yet.
+    """
+    ends_by = naive_utc(ends_by)
+    return [
+        (
+            start_time,
+            schemas.VirtualOccurrence.model_validate(
+                {
+                    "series_id": db_series.id,
+                    "occurrence_index": index,
+                    "start_time": start_time,
+                    "end_time": start_time + timedelta(minutes=db_series.duration_minutes),
+                    "cost": db_series.cost,
+                    "patient": db_series.patient,
+                    "specialty": db_series.specialty,
+                },
+                from_attributes=True,
+            ),
+        )
+        for db_series, index, start_time in recurrence.unmaterialized_occurrences(
+            db,
+            lower,
+            upper,
+            lower_inclusive=lower_inclusive,
+            patient_id=patient_id,
+            options=(joinedload(models.RecurringSeries.patient), joinedload(models.RecurringSeries.specialty)),
+        )
+        if start_time + timedelta(minutes=db_series.duration_minutes) <= ends_by
+    ]
 
 
 def cancel_appointment(db: Session, appointment_id: int) -> models.Appointment | None:
@@ -62,7 +408,8 @@ def cancel_appointment(db: Session, appointment_id: int) -> models.Appointment |
     if not db_appointment:
         return None
 
-    db_appointment.status = models.AppointmentStatus.CANCELLED
+    with rollup.tracking(db, db_appointment):
+        db_appointment.status = models.AppointmentStatus.CANCELLED
     db.commit()
     db.refresh(db_appointment)
     return db_appointment
@@ -76,11 +423,13 @@ def restore_appointment(db: Session, appointment_id: int) -> models.Appointment
     if db_appointment.status != models.AppointmentStatus.CANCELLED:
         msg = "Only cancelled appointments can be deleted."
         raise ValueError(msg)
+    conflicts.check_conflicts(db, db_appointment.start_time, db_appointment.end_time, exclude_id=appointment_id)
 
-    if db_appointment.start_time < datetime.now(tz=db_appointment.start_time.tzinfo):
-        db_appointment.status = models.AppointmentStatus.COMPLETED
-    else:
-        db_appointment.status = models.AppointmentStatus.SCHEDULED
+    with rollup.tracking(db, db_appointment):
+        if db_appointment.start_time < datetime.now(tz=db_appointment.start_time.tzinfo):
+            db_appointment.status = models.AppointmentStatus.COMPLETED
+        else:
+            db_appointment.status = models.AppointmentStatus.SCHEDULED
     db.commit()
     db.refresh(db_appointment)
     return db_appointment
@@ -93,7 +442,12 @@ def delete_appointment(db: Session, appointment_id: int) -> models.Appointment |
     if db_appointment.status != models.AppointmentStatus.CANCELLED:
         msg = "Only cancelled appointments can be deleted."
         raise ValueError(msg)
+    if db_appointment.recurring_series is not None and db_appointment.recurring_series.is_virtual:
+        # Without its row the occurrence would be expanded again as a scheduled one
+        msg = "Cancelled occurrences of an open-ended series can't be deleted."
+        raise ValueError(msg)
 
+    rollup.remove_appointment(db, db_appointment)
     db.delete(db_appointment)
     db.commit()
     return db_appointment
@@ -110,10 +464,12 @@ def reschedule_appointment(
 
     # Calculate the original duration before updating start_time
     original_duration = original_appointment.end_time - original_appointment.start_time
+    conflicts.check_conflicts(db, new_start_time, new_start_time + original_duration, exclude_id=appointment_id)
 
-    original_appointment.start_time = new_start_time
-    original_appointment.end_time = new_start_time + original_duration
-    original_appointment.status = models.AppointmentStatus.RESCHEDULED
+    with rollup.tracking(db, original_appointment):
+        original_appointment.start_time = new_start_time
+        original_appointment.end_time = new_start_time + original_duration
+        original_appointment.status = models.AppointmentStatus.RESCHEDULED
 
     db.add(original_appointment)
     db.commit()
@@ -132,9 +488,15 @@ def get_appointments(  # noqa: PLR0913
     status: list[models.AppointmentStatus] | None = None,
     *,
     show_canceled: bool = False,
-) -> list[models.Appointment]:
-    """Get appointments with patient and specialty data for calendar display"""
-    base_query = db.query(models.Appointment)
+    cursor: str | None = None,
+) -> list[models.Appointment | schemas.VirtualOccurrence]:
+    """Get appointments with patient and specialty data for calendar display.
+    When a cursor is given, continues after the (start_time, id) it encodes and `skip` is ignored.
+
+    When the window has an end, the occurrences of virtual recurring series beyond the horizon that have no row
+    yet are merged in as `VirtualOccurrence`s. Without an end they'd be endless, so they are left out.
+    """
+    base_query = db.query(models.Appointment).options(*appointment_response_options())
 
     if patient_id is not None:
         base_query = base_query.filter(models.Appointment.patient_id == patient_id)
@@ -147,11 +509,49 @@ def get_appointments(  # noqa: PLR0913
     if end_time is not None:
         base_query = base_query.filter(models.Appointment.end_time <= end_time)
 
-    return base_query.order_by(models.Appointment.start_time).offset(skip).limit(limit).all()
+    sort_key = (models.Appointment.start_time, models.Appointment.id)
+    lower, lower_inclusive = start_time, True
+    if cursor is not None:
+        cursor_values = decode_cursor(cursor, datetime, int)
+        base_query = base_query.filter(keyset_after(sort_key, cursor_values))
+        lower, lower_inclusive = cursor_values[0], False
+        skip = 0
+
+    appointments = base_query.order_by(*sort_key).offset(skip).limit(limit).all()
+
+    # Occurrences of virtual series can only be listed within a bounded window, and only on keyset pages
+    if end_time is None or skip or (status is not None and models.AppointmentStatus.SCHEDULED not in status):
+        return appointments
+    upper = end_time
+    if limit and len(appointments) == limit:
+        # The next page continues after the last row, so stop there
+        upper = appointments[-1].start_time
+    virtual = get_virtual_occurrences(
+        db, lower, upper, lower_inclusive=lower_inclusive, ends_by=end_time, patient_id=patient_id
+    )
+    if not virtual:
+        return appointments
+    # Virtual occurrences go before rows starting at the same time, so a full page always ends with a row
+    merged = [(a.start_time, 1, a) for a in appointments] + [(start, 0, a) for start, a in virtual]
+    merged.sort(key=lambda item: item[:2])
+    return [appointment for _, _, appointment in merged]
+
+
+def get_conflicts(
+    db: Session, start_time: datetime, end_time: datetime, exclude_id: int | None = None
+) -> schemas.SchedulingConflicts:
+    conflicts.validate_interval(start_time, end_time)
+    exclude_ids = [exclude_id] if exclude_id is not None else []
+    return conflicts.find_conflicts(db, [(start_time, end_time)], exclude_ids=exclude_ids)[0]
 
 
 def get_appointment(db: Session, appointment_id: int) -> models.Appointment | None:
-    return db.query(models.Appointment).filter(models.Appointment.id == appointment_id).first()
+    return (
+        db.query(models.Appointment)
+        .options(*appointment_response_options())
+        .filter(models.Appointment.id == appointment_id)
+        .first()
+    )
 
 
 def count_past_appointments_for_specialty(
@@ -178,17 +578,30 @@ def update_appointment(
     db_appointment = db.query(models.Appointment).filter(models.Appointment.id == appointment_id).first()
     if not db_appointment:
         return None
+    # Only a new slot gets checked: rows booked before the check existed, or before the working hours changed, can
+    # still have their status or cost edited
+    moved = (naive_utc(appointment_update.start_time), naive_utc(appointment_update.end_time)) != (
+        naive_utc(db_appointment.start_time),
+        naive_utc(db_appointment.end_time),
+    )
+    restored = db_appointment.status == models.AppointmentStatus.CANCELLED
+    cancelled = (appointment_update.status or db_appointment.status) == models.AppointmentStatus.CANCELLED
+    if (moved or restored) and not cancelled:
+        conflicts.check_conflicts(
+            db, appointment_update.start_time, appointment_update.end_time, exclude_id=appointment_id
+        )
 
-    db_appointment.start_time = appointment_update.start_time
-    db_appointment.end_time = appointment_update.end_time
-    if appointment_update.cost is not None:
-        db_appointment.cost = appointment_update.cost
-    if appointment_update.status is not None:
-        db_appointment.status = appointment_update.status
-    if appointment_update.specialty_id is not None:
-        db_appointment.specialty_id = appointment_update.specialty_id
-    if appointment_update.patient_id is not None:
-        db_appointment.patient_id = appointment_update.patient_id
+    with rollup.tracking(db, db_appointment):
+        db_appointment.start_time = appointment_update.start_time
+        db_appointment.end_time = appointment_update.end_time
+        if appointment_update.cost is not None:
+            db_appointment.cost = appointment_update.cost
+        if appointment_update.status is not None:
+            db_appointment.status = appointment_update.status
+        if appointment_update.specialty_id is not None:
+            db_appointment.specialty_id = appointment_update.specialty_id
+        if appointment_update.patient_id is not None:
+            db_appointment.patient_id = appointment_update.patient_id
 
     db.commit()
     db.refresh(db_appointment)
@@ -211,6 +624,7 @@ def add_payment(
         patient_id=db_appointment.patient_id,
     )
     db.add(db_payment)
+    rollup.add_payment_amount(db, appointment_id, db_payment.amount)
 
     db.commit()
     db.refresh(db_payment)
@@ -220,41 +634,31 @@ def add_payment(
 def get_payments_for_appointment(db: Session, appointment_id: int) -> list[payment_models.Payment]:
     return (
         db.query(payment_models.Payment)
+        .options(joinedload(payment_models.Payment.payment_method))
         .filter(payment_models.Payment.appointment_id == appointment_id)
         .order_by(payment_models.Payment.payment_date.desc())
         .all()
     )
 
 
-def get_working_hours(db: Session) -> list[models.WorkingHours]:
-    day_order = case(
-        (models.WorkingHours.day_of_week == DayOfWeek.MONDAY, 1),
-        (models.WorkingHours.day_of_week == DayOfWeek.TUESDAY, 2),
-        (models.WorkingHours.day_of_week == DayOfWeek.WEDNESDAY, 3),
-        (models.WorkingHours.day_of_week == DayOfWeek.THURSDAY, 4),
-        (models.WorkingHours.day_of_week == DayOfWeek.FRIDAY, 5),
-        (models.WorkingHours.day_of_week == DayOfWeek.SATURDAY, 6),
-        (models.WorkingHours.day_of_week == DayOfWeek.SUNDAY, 7),
-        else_=0,  # Default value if none of the conditions match
-    )
-
-    return db.query(models.WorkingHours).order_by(day_order).all()
+def get_working_hours(db: Session) -> list[schemas.WorkingHours]:
+    """Configured days, Monday first."""
+    working_hours = conflicts.working_hours_by_day(db)
+    return [working_hours[day] for day in DayOfWeek if day in working_hours]
 
 
 def set_working_hours(
     db: Session,
     hours_in: list[schemas.WorkingHoursCreate],
-) -> list[models.WorkingHours]:
+) -> list[schemas.WorkingHours]:
     # Clear existing hours
     db.query(models.WorkingHours).delete()
 
-    db_hours = []
     for hour_data in hours_in:
-        db_hour = models.WorkingHours(**hour_data.model_dump())
-        db.add(db_hour)
-        db_hours.append(db_hour)
+        db.add(models.WorkingHours(**hour_data.model_dump()))
 
     db.commit()
+    conflicts.WORKING_HOURS_CACHE.clear()
     return get_working_hours(db)  # Return the newly saved hours
 
 
@@ -1,28 +1,29 @@
+import asyncio
 from typing import Annotated
 
-from fastapi import APIRouter, Cookie, Depends, HTTPException, Request, Response, status
+from fastapi import APIRouter, Cookie, Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from app.auth.schemas import Token
 from app.core.config import settings
-from app.core.rate_limit import RateLimiter, get_client_id
+from app.core.rate_limit import RateLimiter
 from app.core.security import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     REFRESH_TOKEN_EXPIRE_DAYS,
     create_access_token,
     create_refresh_token,
+    password_executor,
 )
 from app.db.base import get_db
-from app.users.logged import authenticate_user, get_current_user, validate_token
+from app.users.logged import forget_token, get_current_user, login, validate_token
 from app.users.schemas import User
-from app.users.services import get_user_by_username
 
 router = APIRouter()
 
 # Rate limiters: 5 attempts per minute for login, 10 per minute for refresh
-login_limiter = RateLimiter(requests=5, window=60)
-refresh_limiter = RateLimiter(requests=10, window=60)
+login_limiter = RateLimiter("login", requests=5, window=60)
+refresh_limiter = RateLimiter("refresh", requests=10, window=60)
 
 
 def _set_auth_cookies(response: Response, access_token: str, refresh_token: str) -> None:
@@ -50,16 +51,17 @@ def _set_auth_cookies(response: Response, access_token: str, refresh_token: str)
     )
 
 
-@router.post("/token")
+@router.post("/token", dependencies=[Depends(login_limiter)])
 async def login_for_access_token(
-    request: Request,
     response: Response,
     db: Annotated[Session, Depends(get_db)],
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> Token:
-    login_limiter.check_rate_limit(get_client_id(request))
-    user = get_user_by_username(db, form_data.username)
-    if not user or not authenticate_user(user, form_data.password):
+    # The session is synchronous too, so the lookup goes along with the password check
+    user = await asyncio.get_running_loop().run_in_executor(
+        password_executor, login, db, form_data.username, form_data.password
+    )
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -71,15 +73,12 @@ async def login_for_access_token(
     return Token(access_token=access_token, token_type="bearer", user=user)  # noqa: S106
 
 
-@router.post("/refresh")
+@router.post("/refresh", dependencies=[Depends(refresh_limiter)])
 async def refresh_access_token(
-    request: Request,
     response: Response,
     db: Annotated[Session, Depends(get_db)],
     refresh_token: Annotated[str | None, Cookie()] = None,
 ) -> Token:
-    refresh_limiter.check_rate_limit(get_client_id(request))
-
     if not refresh_token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -103,7 +102,9 @@ async def refresh_access_token(
 async def logout(
     response: Response,
     _user: Annotated[User, Depends(get_current_user)],
+    access_token: Annotated[str | None, Cookie()] = None,
 ) -> dict[str, str]:
+    forget_token(access_token)
     cookie_kwargs = {
         "path": "/",
         "domain": settings.COOKIE_DOMAIN,
@@ -0,0 +1,8 @@
+from datetime import UTC, datetime
+
+
+def naive_utc(value: datetime | None) -> datetime | None:
+    """Converts an aware datetime to the naive UTC datetimes the database stores."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(UTC).replace(tzinfo=None)
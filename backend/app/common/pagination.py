@@ -0,0 +1,81 @@
+import base64
+import binascii
+import json
+from collections.abc import Callable, Sequence
+from datetime import datetime
+from enum import Enum
+from typing import Any
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+from sqlalchemy.sql.elements import ColumnElement
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+CURSOR_DESCRIPTION = "Opaque cursor returned by the previous page. Continues after its last row; `skip` is ignored."
+COUNT_CAP = 1000
+COUNT_DESCRIPTION = (
+    f"How to compute `total_count`: `exact`, `capped` to stop counting past {COUNT_CAP} (`total_count_capped` "
+    "tells when there are more), or `none` to skip it."
+)
+
+
+class CountMode(str, Enum):
+    EXACT = "exact"
+    CAPPED = "capped"
+    NONE = "none"
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def count_rows(query: Query, mode: CountMode) -> int | None:
+    """Total for a paginated response. In capped mode counting stops at `COUNT_CAP + 1`, meaning "more than
+    COUNT_CAP", so the cost is bounded however many rows match.
+    """
+    if mode is CountMode.NONE:
+        return None
+    if mode is CountMode.CAPPED:
+        return query.limit(COUNT_CAP + 1).count()
+    return query.count()
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encodes the sort key of the last row of a page into an opaque, URL-safe cursor."""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str, *types: type) -> tuple:
+    """Decodes a cursor produced by `encode_cursor`, converting each value to the given type."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(payload, list) or len(payload) != len(types):
+            raise InvalidCursorError("Invalid cursor")
+        return tuple(
+            datetime.fromisoformat(value) if type_ is datetime else type_(value)
+            for type_, value in zip(types, payload, strict=True)
+        )
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+
+
+def keyset_after(columns: Sequence[Any], values: Sequence[Any], *, descending: bool = False) -> ColumnElement[bool]:
+    """Filter for the rows that come after `values` when ordering by `columns`.
+
+    Spelled out as `a > x OR (a = x AND b > y)` rather than a row value comparison so every backend can use
+    the index on the leading column.
+    """
+    column, *rest_columns = columns
+    value, *rest_values = values
+    after = column < value if descending else column > value
+    if not rest_columns:
+        return after
+    return or_(after, and_(column == value, keyset_after(rest_columns, rest_values, descending=descending)))
+
+
+def next_cursor(items: Sequence[Any], limit: int | None, key: Callable[[Any], tuple]) -> str | None:
+    """Cursor continuing after the last item of a full page, or None when there can't be a next page."""
+    if not limit or len(items) < limit:
+        return None
+    return encode_cursor(*key(items[-1]))
@@ -0,0 +1,9 @@
+import unicodedata
+
+
+def fold(value: str | None) -> str:
+    """Lowercases `value` and strips its accents, so "José Peña" and "jose pena" compare equal."""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
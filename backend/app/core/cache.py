@@ -0,0 +1,113 @@
+"""A bounded, thread-safe in-process cache: entries expire after a TTL and, past `maxsize`, the least recently used
+one is dropped. Every worker process has its own caches, and `cache_stats` reports all of them by name.
+
+Only cache plain values or pydantic schemas, never ORM instances: they belong to the session that loaded them.
+
+Reference data (specialties, prices, payment methods and working hours) changes a few times a year but is read on
+most requests. The services that write those tables clear the matching cache after committing, so the TTL only
+bounds how long changes made elsewhere (another worker, a script, the database by hand) take to show up.
+
+Verified access tokens are cached with a snapshot of their user, for at most `TOKEN_CACHE_TTL_SECONDS` and never past
+the token's expiry. Logging out discards the token and changing a user discards all of theirs.
+
+Decrypted medical histories are cached by digest of their ciphertext, so new ciphertext never hits a stale entry and
+nothing needs clearing. That cache is kept small and short lived since it holds sensitive data.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+_MISSING = object()
+
+_caches: dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int = 128, ttl: float | None = None) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = settings.REFERENCE_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, object]] = OrderedDict()
+        # Bumped by every invalidation, so a load that started before one doesn't cache what it read
+        self._generation = 0
+        self._lock = threading.Lock()
+        _caches[name] = self
+
+    def get_or_load(self, key: Hashable, load: Callable[[], T]) -> T:
+        """The cached value of `key`, or what `load` returns, which is cached until it expires."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            generation = self._generation
+            # Loaded outside the lock, two requests missing at once may both query the database
+            value = load()
+            with self._lock:
+                # Invalidated while loading: what was loaded may predate the write, return it but don't cache it
+                if self._generation == generation:
+                    self._store(key, value, self.ttl)
+        return value
+
+    def get(self, key: Hashable, default: object = None) -> object:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: object, ttl: float | None = None) -> None:
+        """Caches `value` for `ttl` seconds, or the cache's TTL if it's shorter or not given."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def _store(self, key: Hashable, value: object, ttl: float) -> None:
+        # The caller holds the lock
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def discard_if(self, predicate: Callable[[object], bool]) -> None:
+        """Drops the entries whose value matches `predicate`."""
+        with self._lock:
+            self._generation += 1
+            for key in [key for key, (_, value) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    """Hits, misses and size of every cache, by name."""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def clear_caches() -> None:
+    """Empties every cache and resets their counters."""
+    for cache in _caches.values():
+        cache.clear()
+        cache.hits = cache.misses = 0
@@ -12,6 +12,9 @@ class Settings(BaseSettings):
     # SECRET_KEY: openssl rand -hex 32
     FERNET_KEY: str
     SECRET_KEY: str
+    # To rotate FERNET_KEY, move the current key here (comma-separated, newest first) and set a new one. Data encrypted
+    # with these keys can still be read, run scripts/rotate_encryption_key.py to re-encrypt it and then remove them.
+    FERNET_OLD_KEYS: str = ""
 
     # Database URL.
     # Defaults to a local SQLite database in the .app//db/ directory.
@@ -19,6 +22,29 @@ class Settings(BaseSettings):
 
     ENV: str = "production"
 
+    # IANA timezone of the clinic. Working hours are in this timezone while appointments are stored in UTC.
+    CLINIC_TIMEZONE: str = "UTC"
+
+    # Occurrences of open-ended recurring series get their own appointment this many weeks ahead, so everything but
+    # the calendar sees them as regular appointments. Run scripts/extend_recurring_series.py daily to move it along.
+    RECURRING_HORIZON_WEEKS: int = 12
+
+    # How long reference data (specialties, prices, payment methods, working hours) is cached. Changes made through
+    # the API show up right away, this only bounds how long changes made elsewhere take to.
+    REFERENCE_CACHE_TTL_SECONDS: int = 300
+
+    # How long an access token and its user are trusted without checking the database. Each worker process keeps its
+    # own cache, so a user changed in one worker can look unchanged in another for this long.
+    TOKEN_CACHE_TTL_SECONDS: int = 60
+
+    # Cost of new password hashes, every extra round doubles it. Existing hashes keep the cost they were made with.
+    BCRYPT_ROUNDS: int = 12
+    # Threads checking passwords at login. More logins at once wait in line instead of taking over the server.
+    PASSWORD_HASH_WORKERS: int = 2
+
+    # SQLite file where the rate limits are counted, shared by every worker. When unset each worker counts on its own.
+    RATE_LIMIT_DATABASE: str | None = None
+
     # Cookie domain for security (e.g., ".bluroom.com.ar" to include subdomains or "bluroom.com.ar" for exact domain)
     # Set to None for development (allows localhost)
     COOKIE_DOMAIN: str | None = None
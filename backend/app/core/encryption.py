@@ -1,17 +1,41 @@
-from cryptography.fernet import Fernet
+import hashlib
 
+from cryptography.fernet import Fernet, MultiFernet
+
+from .cache import TTLCache
 from .config import settings
 
-branca = Fernet(settings.FERNET_KEY.encode())
+
+def fernet_keys() -> list[str]:
+    """The current key, which encrypts, followed by the previous ones, which can still decrypt until
+    `scripts/rotate_encryption_key.py` has re-encrypted everything with the current one.
+    """
+    return [settings.FERNET_KEY, *(key.strip() for key in settings.FERNET_OLD_KEYS.split(",") if key.strip())]
+
+
+branca = MultiFernet([Fernet(key.encode()) for key in fernet_keys()])
+
+# Plaintexts by digest of their ciphertext, so showing the same chart again doesn't decrypt it again. Small and short
+# lived since it holds sensitive data.
+DECRYPTED_CACHE = TTLCache("decrypted", maxsize=256, ttl=300)
 
 
 def encrypt(data: str) -> str:
     if not data:
         return ""
-    return branca.encrypt(data.encode()).decode()
+    encrypted_data = branca.encrypt(data.encode()).decode()
+    # Whatever is saved is usually shown right after
+    DECRYPTED_CACHE.set(_digest(encrypted_data), data)
+    return encrypted_data
 
 
 def decrypt(encrypted_data: str) -> str:
     if not encrypted_data:
         return ""
-    return branca.decrypt(encrypted_data.encode()).decode()
+    return DECRYPTED_CACHE.get_or_load(
+        _digest(encrypted_data), lambda: branca.decrypt(encrypted_data.encode()).decode()
+    )
+
+
+def _digest(encrypted_data: str) -> bytes:
+    return hashlib.sha256(encrypted_data.encode()).digest()
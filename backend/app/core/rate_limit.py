@@ -1,29 +1,156 @@
+"""Rate limiting with a sliding window counter.
+
+Each client gets the number of requests it made in the current fixed window and in the previous one. The requests in
+the last `window` seconds are estimated by weighting the previous count by how much of the previous window is still
+inside the sliding one, so every check is O(1) in time and memory, however many requests a client makes.
+
+Counters live in a store. `MemoryStore` keeps them in the process, dropping the least recently seen clients past
+`maxsize`. `SQLiteStore` keeps them in a SQLite file shared by every worker on the host, so the limits hold no
+matter which worker gets the request. Set `RATE_LIMIT_DATABASE` to the file to use it.
+
+Stores block, on a lock or on the SQLite file, so async endpoints use the limiter as a dependency, which FastAPI runs
+in its thread pool: `dependencies=[Depends(limiter)]`.
+"""
+
+import sqlite3
+import threading
 import time
-from collections import defaultdict
+from collections import OrderedDict
+from collections.abc import Callable
+from functools import cache
+from typing import NamedTuple, Protocol
 
 from fastapi import HTTPException, Request, status
 
+from app.core.config import settings
+
+# Stores prune the expired counters every so many checks
+PRUNE_EVERY = 1000
+# Seconds a check waits for another worker's write lock on the SQLite file. Updates take microseconds, so only a
+# stuck worker holds it longer
+SQLITE_BUSY_TIMEOUT = 0.1
+
+
+class Counter(NamedTuple):
+    # Number of the fixed window, i.e. time // window
+    index: int
+    previous: int
+    current: int
+
+
+Hit = Callable[[Counter | None], tuple[Counter, bool]]
+
+
+class RateLimitStore(Protocol):
+    def update(self, key: str, hit: Hit, expires_at: float) -> bool:
+        """Atomically replaces the counter of `key` with what `hit` makes of it, and returns whether it allowed the
+        request. The counter isn't needed after `expires_at`.
+        """
+        ...
+
+
+class MemoryStore:
+    def __init__(self, maxsize: int = 10_000) -> None:
+        self.maxsize = maxsize
+        self._counters: OrderedDict[str, Counter] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, key: str, hit: Hit, expires_at: float) -> bool:  # noqa: ARG002
+        with self._lock:
+            counter, allowed = hit(self._counters.get(key))
+            self._counters[key] = counter
+            self._counters.move_to_end(key)
+            if len(self._counters) > self.maxsize:
+                self._counters.popitem(last=False)
+        return allowed
+
+
+class SQLiteStore:
+    def __init__(self, path: str, timeout: float = SQLITE_BUSY_TIMEOUT) -> None:
+        self._connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, idx INTEGER NOT NULL, previous INTEGER NOT NULL, current INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._updates = 0
+
+    def update(self, key: str, hit: Hit, expires_at: float) -> bool:
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so workers can't interleave their read and write
+            try:
+                self._connection.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                # Locked past the timeout. The limits guard the login, so the request is turned down, not let in
+                return False
+            try:
+                row = self._connection.execute(
+                    "SELECT idx, previous, current FROM rate_limits WHERE key = ?", (key,)
+                ).fetchone()
+                counter, allowed = hit(Counter(*row) if row else None)
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO rate_limits (key, idx, previous, current, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, *counter, expires_at),
+                )
+                self._updates += 1
+                if self._updates % PRUNE_EVERY == 0:
+                    self._connection.execute("DELETE FROM rate_limits WHERE expires_at < ?", (time.time(),))
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return allowed
+
+
+@cache
+def default_store() -> RateLimitStore:
+    """The store of the limiters that aren't given one. Created on first use, so importing the routers doesn't open
+    the shared database.
+    """
+    if settings.RATE_LIMIT_DATABASE:
+        return SQLiteStore(settings.RATE_LIMIT_DATABASE)
+    return MemoryStore()
+
 
 class RateLimiter:
-    def __init__(self, requests: int, window: int):
+    def __init__(self, name: str, requests: int, window: int, store: RateLimitStore | None = None) -> None:
+        self.name = name
         self.requests = requests
         self.window = window
-        self.clients = defaultdict(list)
+        self.store = store
 
-    def _clean_old_requests(self, client_id: str) -> None:
-        cutoff = time.time() - self.window
-        self.clients[client_id] = [req_time for req_time in self.clients[client_id] if req_time > cutoff]
+    def hit(self, client_id: str, now: float | None = None) -> bool:
+        """Counts a request from the client. Returns False, without counting it, when it's over the limit."""
+        now = time.time() if now is None else now
+        index, elapsed = divmod(now, self.window)
+        index = int(index)
 
-    def check_rate_limit(self, client_id: str) -> None:
-        self._clean_old_requests(client_id)
+        def _hit(counter: Counter | None) -> tuple[Counter, bool]:
+            if counter is None or counter.index < index - 1:
+                previous, current = 0, 0
+            elif counter.index == index - 1:
+                previous, current = counter.current, 0
+            else:
+                previous, current = counter.previous, counter.current
+            allowed = previous * (1 - elapsed / self.window) + current < self.requests
+            return Counter(index, previous, current + allowed), allowed
 
-        if len(self.clients[client_id]) >= self.requests:
+        store = self.store or default_store()
+        return store.update(f"{self.name}:{client_id}", _hit, expires_at=(index + 2) * self.window)
+
+    def check_rate_limit(self, client_id: str) -> None:
+        if not self.hit(client_id):
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="Too many requests. Please try again later.",
             )
 
-        self.clients[client_id].append(time.time())
+    def __call__(self, request: Request) -> None:
+        """Checks the request's client, as a dependency. It's synchronous, so FastAPI runs it in a thread."""
+        self.check_rate_limit(get_client_id(request))
 
 
 def get_client_id(request: Request) -> str:
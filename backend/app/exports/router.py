@@ -0,0 +1,51 @@
+from datetime import date
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
+
+from app.db.base import get_db
+from app.users.logged import get_current_user
+from app.users.models import User
+
+from . import services
+from .services import ExportFormat
+
+router = APIRouter()
+
+StartDate = Annotated[date | None, Query(description="First day to export")]
+EndDate = Annotated[date | None, Query(description="Day after the last one to export")]
+
+
+@router.get("/appointments", response_class=StreamingResponse)
+def export_appointments(
+    db: Annotated[Session, Depends(get_db)],
+    _current_user: Annotated[User, Depends(get_current_user)],
+    start_date: StartDate = None,
+    end_date: EndDate = None,
+    export_format: Annotated[ExportFormat, Query(alias="format")] = ExportFormat.CSV,
+) -> StreamingResponse:
+    """Every appointment starting in the range, oldest first, with what was paid for it."""
+    return _stream(db, services.appointments_query(start_date, end_date), export_format, "appointments")
+
+
+@router.get("/payments", response_class=StreamingResponse)
+def export_payments(
+    db: Annotated[Session, Depends(get_db)],
+    _current_user: Annotated[User, Depends(get_current_user)],
+    start_date: StartDate = None,
+    end_date: EndDate = None,
+    export_format: Annotated[ExportFormat, Query(alias="format")] = ExportFormat.CSV,
+) -> StreamingResponse:
+    """Every payment made in the range, oldest first."""
+    return _stream(db, services.payments_query(start_date, end_date), export_format, "payments")
+
+
+def _stream(db: Session, query: Select, export_format: ExportFormat, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        services.export_rows(db.get_bind(), query, export_format),
+        media_type=services.MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format.value}"'},
+    )
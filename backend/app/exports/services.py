@@ -0,0 +1,116 @@
+"""Appointments and payments for accounting, as CSV or NDJSON.
+
+Rows are streamed from the database cursor in batches of `BATCH_SIZE` and written straight from the column tuples,
+without ORM objects nor pydantic models, so memory use doesn't grow with the size of the export and the first rows
+go out as soon as the database returns them. Each export reads through its own connection, so it doesn't depend on
+the request's session staying open while the response streams.
+"""
+
+import csv
+import io
+import json
+from collections.abc import Iterable, Iterator
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+
+from sqlalchemy import Engine, Select, select
+
+from app.appointments.models import Appointment
+from app.patients.models import Patient
+from app.payments.models import Payment, PaymentMethod
+from app.specialties.models import Specialty
+
+BATCH_SIZE = 1000
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+MEDIA_TYPES = {ExportFormat.CSV: "text/csv", ExportFormat.NDJSON: "application/x-ndjson"}
+
+
+def appointments_query(start_date: date | None = None, end_date: date | None = None) -> Select:
+    """Appointments starting in [start_date, end_date), oldest first."""
+    query = (
+        select(
+            Appointment.id,
+            Appointment.start_time,
+            Appointment.end_time,
+            Appointment.status,
+            Appointment.cost,
+            Appointment.total_paid.label("total_paid"),
+            Appointment.patient_id,
+            Patient.name.label("patient_name"),
+            Appointment.specialty_id,
+            Specialty.name.label("specialty_name"),
+            Appointment.recurring_series_id,
+        )
+        .join(Patient, Patient.id == Appointment.patient_id)
+        .join(Specialty, Specialty.id == Appointment.specialty_id)
+        .order_by(Appointment.start_time, Appointment.id)
+    )
+    return _in_range(query, Appointment.start_time, start_date, end_date)
+
+
+def payments_query(start_date: date | None = None, end_date: date | None = None) -> Select:
+    """Payments made in [start_date, end_date), oldest first."""
+    query = (
+        select(
+            Payment.id,
+            Payment.payment_date,
+            Payment.amount,
+            PaymentMethod.name.label("payment_method"),
+            Payment.patient_id,
+            Patient.name.label("patient_name"),
+            Payment.appointment_id,
+        )
+        .join(PaymentMethod, PaymentMethod.id == Payment.payment_method_id)
+        .join(Patient, Patient.id == Payment.patient_id)
+        .order_by(Payment.payment_date, Payment.id)
+    )
+    return _in_range(query, Payment.payment_date, start_date, end_date)
+
+
+def export_rows(engine: Engine, query: Select, export_format: ExportFormat) -> Iterator[str]:
+    """The rows of `query` as CSV, with a header, or as one JSON object per line. One chunk per batch of rows."""
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=BATCH_SIZE).execute(query)
+        columns = list(result.keys())
+        if export_format is ExportFormat.CSV:
+            yield _csv_lines([columns])
+        for rows in result.partitions():
+            if export_format is ExportFormat.CSV:
+                yield _csv_lines([_value(value) for value in row] for row in rows)
+            else:
+                yield "".join(
+                    json.dumps(dict(zip(columns, map(_value, row), strict=True)), separators=(",", ":")) + "\n"
+                    for row in rows
+                )
+
+
+def _in_range(query: Select, column: object, start_date: date | None, end_date: date | None) -> Select:
+    if start_date is not None:
+        query = query.where(column >= datetime.combine(start_date, time.min))
+    if end_date is not None:
+        query = query.where(column < datetime.combine(end_date, time.min))
+    return query
+
+
+def _csv_lines(rows: Iterable[list]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _value(value: object) -> object:
+    """What to write for a column value. Decimals as strings, like the API does, to keep their precision."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    return value
@@ -5,8 +5,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.appointments.router import appointments_router, working_hours_router, metrics_router
+from app.appointments.services import extend_virtual_series
+from app.common.pagination import NEXT_CURSOR_HEADER
 from app.core.config import settings
-from app.db.base import Base, engine
+from app.db.base import Base, engine, get_db_context
+from app.exports.router import router as exports_router
 from app.patients.router import router as patients_router
 from app.specialties.router import router as specialties_router
 from app.users.router import router as users_router
@@ -17,6 +20,8 @@ from app.payments.router import payments_router, payment_methods_router
 @asynccontextmanager
 async def lifespan(_app: FastAPI):  # noqa: ANN201
     Base.metadata.create_all(bind=engine)
+    with get_db_context() as db:
+        extend_virtual_series(db)
     yield
 
 
@@ -36,6 +41,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 
@@ -71,3 +77,4 @@ app.include_router(working_hours_router, prefix="/api/v1/working-hours", tags=["
 app.include_router(metrics_router, prefix="/api/v1/metrics", tags=["metrics"])
 app.include_router(payment_methods_router, prefix="/api/v1/payment_methods", tags=["payment_methods"])
 app.include_router(payments_router, prefix="/api/v1/payments", tags=["payments"])
+app.include_router(exports_router, prefix="/api/v1/exports", tags=["exports"])
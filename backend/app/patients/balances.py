@@ -0,0 +1,98 @@
+"""Running balance of each patient, kept in the `total_due`, `total_paid` and `balance` columns of `patients`.
+
+A patient owes the cost of their scheduled and completed appointments and has paid the sum of the payments made
+for them. The appointments rollup (`app.appointments.rollup`) already sees every change to an appointment's cost,
+status, patient or payments, so it passes the differences on to `add_to_balances`, which applies them with a single
+atomic UPDATE. `find_balance_drift` and `rebuild_balances` recompute everything from the raw tables.
+"""
+
+from collections.abc import Iterator, Mapping
+from decimal import Decimal
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+from app.appointments.models import Appointment, AppointmentStatus
+from app.payments.models import Payment
+
+from .models import Patient
+
+DUE_STATUSES = (AppointmentStatus.SCHEDULED, AppointmentStatus.COMPLETED)
+
+
+def amount_due(appointment: Appointment) -> Decimal:
+    """What the appointment adds to its patient's total due."""
+    if appointment.status not in DUE_STATUSES:
+        return Decimal(0)
+    return Decimal(str(appointment.cost))
+
+
+def add_to_balances(db: Session, deltas: Mapping[int, tuple[Decimal, Decimal]]) -> None:
+    """Adds the (due, paid) differences to each patient's running totals."""
+    deltas = {patient_id: delta for patient_id, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    due = case({patient_id: due for patient_id, (due, _) in deltas.items()}, value=Patient.id)
+    paid = case({patient_id: paid for patient_id, (_, paid) in deltas.items()}, value=Patient.id)
+    db.execute(
+        update(Patient)
+        .where(Patient.id.in_(list(deltas)))
+        .values(
+            total_due=Patient.total_due + due,
+            total_paid=Patient.total_paid + paid,
+            balance=Patient.balance + paid - due,
+        )
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+def compute_balances(db: Session) -> dict[int, tuple[Decimal, Decimal]]:
+    """(total_due, total_paid) of every patient with appointments, from the appointments and payments tables."""
+    paid = (
+        select(Payment.appointment_id, func.sum(Payment.amount).label("amount"))
+        .group_by(Payment.appointment_id)
+        .subquery()
+    )
+    totals = (
+        db.query(
+            Appointment.patient_id,
+            func.coalesce(func.sum(case((Appointment.status.in_(DUE_STATUSES), Appointment.cost), else_=0)), 0),
+            func.coalesce(func.sum(paid.c.amount), 0),
+        )
+        .outerjoin(paid, paid.c.appointment_id == Appointment.id)
+        .group_by(Appointment.patient_id)
+    )
+    return {patient_id: (_cents(due), _cents(amount)) for patient_id, due, amount in totals}
+
+
+def find_balance_drift(db: Session) -> list[tuple[int, Decimal, Decimal]]:
+    """(patient_id, stored balance, recomputed balance) of the patients whose running totals are off."""
+    return [(patient_id, stored, paid - due) for patient_id, stored, due, paid in _drift(db, compute_balances(db))]
+
+
+def rebuild_balances(db: Session) -> int:
+    """Recomputes the running totals of every patient. Returns the number of patients that were off."""
+    drift = list(_drift(db, compute_balances(db)))
+    for patient_id, _, due, paid in drift:
+        db.query(Patient).filter(Patient.id == patient_id).update(
+            {Patient.total_due: due, Patient.total_paid: paid, Patient.balance: paid - due}
+        )
+    db.commit()
+    return len(drift)
+
+
+def _drift(
+    db: Session, expected: Mapping[int, tuple[Decimal, Decimal]]
+) -> Iterator[tuple[int, Decimal, Decimal, Decimal]]:
+    """(patient_id, stored balance, total due, total paid) of the patients whose stored totals don't match."""
+    for patient_id, total_due, total_paid, balance in db.query(
+        Patient.id, Patient.total_due, Patient.total_paid, Patient.balance
+    ).order_by(Patient.id):
+        due, paid = expected.get(patient_id, (Decimal(0), Decimal(0)))
+        if (_cents(total_due), _cents(total_paid), _cents(balance)) != (due, paid, paid - due):
+            yield patient_id, _cents(balance), due, paid
+
+
+def _cents(amount: object) -> Decimal:
+    # SQLite hands sums of NUMERIC columns back as floats
+    return Decimal(str(amount)).quantize(Decimal("0.01"))
@@ -1,16 +1,33 @@
-from datetime import UTC, date, datetime
+from datetime import date
 
 import sqlalchemy as sa
-from sqlalchemy import ForeignKey, func, select
-from sqlalchemy.orm import column_property, relationship
+from sqlalchemy import DDL, ForeignKey, event
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.types import Date, String, Text
 
-from app.appointments.models import Appointment
+# Registers the targets of the relationships below
+from app.appointments.models import Appointment  # noqa: F401
+from app.common.text import fold
+from app.core.encryption import decrypt, encrypt
 from app.db.base import Base
-from app.payments.models import Payment
+from app.payments.models import Payment  # noqa: F401
 
 UNDERAGE_LIMIT = 18  # Define the age limit for underage patients
 
+# Trigram full-text index over `Patient.search_text`, kept in sync by triggers. SQLite only
+SEARCH_INDEX = "patients_search"
+SEARCH_INDEX_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_INDEX} USING fts5("
+    "search_text, content='patients', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_INDEX}_insert AFTER INSERT ON patients BEGIN "
+    f"INSERT INTO {SEARCH_INDEX}(rowid, search_text) VALUES (new.id, new.search_text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_INDEX}_delete AFTER DELETE ON patients BEGIN "
+    f"INSERT INTO {SEARCH_INDEX}({SEARCH_INDEX}, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_INDEX}_update AFTER UPDATE OF search_text ON patients BEGIN "
+    f"INSERT INTO {SEARCH_INDEX}({SEARCH_INDEX}, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+    f"INSERT INTO {SEARCH_INDEX}(rowid, search_text) VALUES (new.id, new.search_text); END",
+)
+
 
 class Patient(Base):
     __tablename__ = "patients"
@@ -31,6 +48,9 @@ class Patient(Base):
     address = sa.Column(Text)
     how_they_found_us = sa.Column(Text)
 
+    # Name and nickname folded by `app.common.text.fold`, what the patient search matches against
+    search_text = sa.Column(Text)
+
     # Self-referencing FK for referrals
     referred_by_patient_id = sa.Column(sa.Integer, ForeignKey("patients.id"), nullable=True)
     referred_by = relationship("Patient", remote_side=[id], backref="referred_patients")
@@ -38,27 +58,31 @@ class Patient(Base):
     default_specialty_id = sa.Column(ForeignKey("specialties.id"))
     default_specialty = relationship("Specialty")
 
-    appointments = relationship("Appointment", back_populates="patient")
+    # Newest first, as the patient's history is shown
+    appointments = relationship(
+        "Appointment", back_populates="patient", order_by="(desc(Appointment.start_time), desc(Appointment.id))"
+    )
 
-    payments = relationship("Payment", back_populates="patient")
+    payments = relationship("Payment", back_populates="patient", order_by="desc(Payment.payment_date)")
+
+    # Running totals kept up to date by the services layer, see `app.patients.balances`
+    total_due = sa.Column(sa.Numeric(12, 2), nullable=False, default=0, server_default="0")
+    total_paid = sa.Column(sa.Numeric(12, 2), nullable=False, default=0, server_default="0")
+    balance = sa.Column(sa.Numeric(12, 2), nullable=False, default=0, server_default="0", index=True)
 
     emergency_contacts = relationship(
         "EmergencyContact", back_populates="patient", order_by="EmergencyContact.priority"
     )
 
-    last_appointment = column_property(
-        select(func.min(Appointment.start_time))
-        .where(Appointment.patient_id == id, Appointment.start_time < datetime.now(UTC))
-        .scalar_subquery()
-    )
-    next_appointment = column_property(
-        select(func.min(Appointment.start_time))
-        .where(Appointment.patient_id == id, Appointment.start_time >= datetime.now(UTC))
-        .scalar_subquery()
-    )
-
     special_prices = relationship("PatientSpecialtyPrice", back_populates="patient")
 
+    @validates("name", "nickname")
+    def _update_search_text(self, key: str, value: str | None) -> str | None:
+        name = value if key == "name" else self.name
+        nickname = value if key == "nickname" else self.nickname
+        self.search_text = " ".join(fold(part) for part in (name, nickname) if part)
+        return value
+
     @property
     def age(self) -> int | None:
         if self.dob:
@@ -71,6 +95,25 @@ class Patient(Base):
     def is_underage(self) -> bool | None:
         return self.age and self.age < UNDERAGE_LIMIT
 
+    @property
+    def medical_history(self) -> str | None:
+        """Decrypted when read, so only the responses that show it pay for it."""
+        if not self.encrypted_medical_history:
+            return None
+        return decrypt(self.encrypted_medical_history)
+
+    @medical_history.setter
+    def medical_history(self, value: str | None) -> None:
+        self.encrypted_medical_history = encrypt(value) if value else None
+
+
+for statement in SEARCH_INDEX_DDL:
+    event.listen(Patient.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+# Dropping the content table leaves the index behind
+event.listen(
+    Patient.__table__, "before_drop", DDL(f"DROP TABLE IF EXISTS {SEARCH_INDEX}").execute_if(dialect="sqlite")
+)
+
 
 class EmergencyContact(Base):
     __tablename__ = "emergency_contacts"
@@ -1,9 +1,12 @@
+from decimal import Decimal
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
 from app.appointments import schemas as appt_schemas
+from app.common import pagination
+from app.common.pagination import COUNT_CAP, COUNT_DESCRIPTION, CURSOR_DESCRIPTION, CountMode, InvalidCursorError
 from app.db import get_db
 from app.users.logged import get_current_user
 from app.users.models import User
@@ -26,28 +29,66 @@ def create_patient(
 
 
 @router.get("/", response_model=schemas.PaginatedPatientsResponse)
-def read_patients(
+def read_patients(  # noqa: PLR0913
     db: Annotated[Session, Depends(get_db)],
     _current_user: Annotated[User, Depends(get_current_user)],
     query: str = "",
     skip: int = 0,
     limit: int = 100,
+    cursor: Annotated[str | None, Query(description=CURSOR_DESCRIPTION)] = None,
+    count: Annotated[CountMode, Query(description=COUNT_DESCRIPTION)] = CountMode.EXACT,
+    include_appointment_dates: Annotated[
+        bool, Query(description="Set to false to skip looking up each patient's last and next appointment.")
+    ] = True,
 ) -> schemas.PaginatedPatientsResponse:
-    total_count, patients = services.get_patients(db, query=query, skip=skip, limit=limit)
-    return schemas.PaginatedPatientsResponse(total_count=total_count, items=patients)
+    try:
+        total_count, patients, next_cursor = services.get_patients(
+            db,
+            query=query,
+            skip=skip,
+            limit=limit,
+            cursor=cursor,
+            count=count,
+            include_appointment_dates=include_appointment_dates,
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from None
+    capped = count is CountMode.CAPPED and total_count > COUNT_CAP
+    return schemas.PaginatedPatientsResponse(
+        total_count=COUNT_CAP if capped else total_count,
+        total_count_capped=capped,
+        items=patients,
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/debtors/", response_model=schemas.PaginatedDebtorsResponse)
+def read_debtors(  # noqa: PLR0913
+    db: Annotated[Session, Depends(get_db)],
+    _current_user: Annotated[User, Depends(get_current_user)],
+    min_owed: Annotated[Decimal, Query(ge=0, description="Only patients owing more than this amount.")] = Decimal(0),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Annotated[str | None, Query(description=CURSOR_DESCRIPTION)] = None,
+) -> schemas.PaginatedDebtorsResponse:
+    try:
+        total_count, debtors = services.get_debtors(db, min_owed=min_owed, skip=skip, limit=limit, cursor=cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from None
+    return schemas.PaginatedDebtorsResponse(
+        total_count=total_count,
+        items=debtors,
+        next_cursor=pagination.next_cursor(debtors, limit, key=lambda p: (str(p.balance), p.id)),
+    )
 
 
 @router.get("/{patient_id}/", response_model=schemas.PatientDetails)
 def read_patient(
     patient_id: int, db: Annotated[Session, Depends(get_db)], _current_user: Annotated[User, Depends(get_current_user)]
 ) -> schemas.PatientDetails:
-    db_patient = services.get_patient(db, patient_id=patient_id)
+    db_patient = services.get_patient_details(db, patient_id=patient_id)
     if db_patient is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
-
-    db_patient.financial_summary = services.get_financial_summary(db, patient_id=patient_id)
-    db_patient.appointment_summary = services.get_appointment_summary(db, patient_id=patient_id)
-
     return schemas.PatientDetails.model_validate(db_patient)
 
 
@@ -62,16 +103,25 @@ def read_patient_details(
 
 
 @router.get("/{patient_id}/appointments/", response_model=list[appt_schemas.Appointment])
-def read_patient_appointments(
+def read_patient_appointments(  # noqa: PLR0913
     patient_id: int,
+    response: Response,
     db: Annotated[Session, Depends(get_db)],
     _current_user: Annotated[User, Depends(get_current_user)],
     skip: int = 0,
     limit: int = 100,
+    cursor: Annotated[str | None, Query(description=CURSOR_DESCRIPTION)] = None,
 ) -> list[appt_schemas.Appointment]:
-    db_appointments = services.get_patient_appointments(db, patient_id=patient_id, skip=skip, limit=limit)
+    try:
+        db_appointments = services.get_patient_appointments(
+            db, patient_id=patient_id, skip=skip, limit=limit, cursor=cursor
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from None
     if db_appointments is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found or no appointments")
+    if next_cursor := pagination.next_cursor(db_appointments, limit, key=lambda a: (a.start_time, a.id)):
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
     return db_appointments
 
 
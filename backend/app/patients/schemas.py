@@ -36,7 +36,6 @@ class PatientBase(BaseModel):
     name: str
     nickname: str | None = None
     dob: date | None = None
-    medical_history: str | None = None
     email: EmailStr | None = None
     cellphone: str | None = None
     phone: str | None = None
@@ -46,15 +45,19 @@ class PatientBase(BaseModel):
     referred_by_patient_id: int | None = None
 
 
-class PatientCreate(PatientBase): ...
+class PatientCreate(PatientBase):
+    medical_history: str | None = None
 
 
 class PatientUpdate(PatientBase):
     # All fields are optional for updates
     name: str | None = None
+    medical_history: str | None = None
 
 
-class Patient(PatientBase):
+class PatientListItem(PatientBase):
+    """A patient as listed. Leaves the medical history out, so listing doesn't decrypt it."""
+
     id: int
     last_appointment: datetime | None = None
     next_appointment: datetime | None = None
@@ -64,6 +67,10 @@ class Patient(PatientBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class Patient(PatientListItem):
+    medical_history: str | None = None
+
+
 class PatientFinancialSummary(BaseModel):
     total_paid: Decimal
     total_due: Decimal
@@ -96,8 +103,31 @@ class PatientDetails(Patient):
 
 
 class PaginatedPatientsResponse(BaseModel):
+    # None when not counted, at least this many when capped
+    total_count: int | None
+    total_count_capped: bool = False
+    items: list[PatientListItem]
+    next_cursor: str | None = None
+
+
+class Debtor(BaseModel):
+    id: int
+    name: str
+    nickname: str | None = None
+    email: EmailStr | None = None
+    cellphone: str | None = None
+    phone: str | None = None
+    total_due: Decimal
+    total_paid: Decimal
+    balance: Decimal
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class PaginatedDebtorsResponse(BaseModel):
     total_count: int
-    items: list[Patient]
+    items: list[Debtor]
+    next_cursor: str | None = None
 
 
 class PatientSpecialtyPriceBase(BaseModel):
@@ -116,7 +146,9 @@ class PatientSpecialtyPrice(PatientSpecialtyPriceBase):
 
 
 class PatientDetailView(Patient):
+    # The latest ones. When there are more, continue with GET /patients/{id}/appointments/?cursor=...
     appointments: list[Appointment] = []
+    appointments_next_cursor: str | None = None
     payments: list[Payment] = []
     special_prices: list[PatientSpecialtyPrice] = []
     financial_summary: PatientFinancialSummary | None = None
@@ -1,56 +1,103 @@
+from collections.abc import Iterable
 from datetime import UTC, datetime
-
-from sqlalchemy import func
-from sqlalchemy.orm import Session, joinedload
-
-from app.appointments.models import Appointment, Payment, AppointmentStatus
-from app.core.encryption import decrypt, encrypt
+from decimal import Decimal
+
+from sqlalchemy import case, column, func, select, table, tuple_
+from sqlalchemy.orm import Query, Session, joinedload, selectinload, undefer
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.appointments.loaders import appointment_response_options
+from app.appointments.models import Appointment, Payment
+from app.common.pagination import (
+    CountMode,
+    InvalidCursorError,
+    count_rows,
+    decode_cursor,
+    keyset_after,
+    next_cursor,
+)
+from app.common.text import fold
 
 from . import models, schemas
 
+# The trigram tokenizer indexes every three characters, shorter words can't be looked up
+TRIGRAM_LENGTH = 3
+# Search results are ranked by relevance only when there are at most this many, e.g. not while typing the first
+# letters of a common name
+RANKED_SEARCH_LIMIT = 500
+# Appointments in the patient detail view, the rest are paged through GET /patients/{id}/appointments/
+DETAIL_APPOINTMENTS_LIMIT = 100
+SEARCH_INDEX = table(models.SEARCH_INDEX, column("rowid"), column("rank"), column(models.SEARCH_INDEX))
 
-def get_financial_summary(db: Session, patient_id: int) -> schemas.PatientFinancialSummary:
-    total_paid = (
-        db.query(func.sum(Payment.amount)).join(Appointment).filter(Appointment.patient_id == patient_id).scalar()
-    ) or 0
-
-    total_due = (db.query(func.sum(Appointment.cost)).filter(Appointment.patient_id == patient_id, Appointment.status.in_((AppointmentStatus.SCHEDULED,AppointmentStatus.COMPLETED))).scalar()) or 0
 
+def financial_summary(db_patient: models.Patient) -> schemas.PatientFinancialSummary:
+    """Read straight from the patient's running totals, see `app.patients.balances`."""
     return schemas.PatientFinancialSummary(
-        total_paid=total_paid,
-        total_due=total_due,
-        balance=total_paid - total_due,
+        total_paid=db_patient.total_paid, total_due=db_patient.total_due, balance=db_patient.balance
     )
 
 
-def get_appointment_summary(db: Session, patient_id: int) -> schemas.AppointmentSummary:
-    appointments = db.query(Appointment).filter(Appointment.patient_id == patient_id).all()
-
-    # Do this on db side if performance becomes an issue
-    total_appointments = len(appointments)
-    upcoming_appointments = sum(1 for app in appointments if app.start_time.replace(tzinfo=UTC) > datetime.now(tz=UTC))
-    past_appointments = total_appointments - upcoming_appointments
+def get_financial_summary(db: Session, patient_id: int) -> schemas.PatientFinancialSummary:
+    totals = (
+        db.query(models.Patient.total_paid, models.Patient.total_due, models.Patient.balance)
+        .filter(models.Patient.id == patient_id)
+        .first()
+    )
+    if totals is None:
+        return schemas.PatientFinancialSummary(total_paid=0, total_due=0, balance=0)
+    total_paid, total_due, balance = totals
+    return schemas.PatientFinancialSummary(total_paid=total_paid, total_due=total_due, balance=balance)
 
-    specialty_counts = {}
-    for app in appointments:
-        if not app.specialty_id:
-            continue  # Skip appointments without a specialty
 
-        this_specialty_count = specialty_counts.setdefault(app.specialty_id, {"total": 0, "upcoming": 0, "past": 0})
-        this_specialty_count["total"] += 1
-        if app.start_time.replace(tzinfo=UTC) > datetime.now(tz=UTC):
-            this_specialty_count["upcoming"] += 1
-        else:
-            this_specialty_count["past"] += 1
+def get_appointment_summary(db: Session, patient_id: int) -> schemas.AppointmentSummary:
+    # Stored start times are naive UTC
+    now = datetime.now(tz=UTC).replace(tzinfo=None)
+    upcoming = func.coalesce(func.sum(case((Appointment.start_time > now, 1), else_=0)), 0)
+    per_specialty = (
+        db.query(Appointment.specialty_id, func.count(Appointment.id), upcoming)
+        .filter(Appointment.patient_id == patient_id)
+        .group_by(Appointment.specialty_id)
+        .all()
+    )
 
+    specialty_counts = {
+        specialty_id: {"total": total, "upcoming": upcoming_count, "past": total - upcoming_count}
+        for specialty_id, total, upcoming_count in per_specialty
+        if specialty_id
+    }
+    total_appointments = sum(total for _, total, _ in per_specialty)
+    upcoming_appointments = sum(upcoming_count for _, _, upcoming_count in per_specialty)
     return schemas.AppointmentSummary(
         total_appointments=total_appointments,
         upcoming_appointments=upcoming_appointments,
-        past_appointments=past_appointments,
+        past_appointments=total_appointments - upcoming_appointments,
         specialty_counts=specialty_counts,
     )
 
 
+def attach_appointment_dates(db: Session, patients: Iterable[models.Patient]) -> None:
+    """Sets `last_appointment` and `next_appointment` on the given patients, with a single query grouped by
+    patient over all of them.
+    """
+    patients = list(patients)
+    if not patients:
+        return
+    # Stored start times are naive UTC
+    now = datetime.now(tz=UTC).replace(tzinfo=None)
+    dates = {
+        patient_id: (last, next_)
+        for patient_id, last, next_ in db.query(
+            Appointment.patient_id,
+            func.max(case((Appointment.start_time < now, Appointment.start_time))),
+            func.min(case((Appointment.start_time >= now, Appointment.start_time))),
+        )
+        .filter(Appointment.patient_id.in_({patient.id for patient in patients}))
+        .group_by(Appointment.patient_id)
+    }
+    for patient in patients:
+        patient.last_appointment, patient.next_appointment = dates.get(patient.id, (None, None))
+
+
 def get_patient(db: Session, patient_id: int) -> models.Patient | None:
     db_patient = (
         db.query(models.Patient)
@@ -58,61 +105,144 @@ def get_patient(db: Session, patient_id: int) -> models.Patient | None:
         .filter(models.Patient.id == patient_id)
         .first()
     )
-    if db_patient and db_patient.encrypted_medical_history:
-        db_patient.medical_history = decrypt(db_patient.encrypted_medical_history)
     return db_patient
 
 
-def get_patients(db: Session, query: str = "", skip: int = 0, limit: int = 100) -> tuple[int, list[models.Patient]]:
+def get_patients(  # noqa: PLR0913
+    db: Session,
+    query: str = "",
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    *,
+    count: CountMode = CountMode.EXACT,
+    include_appointment_dates: bool = True,
+) -> tuple[int | None, list[models.Patient], str | None]:
+    """Sorted by name, or by relevance when searching with few enough matches to rank them. Returns the total,
+    computed as `count` says (see `app.common.pagination.count_rows`), the page and the cursor of the next one.
+
+    When a cursor is given, continues after the (name, id) it encodes and `skip` is ignored. Results ranked by
+    relevance can only be paged with `skip`, so they come without a cursor.
+    """
+    sort_key = (models.Patient.name, models.Patient.id)
+    index_count = None
     if query:
-        query_lower = f"%{query.lower()}%"
-        patients_query = db.query(models.Patient).filter(
-            (func.lower(models.Patient.name).like(query_lower))
-            | (func.lower(models.Patient.nickname).like(query_lower))
-        )
+        patients_query, order_by, index_count = _search(db, query)
+    else:
+        patients_query, order_by = db.query(models.Patient), sort_key
+    # Ranked results are ordered by relevance before the sort key
+    ranked = len(order_by) > len(sort_key)
+
+    if index_count is not None and count is not CountMode.NONE:
+        # Already counted in the search index, where it's cheaper than through the join
+        total_count = index_count
     else:
-        patients_query = db.query(models.Patient)
+        total_count = count_rows(patients_query, count)
 
-    total_count = patients_query.count()
+    if cursor is not None:
+        if ranked:
+            raise InvalidCursorError(
+                "These search results are ranked by relevance, page through them with skip instead of a cursor."
+            )
+        patients_query = patients_query.filter(keyset_after(sort_key, decode_cursor(cursor, str, int)))
+        skip = 0
 
     if limit:
-        patients_query = patients_query.order_by(models.Patient.name).offset(skip).limit(limit)
+        patients_query = patients_query.order_by(*order_by).offset(skip).limit(limit)
 
     patients = patients_query.all()
-    return total_count, patients
-
-
-def get_patient_appointments(db: Session, patient_id: int, skip: int = 0, limit: int = 100) -> list[Appointment]:
-    db_patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
-    if not db_patient:
-        return []
+    if include_appointment_dates:
+        attach_appointment_dates(db, patients)
+    page_cursor = None if ranked else next_cursor(patients, limit, key=lambda p: (p.name, p.id))
+    return total_count, patients, page_cursor
+
+
+def _search(db: Session, query: str) -> tuple[Query, tuple, int | None]:
+    """Patients whose name or nickname contain every word of `query`, ignoring case and accents, how to sort them
+    and, when the index alone decides the matches, how many there are. On SQLite, words of three or more characters
+    are looked up in the trigram index and, unless there are too many matches to score them quickly, the results are
+    ranked by bm25. Shorter words, and other databases, are matched with a LIKE over `Patient.search_text`.
+    """
+    words = fold(query).split()
+    patients_query = db.query(models.Patient)
+    order_by = (models.Patient.name, models.Patient.id)
+    matches = None
+    if db.get_bind().dialect.name == "sqlite":
+        indexed = [word for word in words if len(word) >= TRIGRAM_LENGTH]
+        words = [word for word in words if len(word) < TRIGRAM_LENGTH]
+        if indexed:
+            match = SEARCH_INDEX.c[models.SEARCH_INDEX].op("MATCH")(" ".join(_phrase(word) for word in indexed))
+            hits = select(SEARCH_INDEX.c.rowid.label("patient_id"), SEARCH_INDEX.c.rank).where(match).subquery()
+            patients_query = patients_query.join(hits, hits.c.patient_id == models.Patient.id)
+            # Counting the matches in the index is cheap, scoring them all isn't
+            matches = db.scalar(select(func.count()).select_from(SEARCH_INDEX).where(match))
+            if matches <= RANKED_SEARCH_LIMIT:
+                order_by = (hits.c.rank, *order_by)
+    for word in words:
+        patients_query = patients_query.filter(models.Patient.search_text.like(f"%{_escape_like(word)}%", escape="\\"))
+    return patients_query, order_by, None if words else matches
+
+
+def _phrase(word: str) -> str:
+    return '"' + word.replace('"', '""') + '"'
+
+
+def _escape_like(word: str) -> str:
+    return word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def get_debtors(
+    db: Session, min_owed: Decimal = Decimal(0), skip: int = 0, limit: int = 100, cursor: str | None = None
+) -> tuple[int, list[models.Patient]]:
+    """Patients owing more than `min_owed`, most owed first, straight from the indexed running balance. When a cursor
+    is given, continues after the (balance, id) it encodes and `skip` is ignored.
+    """
+    debtors_query = db.query(models.Patient).filter(models.Patient.balance < -min_owed)
+    total_count = debtors_query.count()
+
+    sort_key = (models.Patient.balance, models.Patient.id)
+    if cursor is not None:
+        debtors_query = debtors_query.filter(keyset_after(sort_key, decode_cursor(cursor, Decimal, int)))
+        skip = 0
+
+    return total_count, debtors_query.order_by(*sort_key).offset(skip).limit(limit).all()
+
+
+def get_patient_appointments(
+    db: Session, patient_id: int, skip: int = 0, limit: int = 100, cursor: str | None = None
+) -> list[Appointment]:
+    """Newest first. When a cursor is given, continues after the (start_time, id) it encodes and `skip` is ignored."""
+    appointments_query = (
+        db.query(Appointment).options(*appointment_response_options()).filter(Appointment.patient_id == patient_id)
+    )
+    sort_key = (Appointment.start_time, Appointment.id)
+    if cursor is not None:
+        appointments_query = appointments_query.filter(
+            keyset_after(sort_key, decode_cursor(cursor, datetime, int), descending=True)
+        )
+        skip = 0
 
     return (
-        db.query(Appointment)
-        .filter(Appointment.patient_id == patient_id)
-        .order_by(Appointment.start_time.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+        appointments_query.order_by(*(column.desc() for column in sort_key)).offset(skip).limit(limit).all()
     )
 
 
 def get_patient_payments(db: Session, patient_id: int) -> list[Payment]:
-    db_patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
-    if not db_patient:
-        return []
-
-    return db.query(Payment).filter(Payment.patient_id == patient_id).order_by(Payment.payment_date.desc()).all()
+    return (
+        db.query(Payment)
+        .options(joinedload(Payment.payment_method))
+        .filter(Payment.patient_id == patient_id)
+        .order_by(Payment.payment_date.desc())
+        .all()
+    )
 
 
 def create_patient(db: Session, patient: schemas.PatientCreate) -> models.Patient:
-    encrypted_history = encrypt(patient.medical_history) if patient.medical_history else None
-
     db_patient = models.Patient(
         name=patient.name,
         nickname=patient.nickname,
         dob=patient.dob,
-        encrypted_medical_history=encrypted_history,
+        medical_history=patient.medical_history,
         email=patient.email,
         phone=patient.phone,
         address=patient.address,
@@ -126,9 +256,6 @@ def create_patient(db: Session, patient: schemas.PatientCreate) -> models.Patien
     if db_patient.referred_by_patient_id == db_patient.id:
         raise ValueError("A patient cannot be their own referrer.")
 
-    # Decrypt for the response object
-    if db_patient.encrypted_medical_history:
-        db_patient.medical_history = decrypt(db_patient.encrypted_medical_history)
     return db_patient
 
 
@@ -141,19 +268,12 @@ def update_patient(db: Session, patient_id: int, patient_update: schemas.Patient
         raise ValueError("A patient cannot be their own referrer.")
 
     update_data = patient_update.model_dump(exclude_unset=True)
-
-    if "medical_history" in update_data:
-        db_patient.encrypted_medical_history = encrypt(update_data["medical_history"])
-        del update_data["medical_history"]  # Don't try to set this attribute on the model
-
     for key, value in update_data.items():
         setattr(db_patient, key, value)
 
     db.commit()
     db.refresh(db_patient)
-    # Decrypt for the response object
-    if db_patient.encrypted_medical_history:
-        db_patient.medical_history = decrypt(db_patient.encrypted_medical_history)
+    attach_appointment_dates(db, [db_patient])
     return db_patient
 
 
@@ -241,6 +361,21 @@ def get_special_price(
     )
 
 
+def get_special_prices(
+    db: Session, patient_specialty_ids: Iterable[tuple[int, int]]
+) -> dict[tuple[int, int], Decimal]:
+    """Patient-specific prices for the given (patient_id, specialty_id) pairs in a single query."""
+    pairs = set(patient_specialty_ids)
+    if not pairs:
+        return {}
+    special_prices = db.query(
+        models.PatientSpecialtyPrice.patient_id,
+        models.PatientSpecialtyPrice.specialty_id,
+        models.PatientSpecialtyPrice.price,
+    ).filter(tuple_(models.PatientSpecialtyPrice.patient_id, models.PatientSpecialtyPrice.specialty_id).in_(pairs))
+    return {(patient_id, specialty_id): price for patient_id, specialty_id, price in special_prices}
+
+
 def set_special_price(
     db: Session, price_in: schemas.PatientSpecialtyPriceCreate
 ) -> models.PatientSpecialtyPrice:
@@ -271,14 +406,74 @@ def get_special_prices_for_patient(db: Session, patient_id: int) -> list[models.
     return db.query(models.PatientSpecialtyPrice).filter(models.PatientSpecialtyPrice.patient_id == patient_id).all()
 
 
+def get_patient_details(db: Session, patient_id: int) -> models.Patient | None:
+    """The patient with everything `schemas.PatientDetails` serializes, in four queries: the patient with its
+    one-to-one relationships and special prices, its emergency contacts, its appointment dates and the appointment
+    summary. The financial summary comes from the patient's running totals.
+    """
+    db_patient = (
+        db.query(models.Patient)
+        .options(
+            joinedload(models.Patient.referred_by),
+            joinedload(models.Patient.default_specialty),
+            joinedload(models.Patient.special_prices),
+            selectinload(models.Patient.emergency_contacts),
+        )
+        .filter(models.Patient.id == patient_id)
+        .first()
+    )
+    if not db_patient:
+        return None
+    attach_appointment_dates(db, [db_patient])
+    db_patient.financial_summary = financial_summary(db_patient)
+    db_patient.appointment_summary = get_appointment_summary(db, patient_id)
+    return db_patient
+
+
 def get_patient_details_view(db: Session, patient_id: int) -> models.Patient | None:
-    db_patient = get_patient(db, patient_id)
+    """The patient with its latest `DETAIL_APPOINTMENTS_LIMIT` appointments and its payments, in four queries: the
+    patient with its special prices, the appointments, their payments and the patient's payments. Older appointments
+    are paged through `get_patient_appointments`, from `appointments_next_cursor`.
+    """
+    db_patient = (
+        db.query(models.Patient)
+        .options(
+            joinedload(models.Patient.referred_by),
+            joinedload(models.Patient.special_prices),
+            selectinload(models.Patient.payments).joinedload(Payment.payment_method),
+        )
+        .filter(models.Patient.id == patient_id)
+        .first()
+    )
     if not db_patient:
         return None
 
-    db_patient.appointments = get_patient_appointments(db, patient_id)
-    db_patient.payments = get_patient_payments(db, patient_id)
-    db_patient.special_prices = get_special_prices_for_patient(db, patient_id)
-    db_patient.financial_summary = get_financial_summary(db, patient_id)
+    sort_key = (Appointment.start_time.desc(), Appointment.id.desc())
+    appointments = (
+        db.query(Appointment)
+        .options(
+            undefer(Appointment.total_paid),
+            joinedload(Appointment.specialty),
+            selectinload(Appointment.payments).joinedload(Payment.payment_method),
+        )
+        .filter(Appointment.patient_id == patient_id)
+        .order_by(*sort_key)
+        .limit(DETAIL_APPOINTMENTS_LIMIT)
+        .all()
+    )
+    # Not a history change, so nothing to flush
+    set_committed_value(db_patient, "appointments", appointments)
+    db_patient.appointments_next_cursor = next_cursor(
+        appointments, DETAIL_APPOINTMENTS_LIMIT, key=lambda a: (a.start_time, a.id)
+    )
+
+    if db_patient.appointments_next_cursor is None:
+        # The whole history is loaded, newest first. Stored start times are naive UTC
+        now = datetime.now(tz=UTC).replace(tzinfo=None)
+        db_patient.last_appointment = next((a.start_time for a in appointments if a.start_time < now), None)
+        db_patient.next_appointment = next((a.start_time for a in reversed(appointments) if a.start_time >= now), None)
+    else:
+        attach_appointment_dates(db, [db_patient])
 
+    db_patient.financial_summary = financial_summary(db_patient)
     return db_patient
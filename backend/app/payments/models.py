@@ -19,6 +19,8 @@ class PaymentMethod(Base):
 
 class Payment(Base):
     __tablename__ = "payments"
+    # Keyset pagination through the payments ledger, newest first
+    __table_args__ = (sa.Index("ix_payments_payment_date_id", "payment_date", "id"),)
 
     id = sa.Column(Integer, primary_key=True, index=True)
     amount = sa.Column(Numeric(10, 2), nullable=False)
@@ -26,8 +28,8 @@ class Payment(Base):
     payment_method_id = sa.Column(Integer, sa.ForeignKey("payment_methods.id"), nullable=False)
     payment_method = relationship("PaymentMethod", back_populates="payments")
 
-    appointment_id = sa.Column(Integer, sa.ForeignKey("appointments.id"), nullable=True)
+    appointment_id = sa.Column(Integer, sa.ForeignKey("appointments.id"), nullable=True, index=True)
     appointment = relationship("Appointment", back_populates="payments")
 
-    patient_id = sa.Column(Integer, sa.ForeignKey("patients.id"), nullable=False)
+    patient_id = sa.Column(Integer, sa.ForeignKey("patients.id"), nullable=False, index=True)
     patient = relationship("Patient", back_populates="payments")
@@ -1,8 +1,10 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Response
 from sqlalchemy.orm import Session
 
+from app.common import pagination
+from app.common.pagination import CURSOR_DESCRIPTION, InvalidCursorError
 from app.db import get_db
 from app.users.logged import get_current_user
 from app.users.models import User
@@ -87,11 +89,19 @@ def create_payment(
 
 @payments_router.get("/", response_model=list[schemas.Payment])
 def read_payments(
+    response: Response,
     db: Annotated[Session, Depends(get_db)],
     skip: int = 0,
     limit: int = 100,
+    cursor: Annotated[str | None, Query(description=CURSOR_DESCRIPTION)] = None,
 ) -> list[schemas.Payment]:
-    return services.get_payments(db, skip=skip, limit=limit)
+    try:
+        payments = services.get_payments(db, skip=skip, limit=limit, cursor=cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from None
+    if next_cursor := pagination.next_cursor(payments, limit, key=lambda p: (p.payment_date, p.id)):
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return payments
 
 
 @payments_router.get("/{payment_id}/", response_model=schemas.Payment)
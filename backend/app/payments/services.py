@@ -1,20 +1,37 @@
-from sqlalchemy.orm import Session
+from datetime import datetime
+
+from sqlalchemy.orm import Session, joinedload
+
+from app.appointments import rollup
+from app.common.pagination import decode_cursor, keyset_after
+from app.core.cache import TTLCache
 
 from . import models, schemas
 
+PAYMENT_METHODS_CACHE = TTLCache("payment_methods", maxsize=16)
+
 
 def get_payment_method(db: Session, payment_method_id: int) -> models.PaymentMethod | None:
     return db.query(models.PaymentMethod).filter(models.PaymentMethod.id == payment_method_id).first()
 
 
-def get_payment_methods(db: Session, skip: int = 0, limit: int = 100) -> list[models.PaymentMethod]:
-    return db.query(models.PaymentMethod).offset(skip).limit(limit).all()
+def get_payment_methods(db: Session, skip: int = 0, limit: int = 100) -> list[schemas.PaymentMethod]:
+    """Cached, the services that change payment methods clear it."""
+    methods = PAYMENT_METHODS_CACHE.get_or_load(
+        (skip, limit),
+        lambda: tuple(
+            schemas.PaymentMethod.model_validate(method)
+            for method in db.query(models.PaymentMethod).order_by(models.PaymentMethod.id).offset(skip).limit(limit)
+        ),
+    )
+    return list(methods)
 
 
 def create_payment_method(db: Session, payment_method: schemas.PaymentMethodCreate) -> models.PaymentMethod:
     db_payment_method = models.PaymentMethod(name=payment_method.name)
     db.add(db_payment_method)
     db.commit()
+    PAYMENT_METHODS_CACHE.clear()
     db.refresh(db_payment_method)
     return db_payment_method
 
@@ -29,6 +46,7 @@ def update_payment_method(
     for key, value in update_data.items():
         setattr(db_payment_method, key, value)
     db.commit()
+    PAYMENT_METHODS_CACHE.clear()
     db.refresh(db_payment_method)
     return db_payment_method
 
@@ -38,6 +56,7 @@ def delete_payment_method(db: Session, payment_method_id: int) -> models.Payment
     if db_payment_method:
         db.delete(db_payment_method)
         db.commit()
+        PAYMENT_METHODS_CACHE.clear()
     return db_payment_method
 
 
@@ -45,13 +64,23 @@ def get_payment(db: Session, payment_id: int) -> models.Payment | None:
     return db.query(models.Payment).filter(models.Payment.id == payment_id).first()
 
 
-def get_payments(db: Session, skip: int = 0, limit: int = 100) -> list[models.Payment]:
-    return db.query(models.Payment).offset(skip).limit(limit).all()
+def get_payments(db: Session, skip: int = 0, limit: int = 100, cursor: str | None = None) -> list[models.Payment]:
+    """Newest first. When a cursor is given, continues after the (payment_date, id) it encodes and `skip` is ignored."""
+    payments_query = db.query(models.Payment).options(joinedload(models.Payment.payment_method))
+    sort_key = (models.Payment.payment_date, models.Payment.id)
+    if cursor is not None:
+        payments_query = payments_query.filter(
+            keyset_after(sort_key, decode_cursor(cursor, datetime, int), descending=True)
+        )
+        skip = 0
+
+    return payments_query.order_by(*(column.desc() for column in sort_key)).offset(skip).limit(limit).all()
 
 
 def create_payment(db: Session, payment: schemas.PaymentCreate) -> models.Payment:
     db_payment = models.Payment(**payment.model_dump())
     db.add(db_payment)
+    rollup.add_payment_amount(db, db_payment.appointment_id, db_payment.amount)
     db.commit()
     db.refresh(db_payment)
     return db_payment
@@ -62,8 +91,10 @@ def update_payment(db: Session, payment_id: int, payment_update: schemas.Payment
     if not db_payment:
         return None
 
+    rollup.add_payment_amount(db, db_payment.appointment_id, -db_payment.amount)
     for key, value in payment_update.model_dump(exclude_unset=True).items():
         setattr(db_payment, key, value)
+    rollup.add_payment_amount(db, db_payment.appointment_id, db_payment.amount)
 
     db.commit()
     db.refresh(db_payment)
@@ -75,6 +106,7 @@ def delete_payment(db: Session, payment_id: int) -> models.Payment | None:
     if not db_payment:
         return None
 
+    rollup.add_payment_amount(db, db_payment.appointment_id, -db_payment.amount)
     db.delete(db_payment)
     db.commit()
     return db_payment
@@ -30,6 +30,17 @@ class MinSpecialtyInfo(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class SpecialtySettings(BaseModel):
+    """Read-only snapshot of what scheduling needs from a specialty, safe to cache across sessions"""
+
+    id: int
+    name: str
+    default_duration_minutes: int
+    treatment_duration_logic: str | None = None
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+
 class SpecialtyBase(BaseModel):
     name: str
     default_duration_minutes: int = Field(..., gt=0)
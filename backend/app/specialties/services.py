@@ -1,21 +1,37 @@
+from collections.abc import Iterable
 from decimal import Decimal
 
-from sqlalchemy import desc
-from sqlalchemy.orm import Session
+from sqlalchemy import desc, func
+from sqlalchemy.orm import Session, selectinload
+
+from app.core.cache import TTLCache
 
 from . import models, schemas
 
+SPECIALTIES_CACHE = TTLCache("specialties")
+PRICES_CACHE = TTLCache("specialty_prices")
+
 
 def get_specialty_by_id(db: Session, specialty_id: int) -> models.Specialty | None:
     return db.query(models.Specialty).filter(models.Specialty.id == specialty_id).first()
 
 
+def get_specialty_settings(db: Session, specialty_id: int) -> schemas.SpecialtySettings | None:
+    """Cached version of `get_specialty_by_id` for callers that only read the specialty."""
+
+    def load() -> schemas.SpecialtySettings | None:
+        db_specialty = get_specialty_by_id(db, specialty_id)
+        return schemas.SpecialtySettings.model_validate(db_specialty) if db_specialty else None
+
+    return SPECIALTIES_CACHE.get_or_load(specialty_id, load)
+
+
 def get_specialty_by_name(db: Session, name: str) -> models.Specialty | None:
     return db.query(models.Specialty).filter(models.Specialty.name == name).first()
 
 
 def get_specialties(db: Session, skip: int = 0, limit: int = 100) -> list[models.Specialty]:
-    return db.query(models.Specialty).offset(skip).limit(limit).all()
+    return db.query(models.Specialty).options(selectinload(models.Specialty.prices)).offset(skip).limit(limit).all()
 
 
 def create_specialty(db: Session, specialty: schemas.SpecialtyCreate) -> models.Specialty:
@@ -35,6 +51,7 @@ def create_specialty(db: Session, specialty: schemas.SpecialtyCreate) -> models.
     )
     db.add(current_price)
     db.commit()
+    _clear_caches()
     db.refresh(db_specialty)  # Refresh again to load the new price relationship
 
     return db_specialty
@@ -52,6 +69,7 @@ def update_specialty(
         setattr(db_specialty, key, value)
 
     db.commit()
+    _clear_caches()
     db.refresh(db_specialty)
     return db_specialty
 
@@ -82,16 +100,40 @@ def add_specialty_price(
     )
     db.add(new_price)
     db.commit()
+    PRICES_CACHE.clear()
     db.refresh(db_specialty)
     return db_specialty
 
 
 def get_current_price_for_specialty(db: Session, specialty_id: int) -> Decimal | None:
-    price_entry = (
-        db.query(models.SpecialtyPrice)
-        .filter(models.SpecialtyPrice.specialty_id == specialty_id)
-        .order_by(desc(models.SpecialtyPrice.valid_from))
-        .first()
+    def load() -> Decimal | None:
+        return (
+            db.query(models.SpecialtyPrice.price)
+            .filter(models.SpecialtyPrice.specialty_id == specialty_id)
+            .order_by(desc(models.SpecialtyPrice.valid_from))
+            .limit(1)
+            .scalar()
+        )
+
+    return PRICES_CACHE.get_or_load(specialty_id, load)
+
+
+def get_current_prices_for_specialties(db: Session, specialty_ids: Iterable[int]) -> dict[int, Decimal]:
+    """Current price of each of the given specialties in a single query. Specialties without prices are left out."""
+    ranked = (
+        db.query(
+            models.SpecialtyPrice.specialty_id,
+            models.SpecialtyPrice.price,
+            func.row_number()
+            .over(partition_by=models.SpecialtyPrice.specialty_id, order_by=desc(models.SpecialtyPrice.valid_from))
+            .label("rank"),
+        )
+        .filter(models.SpecialtyPrice.specialty_id.in_(set(specialty_ids)))
+        .subquery()
     )
+    return dict(db.query(ranked.c.specialty_id, ranked.c.price).filter(ranked.c.rank == 1).all())
+
 
-    return price_entry.price if price_entry else None
+def _clear_caches() -> None:
+    SPECIALTIES_CACHE.clear()
+    PRICES_CACHE.clear()
@@ -1,14 +1,17 @@
 from __future__ import annotations
 
-import os
+import hashlib
+import time
 from typing import TYPE_CHECKING, Annotated
 
 from fastapi import Cookie, Depends, HTTPException, status
 from jose import JWTError, jwt
 
+from app.core.config import settings
 from app.core.security import ALGORITHM, verify_password
 from app.db.base import get_db
-from app.users.services import get_user_by_username
+from app.users import schemas
+from app.users.services import TOKENS_CACHE, get_user_by_username
 
 if TYPE_CHECKING:
     from sqlalchemy.orm import Session
@@ -20,22 +23,52 @@ def authenticate_user(user: User, password: str) -> bool:
     return user is not None and verify_password(password, user.hashed_password)
 
 
-def validate_token(db: Session, token: str) -> User | None:
-    """Validate a token and return the user, or None if invalid."""
+def login(db: Session, username: str, password: str) -> User | None:
+    """The user, if the password is right. Blocks while bcrypt runs, call it from `password_executor`."""
+    user = get_user_by_username(db, username)
+    if not authenticate_user(user, password):
+        return None
+    return user
+
+
+def validate_token(db: Session, token: str) -> schemas.User | None:
+    """Validate a token and return the user, or None if invalid.
+
+    Valid tokens are cached, by hash, with a snapshot of their user until the token expires or for
+    `TOKEN_CACHE_TTL_SECONDS`, whichever comes first. Changing the user or logging out drops them.
+    """
+    key = _token_key(token)
+    user = TOKENS_CACHE.get(key)
+    if user is not None:
+        return user
     try:
-        payload = jwt.decode(token, os.getenv("SECRET_KEY"), algorithms=[ALGORITHM])
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             return None
     except JWTError:
         return None
-    return get_user_by_username(db, username)
+    db_user = get_user_by_username(db, username)
+    if db_user is None:
+        return None
+    user = schemas.User.model_validate(db_user)
+    TOKENS_CACHE.set(key, user, ttl=payload.get("exp", 0) - time.time())
+    return user
+
+
+def forget_token(token: str) -> None:
+    TOKENS_CACHE.discard(_token_key(token))
+
+
+def _token_key(token: str) -> str:
+    # Don't keep the tokens themselves around
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
 
 
 def get_current_user(
     access_token: Annotated[str | None, Cookie()] = None,
     db: Session = Depends(get_db),
-) -> User:
+) -> schemas.User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -5,7 +5,6 @@ from sqlalchemy.orm import Session
 
 from app.db import get_db
 from app.users.logged import get_current_user
-from app.users.models import User
 
 from . import services, schemas
 
@@ -24,7 +23,7 @@ def create_user(user: schemas.UserCreate, db: Annotated[Session, Depends(get_db)
 
 
 @router.get("/", response_model=schemas.User)
-def read_logged_user(current_user: Annotated[User, Depends(get_current_user)]) -> schemas.User:
+def read_logged_user(current_user: Annotated[schemas.User, Depends(get_current_user)]) -> schemas.User:
     return current_user
 
 
@@ -32,7 +31,7 @@ def read_logged_user(current_user: Annotated[User, Depends(get_current_user)]) -
 def update_logged_user(
     user_update: schemas.UserUpdate,
     db: Annotated[Session, Depends(get_db)],
-    current_user: Annotated[User, Depends(get_current_user)],
+    current_user: Annotated[schemas.User, Depends(get_current_user)],
 ) -> schemas.User:
     updated_user = services.update_user(db=db, user_id=current_user.id, user_update=user_update)
     if updated_user is None:
@@ -44,7 +43,7 @@ def update_logged_user(
 def update_logged_user_password(
     password_update: schemas.UserPasswordUpdate,
     db: Annotated[Session, Depends(get_db)],
-    current_user: Annotated[User, Depends(get_current_user)],
+    current_user: Annotated[schemas.User, Depends(get_current_user)],
 ) -> schemas.User:
     updated_user = services.update_user_password(
         db=db, user_id=current_user.id, password_update=password_update
@@ -1,9 +1,14 @@
 from sqlalchemy.orm import Session
 
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.core.security import get_password_hash, verify_password
 
 from . import models, schemas
 
+# Verified tokens, by hash, and the user they belong to. See `app.users.logged.validate_token`
+TOKENS_CACHE = TTLCache("tokens", maxsize=1024, ttl=settings.TOKEN_CACHE_TTL_SECONDS)
+
 
 def get_user_by_username(db: Session, username: str) -> models.User | None:
     return db.query(models.User).filter(models.User.username == username).first()
@@ -37,6 +42,7 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate) -> m
         setattr(db_user, key, value)
 
     db.commit()
+    forget_user_tokens(user_id)
     db.refresh(db_user)
     return db_user
 
@@ -51,5 +57,11 @@ def update_user_password(db: Session, user_id: int, password_update: schemas.Use
 
     db_user.hashed_password = get_password_hash(password_update.new_password.get_secret_value())
     db.commit()
+    forget_user_tokens(user_id)
     db.refresh(db_user)
     return db_user
+
+
+def forget_user_tokens(user_id: int) -> None:
+    """Makes the next request with any of the user's tokens load the user again."""
+    TOKENS_CACHE.discard_if(lambda user: user.id == user_id)
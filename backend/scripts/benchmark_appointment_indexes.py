@@ -0,0 +1,180 @@
+"""Benchmark the appointment time-range hot path with and without its indexes.
+
+This script will:
+1. Seed a throwaway SQLite database with a large appointment history (500k appointments by default).
+2. Print the query plan and timing of each hot-path query without the indexes.
+3. Create the indexes and print the plan and timing again.
+
+It never touches the application database.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import and_, create_engine, func, select
+from sqlalchemy.schema import CreateIndex
+
+# Add the project root to the Python path to allow importing from 'app'
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.appointments.conflicts import MAX_APPOINTMENT_DURATION
+from app.appointments.models import Appointment, AppointmentStatus
+from app.db.base import Base
+from app.patients.models import Patient  # noqa: F401
+from app.payments.models import Payment
+from app.users.models import User  # noqa: F401
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+NUMBER_OF_PATIENTS = 5_000
+NUMBER_OF_SPECIALTIES = 5
+HISTORY_YEARS = 6
+TIMED_RUNS = 5
+
+INDEXES = [
+    *Appointment.__table__.indexes,
+    *(index for index in Payment.__table__.indexes if index.name != "ix_payments_id"),
+]
+
+
+def seed(db_path: Path, number_of_appointments: int) -> None:
+    """Creates the schema without the benchmarked indexes and bulk inserts the history."""
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for index in INDEXES:
+            index.drop(connection)
+
+    rng = random.Random(42)  # noqa: S311
+    history_start = datetime.now() - timedelta(days=365 * HISTORY_YEARS)  # noqa: DTZ005
+    history_minutes = HISTORY_YEARS * 365 * 24 * 60
+    statuses = [status.name for status in AppointmentStatus]
+
+    connection = sqlite3.connect(db_path)
+    with connection:
+        connection.executemany(
+            "INSERT INTO specialties (id, name, default_duration_minutes) VALUES (?, ?, 30)",
+            ((i, f"Specialty {i}") for i in range(1, NUMBER_OF_SPECIALTIES + 1)),
+        )
+        connection.execute("INSERT INTO payment_methods (id, name, is_active) VALUES (1, 'Cash', 1)")
+        connection.executemany(
+            "INSERT INTO patients (id, name) VALUES (?, ?)",
+            ((i, f"Patient {i}") for i in range(1, NUMBER_OF_PATIENTS + 1)),
+        )
+
+        def appointments():  # noqa: ANN202
+            for appointment_id in range(1, number_of_appointments + 1):
+                start_time = history_start + timedelta(minutes=rng.randrange(history_minutes))
+                yield (
+                    appointment_id,
+                    start_time.isoformat(sep=" "),
+                    (start_time + timedelta(minutes=30)).isoformat(sep=" "),
+                    100,
+                    rng.choice(statuses),
+                    rng.randint(1, NUMBER_OF_PATIENTS),
+                    rng.randint(1, NUMBER_OF_SPECIALTIES),
+                )
+
+        connection.executemany(
+            "INSERT INTO appointments (id, start_time, end_time, cost, status, patient_id, specialty_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            appointments(),
+        )
+        connection.execute(
+            "INSERT INTO payments (amount, payment_date, payment_method_id, appointment_id, patient_id) "
+            "SELECT cost, start_time, 1, id, patient_id FROM appointments WHERE id % 2 = 0"
+        )
+    connection.execute("ANALYZE")
+    connection.close()
+
+
+def hot_path_queries() -> dict[str, str]:
+    """The filters used by the calendar, metrics, session counting and dashboard, compiled to SQLite SQL."""
+    month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)  # noqa: DTZ005
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    month = and_(Appointment.start_time >= month_start, Appointment.start_time < month_end)
+    not_cancelled = Appointment.status != AppointmentStatus.CANCELLED
+
+    queries = {
+        "calendar month (get_appointments)": select(Appointment.id)
+        .where(month, not_cancelled)
+        .order_by(Appointment.start_time)
+        .limit(100),
+        "revenue for a month (get_appointment_metrics)": select(func.count(Appointment.id), func.sum(Appointment.cost))
+        .where(month),
+        "charged for a month (get_appointment_metrics)": select(func.sum(Payment.amount))
+        .join(Appointment, Payment.appointment_id == Appointment.id)
+        .where(month),
+        "past sessions (count_past_appointments_for_specialty)": select(func.count(Appointment.id)).where(
+            Appointment.patient_id == 1,
+            Appointment.specialty_id == 1,
+            Appointment.start_time < month_start,
+            not_cancelled,
+        ),
+        "overlapping appointments (find_conflicts)": select(
+            Appointment.id, Appointment.start_time, Appointment.end_time
+        ).where(
+            Appointment.start_time > month_start - MAX_APPOINTMENT_DURATION,
+            Appointment.start_time < month_start + timedelta(hours=1),
+            Appointment.end_time > month_start,
+            not_cancelled,
+        ),
+        "payments of an appointment": select(Payment.id).where(Payment.appointment_id == 2),
+        "payments of a patient": select(Payment.id).where(Payment.patient_id == 1),
+    }
+    dialect = create_engine("sqlite://").dialect
+    return {
+        name: str(query.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+        for name, query in queries.items()
+    }
+
+
+def report(connection: sqlite3.Connection, label: str) -> None:
+    logger.info(f"--- {label} ---")
+    for name, sql in hot_path_queries().items():
+        plan = [row[-1] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}")]
+        started = time.perf_counter()
+        for _ in range(TIMED_RUNS):
+            connection.execute(sql).fetchall()
+        elapsed_ms = (time.perf_counter() - started) * 1000 / TIMED_RUNS
+        logger.info(f"{name}: {elapsed_ms:.2f} ms")
+        for step in plan:
+            logger.info(f"    {step}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the appointment time-range indexes.")
+    parser.add_argument("--appointments", type=int, default=500_000, help="Number of appointments to seed.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "benchmark.sqlite3"
+        logger.info(f"Seeding {args.appointments} appointments into {db_path}...")
+        seed(db_path, args.appointments)
+
+        connection = sqlite3.connect(db_path)
+        try:
+            report(connection, "Without indexes")
+
+            dialect = create_engine("sqlite://").dialect
+            for index in INDEXES:
+                connection.execute(str(CreateIndex(index).compile(dialect=dialect)))
+            connection.execute("ANALYZE")
+
+            report(connection, "With indexes")
+        finally:
+            connection.close()
+
+
+if __name__ == "__main__":
+    main()
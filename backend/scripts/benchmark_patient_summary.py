@@ -0,0 +1,129 @@
+"""Benchmark the patient appointment summary on a patient with a long history.
+
+This script will:
+1. Seed a throwaway SQLite database with one patient with 2,000 sessions across a few specialties.
+2. Time the previous implementation, which loaded every appointment and counted in Python.
+3. Time `get_appointment_summary`, which counts with a single GROUP BY, and check both agree.
+
+It never touches the application database.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import random
+import sys
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+# Add the project root to the Python path to allow importing from 'app'
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.appointments.models import Appointment, AppointmentStatus
+from app.db.base import Base
+from app.patients.models import Patient
+from app.patients.services import get_appointment_summary
+from app.specialties.models import Specialty
+from app.users.models import User  # noqa: F401
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+NUMBER_OF_SPECIALTIES = 4
+TIMED_RUNS = 20
+
+
+def seed(session, number_of_sessions: int) -> int:  # noqa: ANN001
+    session.add_all(
+        Specialty(id=i, name=f"Specialty {i}", default_duration_minutes=30)
+        for i in range(1, NUMBER_OF_SPECIALTIES + 1)
+    )
+    patient = Patient(name="Benchmark Patient")
+    session.add(patient)
+    session.flush()
+
+    rng = random.Random(42)  # noqa: S311
+    now = datetime.now(UTC).replace(tzinfo=None)
+    rows = []
+    for _ in range(number_of_sessions):
+        # Mostly history, with some upcoming sessions
+        start_time = now + timedelta(days=rng.randint(-8 * 365, 60), hours=rng.randint(0, 10))
+        rows.append(
+            {
+                "patient_id": patient.id,
+                "specialty_id": rng.randint(1, NUMBER_OF_SPECIALTIES),
+                "start_time": start_time,
+                "end_time": start_time + timedelta(minutes=30),
+                "cost": 100,
+                "status": AppointmentStatus.COMPLETED if start_time < now else AppointmentStatus.SCHEDULED,
+            }
+        )
+    session.execute(insert(Appointment), rows)
+    session.commit()
+    return patient.id
+
+
+def python_loop_summary(session, patient_id: int) -> dict:  # noqa: ANN001
+    """The previous implementation: every appointment as an ORM object, counted in Python."""
+    appointments = session.query(Appointment).filter(Appointment.patient_id == patient_id).all()
+    total = len(appointments)
+    upcoming = sum(1 for app in appointments if app.start_time.replace(tzinfo=UTC) > datetime.now(tz=UTC))
+    specialty_counts = {}
+    for app in appointments:
+        counts = specialty_counts.setdefault(app.specialty_id, {"total": 0, "upcoming": 0, "past": 0})
+        counts["total"] += 1
+        if app.start_time.replace(tzinfo=UTC) > datetime.now(tz=UTC):
+            counts["upcoming"] += 1
+        else:
+            counts["past"] += 1
+    return {
+        "total_appointments": total,
+        "upcoming_appointments": upcoming,
+        "past_appointments": total - upcoming,
+        "specialty_counts": specialty_counts,
+    }
+
+
+def timed(label: str, session_factory, func) -> object:  # noqa: ANN001
+    result = None
+    started = time.perf_counter()
+    for _ in range(TIMED_RUNS):
+        # A fresh session per run, as each request gets its own
+        with session_factory() as session:
+            result = func(session)
+    elapsed_ms = (time.perf_counter() - started) * 1000 / TIMED_RUNS
+    logger.info(f"{label}: {elapsed_ms:.2f} ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the patient appointment summary.")
+    parser.add_argument("--sessions", type=int, default=2_000, help="Number of sessions of the patient.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "benchmark.sqlite3"
+        engine = create_engine(f"sqlite:///{db_path}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+
+        logger.info(f"Seeding a patient with {args.sessions} sessions into {db_path}...")
+        with session_factory() as session:
+            patient_id = seed(session, args.sessions)
+
+        legacy = timed("Python loop over ORM objects", session_factory, lambda s: python_loop_summary(s, patient_id))
+        summary = timed("GROUP BY specialty_id", session_factory, lambda s: get_appointment_summary(s, patient_id))
+        if summary.model_dump() != legacy:
+            logger.error("The summaries differ!")
+            sys.exit(1)
+        logger.info("Both implementations return the same summary.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Gives their own appointment to the occurrences of open-ended recurring series up to RECURRING_HORIZON_WEEKS ahead.
+
+Run it daily, e.g. from cron, so the horizon keeps moving along. The app also runs it on startup.
+"""
+
+import argparse
+import logging
+import sys
+from datetime import date, datetime, time
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.appointments.services import extend_virtual_series
+from app.core.config import settings
+from app.patients.models import Patient  # noqa: F401
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Materialize the occurrences of open-ended recurring series.")
+    parser.add_argument(
+        "--until", type=date.fromisoformat, help="Materialize up to this day instead of the configured horizon."
+    )
+    args = parser.parse_args()
+
+    engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_local()
+    try:
+        until = datetime.combine(args.until, time.max) if args.until else None
+        created = extend_virtual_series(db, until=until)
+        logger.info(f"Done. Created {created} appointments.")
+    except Exception:
+        logger.exception("An error occurred while extending the recurring series")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
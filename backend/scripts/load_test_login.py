@@ -0,0 +1,136 @@
+"""Load test: latency of other requests during a burst of logins.
+
+This script will:
+1. Start the API with uvicorn on a throwaway SQLite database, with a user to log in as.
+2. Time an authenticated request (GET /api/v1/users/) while the server is otherwise idle.
+3. Time it again while a burst of concurrent logins runs, and compare the p50 and p99 of both.
+
+Logins check the password in their own small pool of threads, so the p99 of the other requests should stay close to
+the idle one. When bcrypt ran on the event loop, every request waited behind each login in progress.
+
+It never touches the application database.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+# Add the project root to the Python path to allow importing from 'app'
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+USERNAME = "loadtest"
+PASSWORD = "loadtest-password"  # noqa: S105
+IDLE_PROBES = 200
+
+
+def start_server(port: int) -> uvicorn.Server:
+    from app.auth import router as auth_router
+    from app.db.base import Base, SessionLocal, engine
+    from app.main import app
+    from app.users import schemas, services
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        services.create_user(db, schemas.UserCreate(username=USERNAME, password=PASSWORD))
+    # Let the burst through, the point is to measure it and not the rate limiter
+    auth_router.login_limiter.requests = sys.maxsize
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def login(client: httpx.AsyncClient) -> float:
+    started = time.perf_counter()
+    response = await client.post("/api/v1/auth/token", data={"username": USERNAME, "password": PASSWORD})
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def probe(client: httpx.AsyncClient, cookies: httpx.Cookies, until: asyncio.Event | int) -> list[float]:
+    """Latencies of sequential authenticated requests, a number of them or until the event is set."""
+    latencies = []
+    while len(latencies) < until if isinstance(until, int) else not until.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/v1/users/", cookies=cookies)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def burst(client: httpx.AsyncClient, logins: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited_login() -> float:
+        async with semaphore:
+            return await login(client)
+
+    return await asyncio.gather(*(limited_login() for _ in range(logins)))
+
+
+def summary(label: str, latencies: list[float]) -> None:
+    percentiles = statistics.quantiles(latencies, n=100)
+    logger.info(
+        f"{label}: {len(latencies)} requests, p50 {percentiles[49] * 1000:.1f} ms, p99 {percentiles[98] * 1000:.1f} ms"
+    )
+
+
+async def run(base_url: str, logins: int, concurrency: int) -> None:
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await login(client)
+        cookies = httpx.Cookies({"access_token": client.cookies["access_token"]})
+        client.cookies.clear()
+
+        summary("Idle", await probe(client, cookies, IDLE_PROBES))
+
+        done = asyncio.Event()
+        probing = asyncio.create_task(probe(client, cookies, done))
+        started = time.perf_counter()
+        login_latencies = await burst(client, logins, concurrency)
+        elapsed = time.perf_counter() - started
+        done.set()
+        summary("During the burst", await probing)
+        summary("Logins", login_latencies)
+        logger.info(f"{logins} logins in {elapsed:.1f} s, {logins / elapsed:.1f} per second")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure request latency during a burst of logins.")
+    parser.add_argument("--logins", type=int, default=100, help="Number of logins in the burst.")
+    parser.add_argument("--concurrency", type=int, default=20, help="Logins in flight at once.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir, socket.socket() as sock:
+        # The settings are read when the app is imported, so point them to the throwaway database first
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(tmp_dir) / 'load_test.sqlite3'}"
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+
+        server = start_server(port)
+        try:
+            asyncio.run(run(f"http://127.0.0.1:{port}", args.logins, args.concurrency))
+        finally:
+            server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
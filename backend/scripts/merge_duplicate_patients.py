@@ -24,6 +24,7 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from app.appointments.models import Appointment
 from app.core.config import settings
+from app.patients.balances import add_to_balances
 from app.patients.models import (
     EmergencyContact,
     Patient,
@@ -102,6 +103,9 @@ def merge_patients(db_session: Session, surviving_patient: Patient, tbr_patient:
             {"patient_id": surviving_patient.id}
         )
 
+        # The payments follow their appointments, so the whole running balance moves to the survivor
+        add_to_balances(db_session, {surviving_patient.id: (tbr_patient.total_due, tbr_patient.total_paid)})
+
         # 3. Re-assign Emergency Contacts
         db_session.query(EmergencyContact).filter(EmergencyContact.patient_id == tbr_patient.id).update(
             {"patient_id": surviving_patient.id}
@@ -0,0 +1,42 @@
+"""Rebuilds the daily_appointment_stats rollup from appointments and payments.
+
+Run it after bulk imports or any change made outside the services layer, e.g. editing the database by hand.
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.appointments.rollup import rebuild_daily_stats
+from app.core.config import settings
+from app.patients.models import Patient  # noqa: F401
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    argparse.ArgumentParser(description="Rebuild the daily appointment stats rollup.").parse_args()
+
+    engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_local()
+    try:
+        logger.info("Rebuilding daily appointment stats...")
+        rows = rebuild_daily_stats(db)
+        logger.info(f"Done. Wrote {rows} rollup rows.")
+    except Exception:
+        logger.exception("An error occurred while rebuilding the rollup")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
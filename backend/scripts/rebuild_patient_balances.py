@@ -0,0 +1,54 @@
+"""Checks the running balances of the patients against their appointments and payments, and fixes the ones that
+drifted.
+
+Run it after bulk imports or any change made outside the services layer, e.g. editing the database by hand. With
+--check it only reports the drift and exits with status 1 when there is any.
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings
+from app.patients.balances import find_balance_drift, rebuild_balances
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Verify and rebuild the patients' running balances.")
+    parser.add_argument("--check", action="store_true", help="Only report the patients whose balance drifted.")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_local()
+    try:
+        if args.check:
+            drift = find_balance_drift(db)
+            for patient_id, stored, expected in drift:
+                logger.warning(f"Patient {patient_id}: stored balance {stored}, expected {expected}")
+            logger.info(f"{len(drift)} patients with a drifted balance.")
+            return 1 if drift else 0
+
+        logger.info("Rebuilding patient balances...")
+        fixed = rebuild_balances(db)
+        logger.info(f"Done. Fixed {fixed} patients.")
+    except Exception:
+        logger.exception("An error occurred while rebuilding the balances")
+        db.rollback()
+        return 1
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
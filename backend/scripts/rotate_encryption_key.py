@@ -0,0 +1,145 @@
+"""Re-encrypts every patient's medical history with the current FERNET_KEY.
+
+To rotate the key:
+1. Generate a new key, set it as FERNET_KEY and move the previous one to FERNET_OLD_KEYS. Restart the app, which then
+   reads with either key and writes with the new one.
+2. Run this script. It walks the patients by id in batches, re-encrypts each batch in a pool of processes and saves
+   it in its own short transaction, so the app keeps working meanwhile. The id of the last saved patient is written
+   to a checkpoint file after every batch, and running the script again continues from there.
+3. Once it's done, remove the previous key from FERNET_OLD_KEYS.
+
+A history the app changes while its batch is being re-encrypted is left as the app saved it, with the new key.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings
+from app.core.encryption import fernet_keys
+from app.patients.models import Patient
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from sqlalchemy import Engine, and_, bindparam, create_engine, select, update
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT = Path(__file__).resolve().parent / ".rotate_encryption_key.checkpoint"
+
+Batch = list[tuple[int, str]]
+
+_fernet: MultiFernet | None = None
+
+
+def _init_worker(keys: list[str]) -> None:
+    global _fernet  # noqa: PLW0603
+    _fernet = MultiFernet([Fernet(key.encode()) for key in keys])
+
+
+def rotate_batch(batch: Batch) -> tuple[list[dict], list[int]]:
+    """Runs in a worker process. The rows to update, and the ids of the histories no key can decrypt."""
+    rows, unreadable = [], []
+    for patient_id, encrypted in batch:
+        try:
+            rotated = _fernet.rotate(encrypted.encode()).decode()
+        except InvalidToken:
+            unreadable.append(patient_id)
+            continue
+        rows.append({"patient_id": patient_id, "old": encrypted, "new": rotated})
+    return rows, unreadable
+
+
+def read_batches(engine: Engine, after_id: int, batch_size: int) -> Iterator[Batch]:
+    """(id, encrypted history) of the patients with one, by id, one short read per batch."""
+    while True:
+        with engine.connect() as connection:
+            batch = connection.execute(
+                select(Patient.id, Patient.encrypted_medical_history)
+                .where(Patient.id > after_id, Patient.encrypted_medical_history.is_not(None))
+                .where(Patient.encrypted_medical_history != "")
+                .order_by(Patient.id)
+                .limit(batch_size)
+            ).all()
+        if not batch:
+            return
+        yield [tuple(row) for row in batch]
+        after_id = batch[-1][0]
+
+
+def save_batch(engine: Engine, rows: list[dict]) -> int:
+    """Writes a batch in its own transaction. Returns how many were saved."""
+    if not rows:
+        return 0
+    patients = Patient.__table__
+    statement = (
+        update(patients)
+        # Unless the app changed it since it was read
+        .where(and_(patients.c.id == bindparam("patient_id"), patients.c.encrypted_medical_history == bindparam("old")))
+        .values(encrypted_medical_history=bindparam("new"))
+    )
+    with engine.begin() as connection:
+        return connection.execute(statement, rows).rowcount
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Re-encrypt the medical histories with the current FERNET_KEY.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Patients per batch and transaction.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes re-encrypting.")
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT, help="Where to save the progress.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint, start from the first patient.")
+    args = parser.parse_args()
+
+    keys = fernet_keys()
+    if len(keys) == 1:
+        logger.warning("FERNET_OLD_KEYS is empty, histories will only be re-encrypted with the same key.")
+    after_id = 0
+    if args.checkpoint.exists() and not args.restart:
+        after_id = int(args.checkpoint.read_text())
+        logger.info(f"Resuming after patient {after_id}.")
+
+    engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+    started = time.perf_counter()
+    saved = skipped = 0
+    unreadable = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(keys,)) as executor:
+        # A few batches in flight keep the workers busy, without reading the whole table up front
+        in_flight: deque[tuple[int, Future]] = deque()
+        batches = read_batches(engine, after_id, args.batch_size)
+        while True:
+            for batch in batches:
+                in_flight.append((batch[-1][0], executor.submit(rotate_batch, batch)))
+                if len(in_flight) >= 2 * args.workers:
+                    break
+            if not in_flight:
+                break
+            last_id, future = in_flight.popleft()
+            rows, batch_unreadable = future.result()
+            batch_saved = save_batch(engine, rows)
+            saved += batch_saved
+            skipped += len(rows) - batch_saved
+            unreadable += batch_unreadable
+            args.checkpoint.write_text(str(last_id))
+            logger.info(f"Re-encrypted up to patient {last_id}, {saved} so far.")
+
+    args.checkpoint.unlink(missing_ok=True)
+    logger.info(
+        f"Done in {time.perf_counter() - started:.1f} s. Re-encrypted {saved} medical histories, "
+        f"{skipped} were changed meanwhile and left as they were."
+    )
+    if unreadable:
+        logger.error(f"{len(unreadable)} medical histories can't be decrypted with any key: patients {unreadable}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
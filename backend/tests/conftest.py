@@ -1,11 +1,16 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime
 from typing import Final
 import pytest
+from app.appointments.models import Appointment
+from app.core.cache import clear_caches
 from app.db.base import Base, get_db
 from app.main import app
 from app.users.models import User
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import StaticPool
 
 # Use an in-memory SQLite database for testing
@@ -18,6 +23,14 @@ TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engin
 
 TEST_USER_RAW_PASS:Final[str]="sircrapsalot"
 
+@pytest.fixture(autouse=True)
+def empty_caches():
+    """Every test gets a fresh database, so what the previous one cached is stale."""
+    clear_caches()
+    yield
+    clear_caches()
+
+
 @pytest.fixture
 def db_session():
     """Create a new database session for each test function.
@@ -73,6 +86,45 @@ def payment_method_in_db(db_session: TestingSessionLocal):
     return payment_method
 
 
+@pytest.fixture
+def patient_in_db(db_session: TestingSessionLocal):
+    from app.patients.schemas import PatientCreate
+    from app.patients.services import create_patient
+
+    return create_patient(db_session, PatientCreate(name="Test Patient", dob="1990-01-01", email="test@example.com"))
+
+
+@pytest.fixture
+def specialty_in_db(db_session: TestingSessionLocal):
+    from app.specialties.schemas import SpecialtyCreate
+    from app.specialties.services import create_specialty
+
+    specialty_data = SpecialtyCreate(name="Test Specialty", default_duration_minutes=30, current_price=100.00)
+    return create_specialty(db_session, specialty_data)
+
+
+def create_paid_appointment(
+    db_session: Session, patient_id: int, specialty_id: int, start_time: datetime, payment_method_id: int
+) -> Appointment:
+    """An appointment with a payment of 10 towards it."""
+    from app.appointments import schemas as appointment_schemas
+    from app.appointments import services as appointment_services
+    from app.payments import schemas as payment_schemas
+
+    appointment = appointment_services.create_appointment(
+        db_session,
+        appointment_schemas.AppointmentCreate(patient_id=patient_id, specialty_id=specialty_id, start_time=start_time),
+    )
+    appointment_services.add_payment(
+        db_session,
+        appointment_id=appointment.id,
+        payment_in=payment_schemas.PaymentCreate(
+            amount=10.00, payment_method_id=payment_method_id, patient_id=patient_id
+        ),
+    )
+    return appointment
+
+
 @pytest.fixture
 def authenticated_client(client: TestClient, test_user: User):
     from app.core.security import create_access_token
@@ -82,4 +134,31 @@ def authenticated_client(client: TestClient, test_user: User):
         **client.headers,
         "Authorization": f"Bearer {access_token}",
     }
+    # get_current_user reads the token from the cookie set at login
+    client.cookies.set("access_token", access_token)
+    # Like a client that's been logged in for a while, so the token is already verified and cached and tests
+    # counting queries don't see the first lookup of the user
+    client.get("/api/v1/users/")
     return client
+
+
+@pytest.fixture
+def count_queries():
+    """Count the SQL statements emitted against the test database while the context is active.
+    Used to assert list endpoints load their relationships in a constant number of queries.
+    """
+
+    @contextmanager
+    def _count_queries() -> Iterator[list[str]]:
+        statements = []
+
+        def _record(_conn, _cursor, statement, *_args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+
+    return _count_queries
@@ -1,4 +1,5 @@
 from datetime import date, datetime, timedelta, time, timezone
+from decimal import Decimal
 
 import pytest
 from app.appointments import schemas as appointment_schemas
@@ -6,23 +7,11 @@ from app.appointments import services as appointment_services
 from app.patients.schemas import PatientCreate
 from app.patients.services import create_patient
 from app.payments import schemas as payment_schemas
-from app.specialties.schemas import SpecialtyCreate
-from app.specialties.services import create_specialty
 from fastapi import status
 from fastapi.testclient import TestClient
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
 
-
-@pytest.fixture
-def patient_in_db(db_session: Session):
-    patient_data = PatientCreate(name="Test Patient", dob="1990-01-01", email="test@example.com")
-    return create_patient(db_session, patient_data)
-
-
-@pytest.fixture
-def specialty_in_db(db_session: Session):
-    specialty_data = SpecialtyCreate(name="Test Specialty", default_duration_minutes=30, current_price=100.00)
-    return create_specialty(db_session, specialty_data)
+from tests.conftest import create_paid_appointment
 
 
 @pytest.fixture
@@ -378,6 +367,15 @@ def test_set_working_hours(authenticated_client: TestClient):
     assert data[1]["is_closed"] is True
 
 
+def test_set_working_hours_clears_the_cache(authenticated_client: TestClient):
+    monday = {"dayOfWeek": "Monday", "startTime": "09:00:00", "endTime": "17:00:00"}
+    authenticated_client.post("/api/v1/working-hours/", json=[monday])
+    assert [hours["endTime"] for hours in authenticated_client.get("/api/v1/working-hours/").json()] == ["17:00:00"]
+
+    authenticated_client.post("/api/v1/working-hours/", json=[{**monday, "endTime": "13:00:00"}])
+    assert [hours["endTime"] for hours in authenticated_client.get("/api/v1/working-hours/").json()] == ["13:00:00"]
+
+
 def test_set_working_hours_invalid_data(authenticated_client: TestClient):
     # Invalid: is_closed is true but times are provided
     invalid_data = [{"dayOfWeek": 0, "startTime": "09:00:00", "endTime": "17:00:00", "is_closed": True}]
@@ -390,35 +388,205 @@ def test_set_working_hours_invalid_data(authenticated_client: TestClient):
     assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
 
 
-def test_create_recurring_appointments_not_implemented(authenticated_client: TestClient):
+def test_create_recurring_appointments(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, count_queries
+):
+    start_time = datetime.combine(date.today() + timedelta(days=1), time(10, 0))
+    with count_queries() as statements:
+        response = authenticated_client.post(
+            "/api/v1/appointments/recurring/",
+            json={
+                "patient_id": patient_in_db.id,
+                "specialty_id": specialty_in_db.id,
+                "start_time": start_time.isoformat(),
+                "frequency": "WEEKLY",
+                "number_of_appointments": 52,
+            },
+        )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["is_virtual"] is False
+    data = response.json()["appointments"]
+    assert len(data) == 52
+    assert [a["occurrence_index"] for a in data] == list(range(52))
+    assert data[0]["start_time"] == start_time.isoformat() + "Z"
+    assert data[-1]["start_time"] == (start_time + timedelta(weeks=51)).isoformat() + "Z"
+    assert data[-1]["end_time"] == (start_time + timedelta(weeks=51, minutes=30)).isoformat() + "Z"
+    assert {a["cost"] for a in data} == {"100.00"}
+    assert len([s for s in statements if s.startswith("INSERT INTO appointments")]) == 1
+
     response = authenticated_client.post(
         "/api/v1/appointments/recurring/",
         json={
-            "patient_id": 1,
-            "specialty_id": 1,
-            "start_time": datetime.now().isoformat(),
+            "patient_id": patient_in_db.id,
+            "specialty_id": specialty_in_db.id,
+            "start_time": start_time.isoformat(),
+            "frequency": "BIWEEKLY",
+            "end_date": (start_time + timedelta(weeks=6)).date().isoformat(),
+        },
+    )
+    # Overlaps with the weekly series
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert len(response.json()["detail"]["appointment_ids"]) == 4
+
+    later_start_time = start_time + timedelta(hours=1)
+    response = authenticated_client.post(
+        "/api/v1/appointments/recurring/",
+        json={
+            "patient_id": patient_in_db.id,
+            "specialty_id": specialty_in_db.id,
+            "start_time": later_start_time.isoformat(),
+            "frequency": "BIWEEKLY",
+            "end_date": (later_start_time + timedelta(weeks=6)).date().isoformat(),
+        },
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert [a["start_time"] for a in response.json()["appointments"]] == [
+        (later_start_time + timedelta(weeks=weeks)).isoformat() + "Z" for weeks in (0, 2, 4, 6)
+    ]
+
+
+def test_open_ended_recurring_series_is_expanded_virtually(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, payment_method_in_db, db_session: Session
+):
+    from app.appointments.models import Appointment
+
+    first_start = datetime(2030, 1, 7, 10, 0)
+    response = authenticated_client.post(
+        "/api/v1/appointments/recurring/",
+        json={
+            "patient_id": patient_in_db.id,
+            "specialty_id": specialty_in_db.id,
+            "start_time": first_start.isoformat(),
             "frequency": "WEEKLY",
-            "number_of_appointments": 5,
         },
     )
-    assert response.status_code == status.HTTP_501_NOT_IMPLEMENTED
-    assert response.json() == {"detail": "Recurring appointments creation is not yet implemented."}
+    assert response.status_code == status.HTTP_201_CREATED
+    series = response.json()
+    assert series["is_virtual"] is True
+    assert series["appointments"] == []
+    assert db_session.query(Appointment).count() == 0
 
+    window = {"start_time": "2031-03-01T00:00:00", "end_time": "2031-04-01T00:00:00"}
+    response = authenticated_client.get("/api/v1/appointments/", params=window)
+    assert response.status_code == status.HTTP_200_OK
+    occurrences = response.json()
+    assert [a["start_time"] for a in occurrences] == [
+        "2031-03-03T10:00:00Z", "2031-03-10T10:00:00Z", "2031-03-17T10:00:00Z", "2031-03-24T10:00:00Z",
+        "2031-03-31T10:00:00Z",
+    ]
+    assert all("id" not in a and a["series_id"] == series["id"] for a in occurrences)
+    assert occurrences[0]["occurrence_index"] == 60
+    assert occurrences[0]["cost"] == "100.00"
 
-def test_create_recurring_appointments_schema_validation(authenticated_client: TestClient):
-    # Test case: neither end_date nor number_of_appointments provided
+    # Paying for one occurrence gives it a row; the listing then returns that row instead of the virtual one
+    response = authenticated_client.post(f"/api/v1/appointments/recurring/{series['id']}/occurrences/61/")
+    assert response.status_code == status.HTTP_200_OK
+    materialized = response.json()
+    assert materialized["start_time"] == "2031-03-10T10:00:00Z"
+    response = authenticated_client.post(
+        f"/api/v1/appointments/{materialized['id']}/payments/",
+        json={"amount": 100, "payment_method_id": payment_method_in_db.id, "patient_id": patient_in_db.id},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    authenticated_client.patch(
+        f"/api/v1/appointments/{materialized['id']}/reschedule/", json={"new_start_time": "2031-04-20T10:00:00"}
+    )
+
+    occurrences = authenticated_client.get("/api/v1/appointments/", params=window).json()
+    assert [a["occurrence_index"] for a in occurrences] == [60, 62, 63, 64]
+    assert db_session.query(Appointment).count() == 1
+
+    # Materializing is idempotent
+    response = authenticated_client.post(f"/api/v1/appointments/recurring/{series['id']}/occurrences/61/")
+    assert response.json()["id"] == materialized["id"]
+
+
+def test_open_ended_recurring_series_is_materialized_up_to_the_horizon(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, db_session: Session
+):
+    from app.appointments.models import Appointment, DailyAppointmentStats
+    from sqlalchemy import func
+
+    first_start = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0) - timedelta(weeks=2, hours=1)
     response = authenticated_client.post(
         "/api/v1/appointments/recurring/",
         json={
-            "patient_id": 1,
-            "specialty_id": 1,
+            "patient_id": patient_in_db.id,
+            "specialty_id": specialty_in_db.id,
+            "start_time": first_start.isoformat(),
+            "frequency": "WEEKLY",
+        },
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    series = response.json()
+    assert series["is_virtual"] is True
+    # Two weeks back and twelve ahead, so past occurrences are regular appointments too
+    assert [a["occurrence_index"] for a in series["appointments"]] == list(range(15))
+    assert db_session.query(func.sum(DailyAppointmentStats.appointment_count)).scalar() == 15
+
+    horizon = first_start + timedelta(weeks=16)
+    assert appointment_services.extend_virtual_series(db_session, until=horizon) == 2
+    assert appointment_services.extend_virtual_series(db_session, until=horizon) == 0
+    assert db_session.query(Appointment).count() == 17
+
+    window = {
+        "start_time": (first_start + timedelta(weeks=15)).isoformat(),
+        "end_time": (horizon + timedelta(weeks=2, hours=1)).isoformat(),
+    }
+    occurrences = authenticated_client.get("/api/v1/appointments/", params=window).json()
+    assert [(a.get("id") is not None, a["occurrence_index"]) for a in occurrences] == [
+        (True, 15), (True, 16), (False, 17), (False, 18)
+    ]
+
+
+def test_virtual_occurrences_follow_keyset_pages(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, db_session: Session
+):
+    authenticated_client.post(
+        "/api/v1/appointments/recurring/",
+        json={
+            "patient_id": patient_in_db.id,
+            "specialty_id": specialty_in_db.id,
+            "start_time": "2030-01-07T10:00:00",
+            "frequency": "WEEKLY",
+        },
+    )
+    for day in (8, 15, 22):
+        appointment_services.create_appointment(
+            db_session,
+            appointment_schemas.AppointmentCreate(
+                patient_id=patient_in_db.id, specialty_id=specialty_in_db.id, start_time=datetime(2030, 1, day, 9)
+            ),
+        )
+
+    window = {"start_time": "2030-01-01T00:00:00", "end_time": "2030-02-01T00:00:00", "limit": 2}
+    first_page = authenticated_client.get("/api/v1/appointments/", params=window)
+    second_page = authenticated_client.get(
+        "/api/v1/appointments/", params={**window, "cursor": first_page.headers["X-Next-Cursor"]}
+    )
+    listed = [a["start_time"] for a in first_page.json() + second_page.json()]
+    assert listed == [
+        "2030-01-07T10:00:00Z", "2030-01-08T09:00:00Z", "2030-01-14T10:00:00Z", "2030-01-15T09:00:00Z",
+        "2030-01-21T10:00:00Z", "2030-01-22T09:00:00Z", "2030-01-28T10:00:00Z",
+    ]
+
+
+def test_create_recurring_appointments_unknown_specialty(authenticated_client: TestClient, patient_in_db):
+    response = authenticated_client.post(
+        "/api/v1/appointments/recurring/",
+        json={
+            "patient_id": patient_in_db.id,
+            "specialty_id": 999,
             "start_time": datetime.now().isoformat(),
             "frequency": "WEEKLY",
+            "number_of_appointments": 5,
         },
     )
-    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
-    assert "Either end_date or number_of_appointments must be provided." in str(response.json())
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {"detail": "Specialty not found"}
 
+
+def test_create_recurring_appointments_schema_validation(authenticated_client: TestClient):
     # Test case: both end_date and number_of_appointments provided
     response = authenticated_client.post(
         "/api/v1/appointments/recurring/",
@@ -504,3 +672,628 @@ def test_get_dashboard_metrics(authenticated_client: TestClient, patient_in_db,
     assert "total_charged_this_month" in data
     assert "total_due_last_month" in data
     assert "total_due_this_month" in data
+
+
+def test_get_appointments_query_count_does_not_grow_with_rows(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, payment_method_in_db, db_session: Session, count_queries
+):
+    start_time = datetime.now() + timedelta(days=1)
+    create_paid_appointment(db_session, patient_in_db.id, specialty_in_db.id, start_time, payment_method_in_db.id)
+    db_session.expire_all()
+
+    with count_queries() as few_rows_queries:
+        response = authenticated_client.get("/api/v1/appointments/")
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 1
+
+    for offset in range(2, 7):
+        create_paid_appointment(
+            db_session, patient_in_db.id, specialty_in_db.id, start_time + timedelta(hours=offset), payment_method_in_db.id
+        )
+    db_session.expire_all()
+
+    with count_queries() as many_rows_queries:
+        response = authenticated_client.get("/api/v1/appointments/")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert len(data) == 6
+    assert all(app["payments"][0]["payment_method"]["name"] == payment_method_in_db.name for app in data)
+    assert len(many_rows_queries) == len(few_rows_queries)
+
+
+def test_get_patient_appointments_and_payments_query_count_does_not_grow_with_rows(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, payment_method_in_db, db_session: Session, count_queries
+):
+    start_time = datetime.now() + timedelta(days=1)
+    create_paid_appointment(db_session, patient_in_db.id, specialty_in_db.id, start_time, payment_method_in_db.id)
+    db_session.expire_all()
+
+    urls = [
+        f"/api/v1/patients/{patient_in_db.id}/appointments/",
+        f"/api/v1/patients/{patient_in_db.id}/payments/",
+        "/api/v1/payments/",
+    ]
+    baseline = {}
+    for url in urls:
+        with count_queries() as queries:
+            assert authenticated_client.get(url).status_code == status.HTTP_200_OK
+        baseline[url] = len(queries)
+
+    for offset in range(2, 7):
+        create_paid_appointment(
+            db_session, patient_in_db.id, specialty_in_db.id, start_time + timedelta(hours=offset), payment_method_in_db.id
+        )
+    db_session.expire_all()
+
+    for url in urls:
+        with count_queries() as queries:
+            response = authenticated_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) == 6
+        assert len(queries) == baseline[url], url
+
+
+def test_total_paid_is_only_loaded_for_responses(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, payment_method_in_db, db_session: Session, count_queries
+):
+    from app.appointments.models import Appointment
+
+    start_time = datetime.now() + timedelta(days=1)
+    appointment = create_paid_appointment(
+        db_session, patient_in_db.id, specialty_in_db.id, start_time, payment_method_in_db.id
+    )
+    appointment_id = appointment.id
+    db_session.expire_all()
+
+    with count_queries() as queries:
+        db_session.query(Appointment).filter(Appointment.id == appointment_id).one()
+    assert "payments" not in queries[0]
+
+    response = authenticated_client.get(f"/api/v1/appointments/{appointment_id}")
+    assert response.status_code == status.HTTP_200_OK
+    assert Decimal(response.json()["total_paid"]) > 0
+
+
+def test_get_appointments_cursor_pagination(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, db_session: Session
+):
+    start_time = datetime.now() + timedelta(days=1)
+    created_ids = [
+        appointment_services.create_appointment(
+            db_session,
+            appointment_schemas.AppointmentCreate(
+                patient_id=patient_in_db.id, specialty_id=specialty_in_db.id, start_time=start_time + timedelta(hours=i)
+            ),
+        ).id
+        for i in range(5)
+    ]
+
+    seen_ids = []
+    response = authenticated_client.get("/api/v1/appointments/", params={"limit": 2})
+    while True:
+        assert response.status_code == status.HTTP_200_OK
+        seen_ids.extend(app["id"] for app in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        # skip is ignored when paging with a cursor
+        response = authenticated_client.get("/api/v1/appointments/", params={"limit": 2, "skip": 10, "cursor": cursor})
+
+    assert seen_ids == created_ids
+
+    # Offset pagination keeps working
+    response = authenticated_client.get("/api/v1/appointments/", params={"limit": 2, "skip": 2})
+    assert [app["id"] for app in response.json()] == created_ids[2:4]
+
+    response = authenticated_client.get("/api/v1/appointments/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_patient_appointments_and_payments_cursor_pagination(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, payment_method_in_db, db_session: Session
+):
+    start_time = datetime.now() + timedelta(days=1)
+    created_ids = [
+        create_paid_appointment(
+            db_session, patient_in_db.id, specialty_in_db.id, start_time + timedelta(hours=i), payment_method_in_db.id
+        ).id
+        for i in range(5)
+    ]
+
+    for url, expected_count in (
+        (f"/api/v1/patients/{patient_in_db.id}/appointments/", 5),
+        ("/api/v1/payments/", 5),
+    ):
+        seen_ids = []
+        params = {"limit": 2}
+        while True:
+            response = authenticated_client.get(url, params=params)
+            assert response.status_code == status.HTTP_200_OK
+            seen_ids.extend(item["id"] for item in response.json())
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params = {"limit": 2, "cursor": response.headers["X-Next-Cursor"]}
+        assert len(seen_ids) == len(set(seen_ids)) == expected_count
+
+    response = authenticated_client.get(f"/api/v1/patients/{patient_in_db.id}/appointments/", params={"limit": 5})
+    # Newest first
+    assert [app["id"] for app in response.json()] == created_ids[::-1]
+
+
+def test_get_dashboard_metrics_values(
+    authenticated_client: TestClient,
+    patient_in_db,
+    specialty_in_db,
+    payment_method_in_db,
+    db_session: Session,
+    count_queries,
+):
+    today_noon = datetime.combine(date.today(), time(12, 0))
+    start_of_last_month = (date.today().replace(day=1) - timedelta(days=1)).replace(day=1)
+
+    def create(start_time: datetime, cost: float):
+        return appointment_services.create_appointment(
+            db_session,
+            appointment_schemas.AppointmentCreate(
+                patient_id=patient_in_db.id, specialty_id=specialty_in_db.id, start_time=start_time, cost=cost
+            ),
+        )
+
+    paid_today = create(today_noon, 100)
+    appointment_services.add_payment(
+        db_session,
+        appointment_id=paid_today.id,
+        payment_in=payment_schemas.PaymentCreate(
+            amount=40, payment_method_id=payment_method_in_db.id, patient_id=patient_in_db.id
+        ),
+    )
+    cancelled_today = create(today_noon + timedelta(hours=1), 50)
+    appointment_services.cancel_appointment(db_session, cancelled_today.id)
+    last_month = create(datetime.combine(start_of_last_month, time(10, 0)), 70)
+    appointment_services.add_payment(
+        db_session,
+        appointment_id=last_month.id,
+        payment_in=payment_schemas.PaymentCreate(
+            amount=70, payment_method_id=payment_method_in_db.id, patient_id=patient_in_db.id
+        ),
+    )
+
+    with count_queries() as queries:
+        response = authenticated_client.get("/api/v1/metrics/dashboard/")
+    assert response.status_code == status.HTTP_200_OK
+    # Authentication plus one appointments and one payments aggregate
+    assert len(queries) <= 3
+
+    data = response.json()
+    assert data["appointments_today"] == 1
+    assert data["appointments_this_week"] == 1
+    assert Decimal(data["expected_revenue_this_month"]) == 150
+    assert Decimal(data["total_charged_this_month"]) == 40
+    assert Decimal(data["total_due_this_month"]) == 110
+    assert Decimal(data["expected_revenue_last_month"]) == 70
+    assert Decimal(data["total_charged_last_month"]) == 70
+    assert Decimal(data["total_due_last_month"]) == 0
+
+
+def test_daily_stats_rollup_matches_rebuild(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, payment_method_in_db, db_session: Session
+):
+    from app.appointments import rollup
+    from app.appointments.models import DailyAppointmentStats
+    from app.payments import services as payment_services
+
+    def snapshot():
+        db_session.expire_all()
+        return {
+            (row.day, row.specialty_id, row.status): (row.appointment_count, row.revenue, row.amount_charged)
+            for row in db_session.query(DailyAppointmentStats).all()
+            if row.appointment_count or row.amount_charged
+        }
+
+    start_time = datetime.combine(date.today(), time(10, 0))
+    kept = create_paid_appointment(db_session, patient_in_db.id, specialty_in_db.id, start_time, payment_method_in_db.id)
+    moved = create_paid_appointment(
+        db_session, patient_in_db.id, specialty_in_db.id, start_time + timedelta(hours=1), payment_method_in_db.id
+    )
+    deleted = create_paid_appointment(
+        db_session, patient_in_db.id, specialty_in_db.id, start_time + timedelta(hours=2), payment_method_in_db.id
+    )
+
+    appointment_services.update_appointment(
+        db_session,
+        kept.id,
+        appointment_schemas.AppointmentUpdate(start_time=kept.start_time, end_time=kept.end_time, cost=120),
+    )
+    appointment_services.reschedule_appointment(db_session, moved.id, start_time + timedelta(days=3))
+    appointment_services.cancel_appointment(db_session, deleted.id)
+    appointment_services.delete_appointment(db_session, deleted.id)
+    payment = payment_services.create_payment(
+        db_session,
+        payment_schemas.PaymentCreate(
+            amount=25, payment_method_id=payment_method_in_db.id, patient_id=patient_in_db.id, appointment_id=kept.id
+        ),
+    )
+    payment_services.update_payment(
+        db_session,
+        payment.id,
+        payment_schemas.PaymentUpdate(
+            amount=35, payment_method_id=payment_method_in_db.id, patient_id=patient_in_db.id, appointment_id=moved.id
+        ),
+    )
+    payment_services.delete_payment(db_session, kept.payments[0].id)
+
+    incremental = snapshot()
+    rollup.rebuild_daily_stats(db_session)
+    assert incremental == snapshot()
+
+    response = authenticated_client.get(
+        "/api/v1/metrics/",
+        params={"start_date": date.today().isoformat(), "end_date": (date.today() + timedelta(days=7)).isoformat()},
+    )
+    data = response.json()
+    assert data["total_appointments"] == 2
+    assert Decimal(data["total_revenue"]) == 220
+    assert Decimal(data["total_charged"]) == 45
+
+
+def test_daily_stats_rollup_adds_differences_in_the_database(
+    patient_in_db, specialty_in_db, payment_method_in_db, db_session: Session
+):
+    from app.appointments import rollup
+    from app.appointments.models import AppointmentStatus, DailyAppointmentStats
+
+    start_time = datetime.combine(date.today(), time(10, 0))
+    first = create_paid_appointment(db_session, patient_in_db.id, specialty_in_db.id, start_time, payment_method_in_db.id)
+    second = create_paid_appointment(
+        db_session, patient_in_db.id, specialty_in_db.id, start_time + timedelta(hours=1), payment_method_in_db.id
+    )
+    key = (start_time.date(), specialty_in_db.id, AppointmentStatus.SCHEDULED)
+
+    # Another worker's session, holding the row of the day as it was before this one changes it
+    other_session = sessionmaker(bind=db_session.get_bind())()
+    assert other_session.get(DailyAppointmentStats, key).appointment_count == 2
+    rollup.remove_appointment(db_session, first)
+    db_session.commit()
+    rollup.remove_appointment(other_session, other_session.get(type(second), second.id))
+    other_session.commit()
+    other_session.close()
+
+    # A change that fails half-way leaves the rollup as it was
+    def cancel_and_fail() -> None:
+        with rollup.tracking(db_session, second):
+            second.status = AppointmentStatus.CANCELLED
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        cancel_and_fail()
+    db_session.flush()
+
+    db_session.expire_all()
+    row = db_session.get(DailyAppointmentStats, key)
+    assert row.appointment_count == 0
+    assert row.amount_charged == 0
+
+
+def test_patient_balances_follow_appointment_and_payment_changes(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, payment_method_in_db, db_session: Session
+):
+    from app.patients.balances import find_balance_drift
+    from app.payments import services as payment_services
+
+    other_patient = create_patient(db_session, PatientCreate(name="Other Patient"))
+    start_time = datetime.now() + timedelta(days=1)
+    paid = create_paid_appointment(
+        db_session, patient_in_db.id, specialty_in_db.id, start_time, payment_method_in_db.id
+    )
+    cancelled = create_paid_appointment(
+        db_session, patient_in_db.id, specialty_in_db.id, start_time + timedelta(hours=1), payment_method_in_db.id
+    )
+    moved = create_paid_appointment(
+        db_session, patient_in_db.id, specialty_in_db.id, start_time + timedelta(hours=2), payment_method_in_db.id
+    )
+    authenticated_client.post(
+        "/api/v1/appointments/batch/",
+        json=[
+            {
+                "patient_id": other_patient.id,
+                "specialty_id": specialty_in_db.id,
+                "start_time": (start_time + timedelta(hours=3)).isoformat(),
+                "cost": 70,
+            }
+        ],
+    )
+
+    appointment_services.update_appointment(
+        db_session,
+        paid.id,
+        appointment_schemas.AppointmentUpdate(start_time=paid.start_time, end_time=paid.end_time, cost=150),
+    )
+    appointment_services.cancel_appointment(db_session, cancelled.id)
+    appointment_services.update_appointment(
+        db_session,
+        moved.id,
+        appointment_schemas.AppointmentUpdate(
+            start_time=moved.start_time, end_time=moved.end_time, patient_id=other_patient.id
+        ),
+    )
+    payment = payment_services.create_payment(
+        db_session,
+        payment_schemas.PaymentCreate(
+            amount=40, payment_method_id=payment_method_in_db.id, patient_id=patient_in_db.id, appointment_id=paid.id
+        ),
+    )
+    payment_services.update_payment(
+        db_session,
+        payment.id,
+        payment_schemas.PaymentUpdate(
+            amount=50, payment_method_id=payment_method_in_db.id, patient_id=patient_in_db.id, appointment_id=paid.id
+        ),
+    )
+
+    assert find_balance_drift(db_session) == []
+    response = authenticated_client.get(f"/api/v1/patients/{patient_in_db.id}/")
+    assert response.json()["financial_summary"] == {"total_paid": "70.00", "total_due": "150.00", "balance": "-80.00"}
+    response = authenticated_client.get(f"/api/v1/patients/{other_patient.id}/")
+    assert response.json()["financial_summary"] == {"total_paid": "10.00", "total_due": "170.00", "balance": "-160.00"}
+
+
+def test_create_appointments_batch(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, db_session: Session, count_queries
+):
+    from app.patients.schemas import PatientSpecialtyPriceCreate
+    from app.patients.services import set_special_price
+
+    other_patient = create_patient(db_session, PatientCreate(name="Other Patient"))
+    set_special_price(
+        db_session,
+        PatientSpecialtyPriceCreate(patient_id=other_patient.id, specialty_id=specialty_in_db.id, price=80),
+    )
+    start_time = datetime.now() + timedelta(days=1)
+    items = [
+        {"patient_id": patient_in_db.id, "specialty_id": specialty_in_db.id, "start_time": start_time.isoformat()},
+        {
+            "patient_id": other_patient.id,
+            "specialty_id": specialty_in_db.id,
+            "start_time": (start_time + timedelta(hours=1)).isoformat(),
+        },
+        {"patient_id": patient_in_db.id, "specialty_id": 999, "start_time": start_time.isoformat()},
+        {"patient_id": 999, "specialty_id": specialty_in_db.id, "start_time": start_time.isoformat()},
+        {
+            "patient_id": patient_in_db.id,
+            "specialty_id": specialty_in_db.id,
+            "start_time": (start_time + timedelta(days=7)).isoformat(),
+            "cost": 50,
+        },
+        # Overlaps with the first item
+        {
+            "patient_id": other_patient.id,
+            "specialty_id": specialty_in_db.id,
+            "start_time": (start_time + timedelta(minutes=10)).isoformat(),
+        },
+    ]
+
+    earlier = {**items[0], "start_time": (start_time - timedelta(hours=2)).isoformat()}
+    with count_queries() as few_items_statements:
+        first_response = authenticated_client.post("/api/v1/appointments/batch/", json=[earlier])
+    with count_queries() as statements:
+        response = authenticated_client.post("/api/v1/appointments/batch/", json=[*items, earlier])
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()
+    assert [result["index"] for result in results] == [0, 1, 2, 3, 4, 5, 6]
+    assert Decimal(results[0]["appointment"]["cost"]) == 100
+    assert results[0]["appointment"]["end_time"] == (start_time + timedelta(minutes=30)).isoformat() + "Z"
+    assert Decimal(results[1]["appointment"]["cost"]) == 80
+    assert results[2] == {"index": 2, "appointment": None, "error": "Specialty not found", "conflicts": None}
+    assert results[3] == {"index": 3, "appointment": None, "error": "Patient not found", "conflicts": None}
+    assert Decimal(results[4]["appointment"]["cost"]) == 50
+    assert results[5]["error"] == "The appointment overlaps with another appointment of the batch."
+    assert results[6]["conflicts"]["appointment_ids"] == [first_response.json()[0]["appointment"]["id"]]
+    assert appointment_services.get_appointments(db_session, patient_id=patient_in_db.id)[-1].cost == 50
+    # Lookups are one query each whatever the batch size; only the INSERTs grow with it
+    assert len(statements) <= len(few_items_statements) + 4
+
+
+def test_create_appointments_batch_rejects_empty(authenticated_client: TestClient):
+    response = authenticated_client.post("/api/v1/appointments/batch/", json=[])
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_scheduling_conflicts(authenticated_client: TestClient, patient_in_db, specialty_in_db, db_session: Session):
+    start_time = datetime(2030, 1, 7, 10, 0)  # A Monday
+    booked = appointment_services.create_appointment(
+        db_session,
+        appointment_schemas.AppointmentCreate(
+            patient_id=patient_in_db.id, specialty_id=specialty_in_db.id, start_time=start_time
+        ),
+    )
+    overlapping = {
+        "patient_id": patient_in_db.id,
+        "specialty_id": specialty_in_db.id,
+        "start_time": (start_time + timedelta(minutes=15)).isoformat(),
+    }
+
+    response = authenticated_client.post("/api/v1/appointments/", json=overlapping)
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.json()["detail"]["appointment_ids"] == [booked.id]
+
+    params = {"start_time": "2030-01-07T10:15:00", "end_time": "2030-01-07T10:45:00"}
+    response = authenticated_client.get("/api/v1/appointments/conflicts/", params=params)
+    assert response.json() == {
+        "appointment_ids": [booked.id], "occurrences": [], "outside_working_hours": False, "has_conflicts": True
+    }
+    # Back to back is fine, and an appointment doesn't conflict with itself
+    back_to_back = {"start_time": "2030-01-07T10:30:00", "end_time": "2030-01-07T11:00:00"}
+    response = authenticated_client.get("/api/v1/appointments/conflicts/", params=back_to_back)
+    assert response.json()["has_conflicts"] is False
+    response = authenticated_client.get("/api/v1/appointments/conflicts/", params={**params, "exclude_id": booked.id})
+    assert response.json()["has_conflicts"] is False
+    response = authenticated_client.patch(
+        f"/api/v1/appointments/{booked.id}/reschedule/", json={"new_start_time": "2030-01-07T10:15:00"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    # Cancelled appointments free their slot
+    authenticated_client.patch(f"/api/v1/appointments/{booked.id}/cancel/")
+    response = authenticated_client.post("/api/v1/appointments/", json=overlapping)
+    assert response.status_code == status.HTTP_201_CREATED
+    response = authenticated_client.patch(f"/api/v1/appointments/{booked.id}/restore/")
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+
+def test_scheduling_conflicts_with_virtual_occurrences(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, db_session: Session
+):
+    response = authenticated_client.post(
+        "/api/v1/appointments/recurring/",
+        json={
+            "patient_id": patient_in_db.id,
+            "specialty_id": specialty_in_db.id,
+            "start_time": "2030-01-07T10:00:00",
+            "frequency": "WEEKLY",
+        },
+    )
+    series_id = response.json()["id"]
+    # Far beyond the horizon, so occurrence 52 has no row
+    overlapping = {
+        "patient_id": patient_in_db.id,
+        "specialty_id": specialty_in_db.id,
+        "start_time": "2031-01-06T10:15:00",
+    }
+
+    response = authenticated_client.post("/api/v1/appointments/", json=overlapping)
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.json()["detail"]["occurrences"] == [{"series_id": series_id, "occurrence_index": 52}]
+    params = {"start_time": "2031-01-06T09:45:00", "end_time": "2031-01-06T10:15:00"}
+    response = authenticated_client.get("/api/v1/appointments/conflicts/", params=params)
+    assert response.json()["has_conflicts"] is True
+
+    # Rescheduling onto an occurrence conflicts too, while a materialized occurrence doesn't conflict with itself
+    other = appointment_services.create_appointment(
+        db_session,
+        appointment_schemas.AppointmentCreate(
+            patient_id=patient_in_db.id, specialty_id=specialty_in_db.id, start_time=datetime(2031, 1, 6, 12)
+        ),
+    )
+    response = authenticated_client.patch(
+        f"/api/v1/appointments/{other.id}/reschedule/", json={"new_start_time": "2031-01-06T10:00:00"}
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+    occurrence = authenticated_client.post(f"/api/v1/appointments/recurring/{series_id}/occurrences/52/").json()
+    response = authenticated_client.patch(
+        f"/api/v1/appointments/{occurrence['id']}/reschedule/", json={"new_start_time": "2031-01-06T10:10:00"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    # Another endless series is checked against this one over its first weeks
+    response = authenticated_client.post(
+        "/api/v1/appointments/recurring/",
+        json={
+            "patient_id": patient_in_db.id,
+            "specialty_id": specialty_in_db.id,
+            "start_time": "2030-06-03T10:15:00",
+            "frequency": "BIWEEKLY",
+        },
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.json()["detail"]["occurrences"][0] == {"series_id": series_id, "occurrence_index": 21}
+
+
+def test_scheduling_conflicts_with_working_hours(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db
+):
+    authenticated_client.post(
+        "/api/v1/working-hours/",
+        json=[
+            {"dayOfWeek": "Monday", "startTime": "09:00:00", "endTime": "18:00:00"},
+            {"dayOfWeek": "Sunday", "is_closed": True},
+        ],
+    )
+
+    def conflicts(start_time: str, end_time: str) -> dict:
+        params = {"start_time": start_time, "end_time": end_time}
+        return authenticated_client.get("/api/v1/appointments/conflicts/", params=params).json()
+
+    assert conflicts("2030-01-07T09:00:00", "2030-01-07T09:30:00")["has_conflicts"] is False
+    assert conflicts("2030-01-07T17:45:00", "2030-01-07T18:15:00")["outside_working_hours"] is True
+    assert conflicts("2030-01-06T10:00:00", "2030-01-06T10:30:00")["outside_working_hours"] is True
+    # Tuesday has no working hours set
+    assert conflicts("2030-01-08T22:00:00", "2030-01-08T22:30:00")["has_conflicts"] is False
+
+    response = authenticated_client.post(
+        "/api/v1/appointments/",
+        json={"patient_id": patient_in_db.id, "specialty_id": specialty_in_db.id, "start_time": "2030-01-06T10:00:00"},
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.json()["detail"]["message"] == "The appointment is outside the working hours."
+
+
+def test_update_appointment_outside_working_hours_without_moving_it(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db
+):
+    start_time, end_time = "2030-01-07T20:00:00", "2030-01-07T20:30:00"
+    response = authenticated_client.post(
+        "/api/v1/appointments/",
+        json={"patient_id": patient_in_db.id, "specialty_id": specialty_in_db.id, "start_time": start_time},
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    appointment_id = response.json()["id"]
+    # The hours change after it was booked
+    authenticated_client.post(
+        "/api/v1/working-hours/", json=[{"dayOfWeek": "Monday", "startTime": "09:00:00", "endTime": "18:00:00"}]
+    )
+
+    for changes in ({"status": "COMPLETED"}, {"cost": 80}):
+        response = authenticated_client.put(
+            f"/api/v1/appointments/{appointment_id}", json={"start_time": start_time, "end_time": end_time, **changes}
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+    # Moving it is still checked
+    response = authenticated_client.put(
+        f"/api/v1/appointments/{appointment_id}",
+        json={"start_time": "2030-01-07T21:00:00", "end_time": "2030-01-07T21:30:00"},
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+
+def test_get_availability(authenticated_client: TestClient, patient_in_db, specialty_in_db, db_session: Session):
+    import json
+
+    authenticated_client.post(
+        "/api/v1/working-hours/",
+        json=[
+            {"dayOfWeek": "Monday", "startTime": "09:00:00", "endTime": "12:00:00"},
+            {"dayOfWeek": "Tuesday", "is_closed": True},
+        ],
+    )
+    for start_time in (datetime(2030, 1, 7, 9, 30), datetime(2030, 1, 7, 10, 15)):
+        appointment_services.create_appointment(
+            db_session,
+            appointment_schemas.AppointmentCreate(
+                patient_id=patient_in_db.id, specialty_id=specialty_in_db.id, start_time=start_time
+            ),
+        )
+
+    params = {"specialty_id": specialty_in_db.id, "start_date": "2030-01-07", "end_date": "2030-01-09"}
+    response = authenticated_client.get("/api/v1/appointments/availability/", params=params)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {"date": "2030-01-07", "slots": ["09:00", "10:45", "11:15"]},
+        {"date": "2030-01-08", "slots": []},
+        {"date": "2030-01-09", "slots": []},
+    ]
+
+    # Occurrences of open-ended series take their slot too
+    authenticated_client.post(
+        "/api/v1/appointments/recurring/",
+        json={
+            "patient_id": patient_in_db.id,
+            "specialty_id": specialty_in_db.id,
+            "start_time": "2029-12-31T11:00:00",
+            "frequency": "WEEKLY",
+        },
+    )
+    response = authenticated_client.get("/api/v1/appointments/availability/", params=params)
+    assert json.loads(response.text.splitlines()[0]) == {"date": "2030-01-07", "slots": ["09:00", "11:30"]}
@@ -0,0 +1,32 @@
+from app.core.cache import TTLCache
+
+
+def test_get_or_load_caches_the_loaded_value():
+    cache = TTLCache("test_cache", ttl=60)
+    assert cache.get_or_load("key", lambda: 1) == 1
+    assert cache.get_or_load("key", lambda: 2) == 1
+
+
+def test_get_or_load_does_not_cache_a_value_loaded_across_a_clear():
+    cache = TTLCache("test_cache", ttl=60)
+
+    def load_then_write() -> int:
+        # A write commits and clears the cache while the old value is being read
+        cache.clear()
+        return 1
+
+    assert cache.get_or_load("key", load_then_write) == 1
+    assert cache.get("key") is None
+    assert cache.get_or_load("key", lambda: 2) == 2
+    assert cache.get_or_load("key", lambda: 3) == 2
+
+
+def test_get_or_load_does_not_cache_a_value_loaded_across_a_discard():
+    cache = TTLCache("test_cache", ttl=60)
+
+    def load_then_write() -> int:
+        cache.discard("key")
+        return 1
+
+    assert cache.get_or_load("key", load_then_write) == 1
+    assert cache.get("key") is None
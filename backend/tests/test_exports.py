@@ -0,0 +1,79 @@
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from tests.conftest import create_paid_appointment
+
+
+def _csv_rows(text: str) -> tuple[list[str], list[list[str]]]:
+    header, *rows = [line.split(",") for line in text.splitlines()]
+    return header, rows
+
+
+def test_export_appointments_and_payments(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, payment_method_in_db, db_session: Session
+):
+    for day in (1, 2, 3):
+        create_paid_appointment(
+            db_session, patient_in_db.id, specialty_in_db.id, datetime(2030, 1, day, 10), payment_method_in_db.id
+        )
+
+    response = authenticated_client.get("/api/v1/exports/appointments", params={"end_date": "2030-01-03"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="appointments.csv"'
+    header, rows = _csv_rows(response.text)
+    assert header[:6] == ["id", "start_time", "end_time", "status", "cost", "total_paid"]
+    assert [row[1] for row in rows] == ["2030-01-01T10:00:00", "2030-01-02T10:00:00"]
+    assert rows[0][3:6] == ["SCHEDULED", "100.00", "10.00"]
+
+    response = authenticated_client.get(
+        "/api/v1/exports/payments", params={"format": "ndjson", "start_date": "2000-01-01"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    payments = [json.loads(line) for line in response.text.splitlines()]
+    assert len(payments) == 3
+    assert payments[0]["amount"] == "10.00"
+    assert payments[0]["payment_method"] == payment_method_in_db.name
+    assert payments[0]["patient_name"] == patient_in_db.name
+
+
+def test_export_start_date_is_inclusive(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, payment_method_in_db, db_session: Session
+):
+    for start_time in (datetime(2030, 1, 1, 23), datetime(2030, 1, 2), datetime(2030, 1, 2, 10)):
+        create_paid_appointment(db_session, patient_in_db.id, specialty_in_db.id, start_time, payment_method_in_db.id)
+
+    response = authenticated_client.get(
+        "/api/v1/exports/appointments", params={"start_date": "2030-01-02", "end_date": "2030-01-03"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    _, rows = _csv_rows(response.text)
+    # From midnight on, the one the night before isn't in the range
+    assert [row[1] for row in rows] == ["2030-01-02T00:00:00", "2030-01-02T10:00:00"]
+
+
+def test_export_empty_range_has_only_the_header(
+    authenticated_client: TestClient, patient_in_db, specialty_in_db, payment_method_in_db, db_session: Session
+):
+    create_paid_appointment(
+        db_session, patient_in_db.id, specialty_in_db.id, datetime(2030, 1, 1, 10), payment_method_in_db.id
+    )
+
+    for url in ("/api/v1/exports/appointments", "/api/v1/exports/payments"):
+        response = authenticated_client.get(url, params={"start_date": "2031-01-01", "end_date": "2031-02-01"})
+        assert response.status_code == status.HTTP_200_OK
+        header, rows = _csv_rows(response.text)
+        assert header[0] == "id"
+        assert rows == []
+
+
+@pytest.mark.parametrize("url", ["/api/v1/exports/appointments", "/api/v1/exports/payments"])
+def test_export_requires_authentication(client: TestClient, url: str):
+    response = client.get(url)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
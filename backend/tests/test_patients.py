@@ -1,4 +1,8 @@
 import pytest
+from app.common import pagination
+from app.core import encryption
+from app.patients import models as patient_models
+from app.patients import router as patient_router
 from app.patients import services as patient_services
 from app.patients import schemas as patient_schemas
 from app.users.models import User
@@ -24,6 +28,31 @@ def test_create_patient(authenticated_client: TestClient, db_session: Session):
     assert "id" in data
 
 
+def test_medical_history_is_only_decrypted_when_shown(
+    authenticated_client: TestClient, db_session: Session, monkeypatch: pytest.MonkeyPatch
+):
+    patient = patient_services.create_patient(
+        db_session, patient_schemas.PatientCreate(name="John Doe", medical_history="Initial consultation.")
+    )
+    assert patient.encrypted_medical_history != "Initial consultation."
+    decrypted = []
+    monkeypatch.setattr(encryption.branca, "decrypt", lambda token: decrypted.append(token) or b"Decrypted.")
+
+    response = authenticated_client.get("/api/v1/patients/")
+    assert "medical_history" not in response.json()["items"][0]
+    # What was just saved is cached
+    assert authenticated_client.get(f"/api/v1/patients/{patient.id}/").json()["medical_history"] == (
+        "Initial consultation."
+    )
+    assert decrypted == []
+
+    encryption.DECRYPTED_CACHE.clear()
+    for _ in range(2):
+        response = authenticated_client.get(f"/api/v1/patients/{patient.id}/details/")
+        assert response.json()["medical_history"] == "Decrypted."
+    assert len(decrypted) == 1
+
+
 def test_read_patients(authenticated_client: TestClient, db_session: Session):
     patient_data = patient_schemas.PatientCreate(name="Jane Doe", email="jane.doe@example.com")
     patient_services.create_patient(db_session, patient_data)
@@ -35,6 +64,46 @@ def test_read_patients(authenticated_client: TestClient, db_session: Session):
     assert data["items"][0]["name"] == "Jane Doe"
 
 
+def test_read_patients_appointment_dates(authenticated_client: TestClient, db_session: Session):
+    from datetime import UTC, datetime, timedelta
+
+    from app.appointments.models import Appointment, AppointmentStatus
+    from app.specialties.models import Specialty
+
+    patient = patient_services.create_patient(db_session, patient_schemas.PatientCreate(name="Jane Doe"))
+    patient_services.create_patient(db_session, patient_schemas.PatientCreate(name="John Doe"))
+    specialty = Specialty(name="Specialty", default_duration_minutes=30)
+    db_session.add(specialty)
+    db_session.flush()
+    now = datetime.now(UTC).replace(tzinfo=None, microsecond=0)
+    for days in (-10, -3, 4, 9):
+        db_session.add(
+            Appointment(
+                patient_id=patient.id,
+                specialty_id=specialty.id,
+                start_time=now + timedelta(days=days),
+                end_time=now + timedelta(days=days, minutes=30),
+                cost=100,
+                status=AppointmentStatus.SCHEDULED,
+            )
+        )
+    db_session.commit()
+
+    response = authenticated_client.get("/api/v1/patients/")
+    assert response.status_code == status.HTTP_200_OK
+    jane, john = response.json()["items"]
+    assert datetime.fromisoformat(jane["last_appointment"]).replace(tzinfo=None) == now - timedelta(days=3)
+    assert datetime.fromisoformat(jane["next_appointment"]).replace(tzinfo=None) == now + timedelta(days=4)
+    assert john["last_appointment"] is None
+    assert john["next_appointment"] is None
+
+    # The client shares this session, drop the patients loaded by the previous request
+    db_session.expunge_all()
+    response = authenticated_client.get("/api/v1/patients/", params={"include_appointment_dates": False})
+    assert response.status_code == status.HTTP_200_OK
+    assert all(item["next_appointment"] is None for item in response.json()["items"])
+
+
 def test_read_patient(authenticated_client: TestClient, db_session: Session):
     patient_data = patient_schemas.PatientCreate(name="Jim Doe", email="jim.doe@example.com")
     patient = patient_services.create_patient(db_session, patient_data)
@@ -46,6 +115,91 @@ def test_read_patient(authenticated_client: TestClient, db_session: Session):
     assert data["id"] == patient.id
 
 
+def test_search_patients(authenticated_client: TestClient, db_session: Session):
+    for name, nickname in (
+        ("José Peña", "Pepe"),
+        ("María José Núñez", None),
+        ("Joseph Smith", "Joe"),
+        ("Ana Li", None),
+    ):
+        patient_services.create_patient(db_session, patient_schemas.PatientCreate(name=name, nickname=nickname))
+
+    def search(query: str) -> set[str]:
+        response = authenticated_client.get("/api/v1/patients/", params={"query": query})
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["total_count"] == len(data["items"])
+        assert data["next_cursor"] is None
+        return {patient["name"] for patient in data["items"]}
+
+    assert search("jose") == {"José Peña", "Joseph Smith", "María José Núñez"}
+    assert search("PENA") == {"José Peña"}
+    assert search("nunez mar") == {"María José Núñez"}
+    assert search("pepe") == {"José Peña"}
+    assert search("li") == {"Ana Li"}
+    assert search("jos li") == set()
+    assert search("50%") == set()
+
+    # The index follows updates and deletes
+    ana = db_session.query(patient_models.Patient).filter_by(name="Ana Li").one()
+    patient_services.update_patient(db_session, ana.id, patient_schemas.PatientUpdate(nickname="Anita Josefa"))
+    assert search("josefa") == {"Ana Li"}
+    patient_services.delete_patient(db_session, ana.id)
+    assert search("josefa") == set()
+
+    response = authenticated_client.get("/api/v1/patients/", params={"query": "jose", "cursor": "abc"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.parametrize("query", ["patient", "pa"])
+def test_search_patients_cursor_pagination_when_not_ranked(
+    authenticated_client: TestClient, db_session: Session, monkeypatch: pytest.MonkeyPatch, query: str
+):
+    names = [f"Patient {letter}" for letter in "EDCBA"]
+    for name in names:
+        patient_services.create_patient(db_session, patient_schemas.PatientCreate(name=name))
+    # Too many matches to rank them for the trigram index, and a word too short for it for the LIKE
+    monkeypatch.setattr(patient_services, "RANKED_SEARCH_LIMIT", 2)
+
+    seen_names = []
+    params = {"query": query, "limit": 2}
+    while True:
+        response = authenticated_client.get("/api/v1/patients/", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["total_count"] == 5
+        seen_names.extend(patient["name"] for patient in data["items"])
+        if data["next_cursor"] is None:
+            break
+        params = {"query": query, "limit": 2, "cursor": data["next_cursor"]}
+
+    assert seen_names == sorted(names)
+
+
+def test_read_patients_count_modes(
+    authenticated_client: TestClient, db_session: Session, monkeypatch: pytest.MonkeyPatch
+):
+    for i in range(5):
+        patient_services.create_patient(db_session, patient_schemas.PatientCreate(name=f"Patient {i}"))
+    monkeypatch.setattr(pagination, "COUNT_CAP", 3)
+    monkeypatch.setattr(patient_router, "COUNT_CAP", 3)
+
+    def read(**params: str) -> tuple[int | None, bool]:
+        response = authenticated_client.get("/api/v1/patients/", params={"limit": 2, **params})
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert len(data["items"]) == 2
+        return data["total_count"], data["total_count_capped"]
+
+    assert read() == (5, False)
+    assert read(count="capped") == (3, True)
+    assert read(count="none") == (None, False)
+    # Searches reuse the count of the index
+    assert read(query="patient") == (5, False)
+    assert read(query="patient", count="capped") == (3, True)
+    assert read(query="patient", count="none") == (None, False)
+
+
 def test_update_patient(authenticated_client: TestClient, db_session: Session):
     patient_data = patient_schemas.PatientCreate(name="Jill Doe", email="jill.doe@example.com")
     patient = patient_services.create_patient(db_session, patient_data)
@@ -267,3 +421,205 @@ def test_patient_details_includes_emergency_contacts(authenticated_client: TestC
     # Contacts are not ordered by priority in the response, so we check for presence
     assert any(contact["full_name"] == "EC A" for contact in data["emergency_contacts"])
     assert any(contact["full_name"] == "EC B" for contact in data["emergency_contacts"])
+
+
+def test_read_patients_query_count_does_not_grow_with_rows(
+    authenticated_client: TestClient, db_session: Session, count_queries
+):
+    patient_services.create_patient(db_session, patient_schemas.PatientCreate(name="Patient 0"))
+    db_session.expire_all()
+    with count_queries() as few_rows_queries:
+        assert authenticated_client.get("/api/v1/patients/").status_code == status.HTTP_200_OK
+
+    for i in range(1, 6):
+        patient_services.create_patient(db_session, patient_schemas.PatientCreate(name=f"Patient {i}"))
+    db_session.expire_all()
+
+    with count_queries() as many_rows_queries:
+        response = authenticated_client.get("/api/v1/patients/")
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()["items"]) == 6
+    assert len(many_rows_queries) == len(few_rows_queries)
+
+
+def test_read_patients_cursor_pagination(authenticated_client: TestClient, db_session: Session):
+    names = [f"Patient {letter}" for letter in "EDCBA"]
+    for name in names:
+        patient_services.create_patient(db_session, patient_schemas.PatientCreate(name=name))
+
+    seen_names = []
+    params = {"limit": 2}
+    while True:
+        response = authenticated_client.get("/api/v1/patients/", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["total_count"] == 5
+        seen_names.extend(patient["name"] for patient in data["items"])
+        if data["next_cursor"] is None:
+            break
+        params = {"limit": 2, "cursor": data["next_cursor"]}
+
+    assert seen_names == sorted(names)
+
+
+def test_get_appointment_summary(db_session: Session):
+    from datetime import UTC, datetime, timedelta
+
+    from app.appointments.models import Appointment, AppointmentStatus
+    from app.specialties.models import Specialty
+
+    patient = patient_services.create_patient(db_session, patient_schemas.PatientCreate(name="Jane Doe"))
+    first = Specialty(name="First", default_duration_minutes=30)
+    second = Specialty(name="Second", default_duration_minutes=30)
+    db_session.add_all([first, second])
+    db_session.flush()
+    now = datetime.now(UTC).replace(tzinfo=None)
+    for specialty, days in ((first, -10), (first, -3), (first, 4), (second, 5), (second, -1)):
+        db_session.add(
+            Appointment(
+                patient_id=patient.id,
+                specialty_id=specialty.id,
+                start_time=now + timedelta(days=days),
+                end_time=now + timedelta(days=days, minutes=30),
+                cost=100,
+                status=AppointmentStatus.SCHEDULED,
+            )
+        )
+    db_session.commit()
+
+    summary = patient_services.get_appointment_summary(db_session, patient.id)
+    assert summary.total_appointments == 5
+    assert summary.upcoming_appointments == 2
+    assert summary.past_appointments == 3
+    assert summary.specialty_counts == {
+        first.id: {"total": 3, "upcoming": 1, "past": 2},
+        second.id: {"total": 2, "upcoming": 1, "past": 1},
+    }
+
+
+def test_patient_detail_endpoints_use_a_fixed_number_of_queries(
+    authenticated_client: TestClient, db_session: Session, payment_method_in_db, count_queries
+):
+    from datetime import datetime, timedelta
+
+    from app.appointments.models import Appointment, AppointmentStatus
+    from app.patients.balances import rebuild_balances
+    from app.payments.models import Payment
+    from app.specialties.models import Specialty
+
+    patient = patient_services.create_patient(db_session, patient_schemas.PatientCreate(name="Jane Doe"))
+    specialties = [Specialty(name=name, default_duration_minutes=30) for name in ("First", "Second")]
+    db_session.add_all(specialties)
+    db_session.flush()
+    start = datetime(2030, 1, 7, 10)
+    appointments = [
+        Appointment(
+            patient_id=patient.id,
+            specialty_id=specialties[i % 2].id,
+            start_time=start + timedelta(days=i),
+            end_time=start + timedelta(days=i, minutes=30),
+            cost=100,
+            status=AppointmentStatus.CANCELLED if i == 0 else AppointmentStatus.SCHEDULED,
+        )
+        for i in range(4)
+    ]
+    db_session.add_all(appointments)
+    db_session.flush()
+    db_session.add_all(
+        Payment(
+            amount=amount,
+            appointment_id=appointment.id,
+            patient_id=patient.id,
+            payment_method_id=payment_method_in_db.id,
+        )
+        for amount, appointment in ((40, appointments[1]), (60, appointments[2]))
+    )
+    db_session.commit()
+    # Rows added behind the services' back, bring the running balance up to date
+    rebuild_balances(db_session)
+    patient_id, appointment_ids = patient.id, [a.id for a in reversed(appointments)]
+    db_session.expire_all()
+
+    with count_queries() as queries:
+        response = authenticated_client.get(f"/api/v1/patients/{patient_id}/details/")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert len([q for q in queries if "FROM users" not in q]) <= 4
+    assert [a["id"] for a in data["appointments"]] == appointment_ids
+    assert len(data["payments"]) == 2
+    assert data["financial_summary"] == {"total_paid": "100.00", "total_due": "300.00", "balance": "-200.00"}
+
+    with count_queries() as queries:
+        response = authenticated_client.get(f"/api/v1/patients/{patient_id}/")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert len([q for q in queries if "FROM users" not in q]) <= 4
+    assert data["financial_summary"] == {"total_paid": "100.00", "total_due": "300.00", "balance": "-200.00"}
+    assert data["appointment_summary"]["total_appointments"] == 4
+    assert data["last_appointment"] is None
+    assert data["next_appointment"].startswith("2030-01-07T10:00:00")
+
+
+def test_patient_details_view_limits_appointments(
+    authenticated_client: TestClient, db_session: Session, monkeypatch: pytest.MonkeyPatch
+):
+    from datetime import datetime, timedelta
+
+    from app.appointments.models import Appointment
+    from app.specialties.models import Specialty
+
+    monkeypatch.setattr(patient_services, "DETAIL_APPOINTMENTS_LIMIT", 3)
+    patient = patient_services.create_patient(db_session, patient_schemas.PatientCreate(name="Jane Doe"))
+    specialty = Specialty(name="First", default_duration_minutes=30)
+    db_session.add(specialty)
+    db_session.flush()
+    # Two past appointments and three far in the future
+    starts = [datetime(2000, 1, 3, 10), datetime(2000, 1, 10, 10)]
+    starts += [datetime(2040, 1, 2, 10) + timedelta(weeks=i) for i in range(3)]
+    db_session.add_all(
+        Appointment(
+            patient_id=patient.id,
+            specialty_id=specialty.id,
+            start_time=start_time,
+            end_time=start_time + timedelta(minutes=30),
+            cost=100,
+        )
+        for start_time in starts
+    )
+    db_session.commit()
+
+    data = authenticated_client.get(f"/api/v1/patients/{patient.id}/details/").json()
+    assert [a["start_time"] for a in data["appointments"]] == [s.isoformat() + "Z" for s in starts[:1:-1]]
+    # Dates span the whole history, not only the loaded appointments
+    assert data["last_appointment"].startswith("2000-01-10T10:00:00")
+    assert data["next_appointment"].startswith("2040-01-02T10:00:00")
+
+    response = authenticated_client.get(
+        f"/api/v1/patients/{patient.id}/appointments/", params={"cursor": data["appointments_next_cursor"]}
+    )
+    assert [a["start_time"] for a in response.json()] == [s.isoformat() + "Z" for s in starts[1::-1]]
+
+
+def test_read_debtors(authenticated_client: TestClient, db_session: Session):
+    for name, balance in (("Settled", 0), ("Small", -20), ("Large", -300), ("Medium", -150), ("In credit", 50)):
+        patient = patient_services.create_patient(db_session, patient_schemas.PatientCreate(name=name))
+        patient.total_due = max(-balance, 0)
+        patient.total_paid = max(balance, 0)
+        patient.balance = balance
+    db_session.commit()
+
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = authenticated_client.get("/api/v1/patients/debtors/", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["total_count"] == 3
+        seen.extend((debtor["name"], debtor["balance"]) for debtor in data["items"])
+        if data["next_cursor"] is None:
+            break
+        params = {"limit": 2, "cursor": data["next_cursor"]}
+    assert seen == [("Large", "-300.00"), ("Medium", "-150.00"), ("Small", "-20.00")]
+
+    response = authenticated_client.get("/api/v1/patients/debtors/", params={"min_owed": 100})
+    assert [debtor["name"] for debtor in response.json()["items"]] == ["Large", "Medium"]
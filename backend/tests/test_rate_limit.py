@@ -0,0 +1,68 @@
+import sqlite3
+import time
+
+import pytest
+from app.auth import router as auth_router
+from app.core.rate_limit import MemoryStore, RateLimiter, SQLiteStore
+from fastapi import status
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request: pytest.FixtureRequest, tmp_path):
+    if request.param == "memory":
+        return MemoryStore()
+    return SQLiteStore(str(tmp_path / "rate_limits.sqlite3"))
+
+
+def test_sliding_window(store):
+    limiter = RateLimiter("test", requests=4, window=60, store=store)
+    start = 600.0  # The start of a window
+
+    assert [limiter.hit("client", start + second) for second in range(5)] == [True, True, True, True, False]
+    assert limiter.hit("other client", start + 5)
+
+    # Halfway into the next window half of the previous one still counts: 4 * 0.5 + 1 < 4, but 4 * 0.5 + 2 isn't
+    assert limiter.hit("client", start + 90)
+    assert limiter.hit("client", start + 90)
+    assert not limiter.hit("client", start + 90)
+    # Two windows later the slate is clean
+    assert limiter.hit("client", start + 180)
+
+
+def test_stores_are_shared_and_bounded(tmp_path):
+    path = str(tmp_path / "rate_limits.sqlite3")
+    # Like two workers, each with its own connection to the file
+    first = RateLimiter("test", requests=2, window=60, store=SQLiteStore(path))
+    second = RateLimiter("test", requests=2, window=60, store=SQLiteStore(path))
+    assert first.hit("client", 600)
+    assert second.hit("client", 600)
+    assert not first.hit("client", 600)
+
+    limiter = RateLimiter("test", requests=1, window=60, store=MemoryStore(maxsize=2))
+    for client in ("a", "b", "c"):
+        assert limiter.hit(client, 600)
+    # "a" was the least recently seen, so it was dropped to make room
+    assert limiter.hit("a", 600)
+    assert not limiter.hit("c", 600)
+
+
+def test_sqlite_store_turns_requests_down_while_locked(tmp_path):
+    path = str(tmp_path / "rate_limits.sqlite3")
+    limiter = RateLimiter("test", requests=2, window=60, store=SQLiteStore(path))
+    # Another worker holding the write lock
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    started = time.monotonic()
+    assert not limiter.hit("client", 600)
+    assert time.monotonic() - started < 1
+
+    other.execute("ROLLBACK")
+    assert limiter.hit("client", 600)
+
+
+def test_limiter_dependency(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(auth_router.refresh_limiter, "store", MemoryStore())
+    statuses = [client.post("/api/v1/auth/refresh").status_code for _ in range(11)]
+    assert statuses == [status.HTTP_401_UNAUTHORIZED] * 10 + [status.HTTP_429_TOO_MANY_REQUESTS]
@@ -76,3 +76,54 @@ def test_add_new_specialty_price(authenticated_client: TestClient, db_session: S
     # Check that the new price is the latest one
     prices = sorted(data["prices"], key=lambda x: x["valid_from"], reverse=True)
     assert prices[0]["price"] == "80.00"
+
+
+def test_read_specialties_query_count_does_not_grow_with_rows(
+    authenticated_client: TestClient, db_session: Session, count_queries
+):
+    specialty_services.create_specialty(
+        db_session, specialty_schemas.SpecialtyCreate(name="Specialty 0", default_duration_minutes=30, current_price=10)
+    )
+    db_session.expire_all()
+    with count_queries() as few_rows_queries:
+        assert authenticated_client.get("/api/v1/specialties/").status_code == status.HTTP_200_OK
+
+    for i in range(1, 6):
+        specialty = specialty_services.create_specialty(
+            db_session,
+            specialty_schemas.SpecialtyCreate(name=f"Specialty {i}", default_duration_minutes=30, current_price=10),
+        )
+        specialty_services.add_specialty_price(db_session, specialty.id, specialty_schemas.SpecialtyPriceCreate(price=20))
+    db_session.expire_all()
+
+    with count_queries() as many_rows_queries:
+        response = authenticated_client.get("/api/v1/specialties/")
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 6
+    assert len(many_rows_queries) == len(few_rows_queries)
+
+
+def test_specialty_cache_is_cleared_by_writes(authenticated_client: TestClient, db_session: Session, count_queries):
+    specialty = specialty_services.create_specialty(
+        db_session,
+        specialty_schemas.SpecialtyCreate(name="Psychology", default_duration_minutes=45, current_price=100),
+    )
+    assert specialty_services.get_specialty_settings(db_session, specialty.id).default_duration_minutes == 45
+    assert specialty_services.get_current_price_for_specialty(db_session, specialty.id) == 100
+    with count_queries() as statements:
+        assert specialty_services.get_specialty_settings(db_session, specialty.id).default_duration_minutes == 45
+        assert specialty_services.get_current_price_for_specialty(db_session, specialty.id) == 100
+    assert statements == []
+
+    response = authenticated_client.put(
+        f"/api/v1/specialties/{specialty.id}/", json={"default_duration_minutes": 60}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    response = authenticated_client.post(f"/api/v1/specialties/{specialty.id}/prices/", json={"price": 120})
+    assert response.status_code == status.HTTP_200_OK
+    assert specialty_services.get_specialty_settings(db_session, specialty.id).default_duration_minutes == 60
+    assert specialty_services.get_current_price_for_specialty(db_session, specialty.id) == 120
+
+    response = authenticated_client.get("/api/v1/metrics/cache/")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["specialties"] == {"hits": 1, "misses": 2, "size": 1}
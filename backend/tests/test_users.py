@@ -1,5 +1,6 @@
 from app.core.security import verify_password
 from app.users.models import User
+from app.users.services import TOKENS_CACHE
 from fastapi import status
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
@@ -58,3 +59,37 @@ def test_update_user_password_success(test_user: User, authenticated_client: Tes
     assert updated_user is not None
     assert verify_password("newpassword456", updated_user.hashed_password)  # Check the new password
     assert not verify_password(TEST_USER_RAW_PASS, updated_user.hashed_password)  # Old password should no longer
+
+
+def test_authenticated_user_is_cached_per_token(
+    test_user: User, authenticated_client: TestClient, db_session: Session, count_queries
+):
+    with count_queries() as statements:
+        response = authenticated_client.get("/api/v1/users/")
+    assert response.status_code == status.HTTP_200_OK
+    assert statements == []
+
+    # Changes to the user drop the cached snapshot
+    authenticated_client.put("/api/v1/users/", json={"name": "Renamed"})
+    assert TOKENS_CACHE.stats()["size"] == 0
+    assert authenticated_client.get("/api/v1/users/").json()["name"] == "Renamed"
+    authenticated_client.put(
+        "/api/v1/users/me/password/", json={"old_password": TEST_USER_RAW_PASS, "new_password": "newpassword456"}
+    )
+    assert TOKENS_CACHE.stats()["size"] == 0
+
+    authenticated_client.get("/api/v1/users/")
+    assert authenticated_client.post("/api/v1/auth/logout").status_code == status.HTTP_200_OK
+    assert TOKENS_CACHE.stats()["size"] == 0
+
+
+def test_login(test_user: User, client: TestClient):
+    response = client.post("/api/v1/auth/token", data={"username": test_user.username, "password": TEST_USER_RAW_PASS})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["user"]["username"] == test_user.username
+    assert "access_token" in response.cookies
+
+    response = client.post("/api/v1/auth/token", data={"username": test_user.username, "password": "wrongpassword"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    response = client.post("/api/v1/auth/token", data={"username": "nobody", "password": TEST_USER_RAW_PASS})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED